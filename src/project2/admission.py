@@ -0,0 +1,196 @@
+# Packet-in admission control for the project2 controllers
+#
+# A broadcast storm or a scan turns every packet into a packet-in, and a
+# controller that dumps and inspects each one falls over.  PacketInGuard
+# sits in front of _handle_PacketIn:
+#
+#   - a token bucket per switch caps the total packet-in rate we process
+#   - a token bucket per source MAC caps any single sender; a source that
+#     runs dry gets a temporary drop rule installed on the switch so its
+#     traffic stops reaching the controller at all
+#   - sample() lets through only one in every `sample_every` packets for
+#     logging, instead of dumping every packet
+#
+# Either budget can be turned off (rate None).  Controllers that forward
+# traffic through packet-ins (part4 routes every IP packet this way) start
+# from FORWARDING, with both off: a single TCP transfer is far above
+# SOURCE_RATE and would get its sender blocked.  The launch() of each
+# controller takes the budgets as options, parsed by guard_options():
+#
+#   ./pox.py part3controller --source_rate=off
+#   ./pox.py part4controller --source_rate=2000 --source_burst=4000
+
+import time
+
+# Defaults, in packet-ins per second
+SWITCH_RATE = 2000.0
+SWITCH_BURST = 4000.0
+SOURCE_RATE = 100.0
+SOURCE_BURST = 200.0
+# How long (s) a source that exceeded its budget is dropped at the switch
+BLOCK_SECONDS = 10
+# Priority of the temporary drop rules; above anything the controllers use
+BLOCK_PRIORITY = 0xFFF0
+# Log one in every SAMPLE_EVERY admitted packet-ins (None: never)
+SAMPLE_EVERY = 100
+# Source buckets kept before idle (full) ones are forgotten
+MAX_SOURCES = 4096
+
+# launch() options that configure the guard
+GUARD_OPTIONS = ("switch_rate", "switch_burst", "source_rate", "source_burst",
+                 "block_seconds", "sample_every")
+# For controllers that route through packet-ins: no budgets, sampling only
+FORWARDING = {"switch_rate": None, "source_rate": None}
+
+
+class TokenBucket(object):
+    """
+    Classic token bucket: `rate` tokens per second up to `burst`.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate, burst, now=None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic() if now is None else now
+
+    def consume(self, now, amount=1.0):
+        tokens = self.tokens + (now - self.stamp) * self.rate
+        if tokens > self.burst:
+            tokens = self.burst
+        self.stamp = now
+        if tokens >= amount:
+            self.tokens = tokens - amount
+            return True
+        self.tokens = tokens
+        return False
+
+    def full(self, now):
+        return self.tokens + (now - self.stamp) * self.rate >= self.burst
+
+
+def _budget(value):
+    """
+    A launch() option as a number; None, 'off' and 0 mean no limit.
+    """
+    if value is None or str(value).lower() in ("off", "none", "0"):
+        return None
+    return float(value)
+
+
+def _sample_every(value):
+    """
+    The sample_every option; None, 'off' and 0 mean never sample.
+    """
+    if value is None or str(value).lower() in ("off", "none"):
+        return None
+    every = int(value)
+    if every < 0:
+        raise ValueError("sample_every must be at least 1, or 0 for off")
+    return every or None
+
+
+def guard_options(defaults=None, **options):
+    """
+    PacketInGuard keyword arguments from launch() options (strings, as POX
+    passes them), over `defaults`.  Unknown options raise TypeError.
+    """
+    kwargs = dict(defaults or {})
+    for name, value in options.items():
+        if name not in GUARD_OPTIONS:
+            raise TypeError("unknown packet-in guard option %r" % name)
+        if value is None:
+            continue
+        if name == "sample_every":
+            kwargs[name] = _sample_every(value)
+        elif name == "block_seconds":
+            kwargs[name] = int(float(value))
+        else:
+            kwargs[name] = _budget(value)
+    return kwargs
+
+
+class PacketInGuard(object):
+    """
+    Admission stage for packet-ins from one switch.  A rate of None turns
+    that budget off.
+    """
+
+    def __init__(self, connection, switch_rate=SWITCH_RATE,
+                 switch_burst=SWITCH_BURST, source_rate=SOURCE_RATE,
+                 source_burst=SOURCE_BURST, block_seconds=BLOCK_SECONDS,
+                 sample_every=SAMPLE_EVERY, clock=time.monotonic, of=None):
+        self.connection = connection
+        self.clock = clock
+        if of is None:
+            import pox.openflow.libopenflow_01 as of
+        self.of = of
+        self.switch_bucket = None
+        if switch_rate is not None:
+            self.switch_bucket = TokenBucket(switch_rate, switch_burst or switch_rate,
+                                             clock())
+        self.source_rate = source_rate
+        self.source_burst = source_burst or source_rate
+        self.block_seconds = block_seconds
+        self.sample_every = sample_every
+        self.sources = {}
+        self.blocked = {}
+        self.admitted = 0
+        self.rejected = 0
+        self.blocks = 0
+
+    def admit(self, event):
+        """
+        Returns True if the packet-in should be processed.
+        """
+        now = self.clock()
+        src = event.parsed.src
+        until = self.blocked.get(src)
+        if until is not None:
+            if now < until:
+                # Already blocked; these are stragglers raced with the rule
+                self.rejected += 1
+                return False
+            del self.blocked[src]
+
+        if self.source_rate is not None:
+            bucket = self.sources.get(src)
+            if bucket is None:
+                if len(self.sources) >= MAX_SOURCES:
+                    self._forget_idle(now)
+                bucket = self.sources[src] = TokenBucket(self.source_rate,
+                                                         self.source_burst, now)
+            if not bucket.consume(now):
+                self._block(src, event.port, now)
+                self.rejected += 1
+                return False
+        if self.switch_bucket is not None and not self.switch_bucket.consume(now):
+            self.rejected += 1
+            return False
+        self.admitted += 1
+        return True
+
+    def sample(self):
+        """
+        True for one in every `sample_every` admitted packet-ins; never if
+        sampling is off.
+        """
+        if not self.sample_every:
+            return False
+        return self.admitted % self.sample_every == 1 or self.sample_every == 1
+
+    def _block(self, src, in_port, now):
+        self.blocked[src] = now + self.block_seconds
+        self.blocks += 1
+        of = self.of
+        fm = of.ofp_flow_mod()
+        fm.priority = BLOCK_PRIORITY
+        fm.hard_timeout = self.block_seconds
+        fm.match = of.ofp_match(in_port=in_port, dl_src=src)
+        self.connection.send(fm)
+
+    def _forget_idle(self, now):
+        for src in [s for s, b in self.sources.items() if b.full(now)]:
+            del self.sources[src]
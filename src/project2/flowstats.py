@@ -0,0 +1,203 @@
+# Periodic flow/port statistics collector for the project2 controllers
+#
+# Every `interval` seconds each connected switch is sent an
+# ofp_stats_request for its flows and ports.  Replies are folded into
+# fixed-size ring buffers (one per rule, port and host pair) so memory
+# stays constant however long the controller runs, and the top-K heavy
+# hitters by recent byte rate are logged.  Controllers also report their
+# packet-ins with record_packet_in() so we can see who is hitting the
+# controller, not just the switch.
+#
+# Launch alongside a controller, e.g.
+#   ./pox.py part3controller flowstats --interval=5 --top=10
+
+from collections import Counter
+import heapq
+import time
+
+try:
+    from pox.core import core
+    import pox.openflow.libopenflow_01 as of
+    from pox.lib.recoco import Timer
+    log = core.getLogger()
+except ImportError:
+    # Outside POX only RingSeries is usable (ofsim, tests)
+    core = of = Timer = log = None
+
+# Packet-in pairs tracked before the coldest half is forgotten
+MAX_PAIRS = 10000
+
+
+class RingSeries(object):
+    """
+    Fixed-capacity time series of cumulative counter samples.
+    """
+
+    __slots__ = ("times", "values", "start", "count")
+
+    def __init__(self, capacity):
+        self.times = [0.0] * capacity
+        self.values = [0] * capacity
+        self.start = 0
+        self.count = 0
+
+    def append(self, t, value):
+        capacity = len(self.times)
+        if self.count and value < self.last():
+            # Counter went backwards: the flow was reinstalled
+            self.start = self.count = 0
+        index = (self.start + self.count) % capacity
+        self.times[index] = t
+        self.values[index] = value
+        if self.count < capacity:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % capacity
+
+    def last(self):
+        return self.values[(self.start + self.count - 1) % len(self.values)]
+
+    def rate(self):
+        """
+        Average rate (units/s) over the window held in the buffer.
+        """
+        if self.count < 2:
+            return 0.0
+        first = self.start
+        last = (self.start + self.count - 1) % len(self.values)
+        elapsed = self.times[last] - self.times[first]
+        if elapsed <= 0:
+            return 0.0
+        return (self.values[last] - self.values[first]) / elapsed
+
+    def samples(self):
+        capacity = len(self.times)
+        return [(self.times[(self.start + i) % capacity],
+                 self.values[(self.start + i) % capacity])
+                for i in range(self.count)]
+
+
+def _rule_key(dpid, stat):
+    return (dpid, stat.priority, str(stat.match))
+
+
+def _pair_key(match):
+    src, src_bits = match.get_nw_src()
+    dst, dst_bits = match.get_nw_dst()
+    if src is None and dst is None:
+        return None
+    src = "%s/%d" % (src, src_bits) if src is not None else "*"
+    dst = "%s/%d" % (dst, dst_bits) if dst is not None else "*"
+    return (src, dst)
+
+
+class FlowStatsCollector(object):
+    """
+    Polls switches for flow and port counters and keeps ring-buffer time
+    series per rule, per port and per (src, dst) pair.
+    """
+
+    def __init__(self, interval=5.0, history=60, top=10):
+        self.interval = interval
+        self.history = history
+        self.top = top
+        self.rules = {}
+        self.ports = {}
+        self.pairs = {}
+        self.packet_ins = Counter()
+        self.packet_in_switches = Counter()
+        self.timer = None
+
+    def start(self):
+        core.openflow.addListenerByName("FlowStatsReceived", self._handle_FlowStatsReceived)
+        core.openflow.addListenerByName("PortStatsReceived", self._handle_PortStatsReceived)
+        self.timer = Timer(self.interval, self._poll, recurring=True)
+        return self
+
+    def _series(self, table, key):
+        series = table.get(key)
+        if series is None:
+            series = table[key] = RingSeries(self.history)
+        return series
+
+    def _poll(self):
+        for connection in core.openflow.connections:
+            connection.send(of.ofp_stats_request(body=of.ofp_flow_stats_request()))
+            connection.send(of.ofp_stats_request(body=of.ofp_port_stats_request()))
+        self.report()
+
+    def _handle_FlowStatsReceived(self, event):
+        now = time.time()
+        dpid = event.connection.dpid
+        pair_bytes = Counter()
+        for stat in event.stats:
+            self._series(self.rules, _rule_key(dpid, stat)).append(now, stat.byte_count)
+            pair = _pair_key(stat.match)
+            if pair is not None:
+                pair_bytes[pair] += stat.byte_count
+        for pair, total in pair_bytes.items():
+            self._series(self.pairs, (dpid,) + pair).append(now, total)
+
+    def _handle_PortStatsReceived(self, event):
+        now = time.time()
+        dpid = event.connection.dpid
+        for stat in event.stats:
+            self._series(self.ports, (dpid, stat.port_no)).append(
+                now, stat.rx_bytes + stat.tx_bytes)
+
+    def record_packet_in(self, dpid, packet):
+        """
+        Counts a packet-in by switch and by (src, dst) address pair.  Cheap
+        enough to call on every packet-in.
+        """
+        self.packet_in_switches[dpid] += 1
+        if len(self.packet_ins) > MAX_PAIRS:
+            self.packet_ins = Counter(dict(self.packet_ins.most_common(MAX_PAIRS // 2)))
+        ip = packet.find("ipv4")
+        if ip is not None:
+            self.packet_ins[(str(ip.srcip), str(ip.dstip))] += 1
+            return
+        arp = packet.find("arp")
+        if arp is not None:
+            self.packet_ins[(str(arp.protosrc), str(arp.protodst))] += 1
+        else:
+            self.packet_ins[(str(packet.src), str(packet.dst))] += 1
+
+    def heavy_hitters(self, table, k=None):
+        """
+        Top-k keys of `table` by recent rate, as (rate, key) pairs.
+        """
+        k = k or self.top
+        return heapq.nlargest(k, ((series.rate(), key) for key, series in table.items()))
+
+    def report(self):
+        for rate, key in self.heavy_hitters(self.rules):
+            if rate > 0:
+                log.info("rule  s%s prio %d %s: %.1f B/s", key[0], key[1], key[2], rate)
+        for rate, key in self.heavy_hitters(self.pairs):
+            if rate > 0:
+                log.info("pair  s%s %s -> %s: %.1f B/s", key[0], key[1], key[2], rate)
+        for key, count in self.packet_ins.most_common(self.top):
+            log.info("packet-in %s -> %s: %d", key[0], key[1], count)
+        if self.packet_in_switches:
+            log.info("packet-ins per switch: %s", dict(self.packet_in_switches))
+
+
+def record_packet_in(event):
+    """
+    Reports a packet-in to the running collector, if there is one.
+    """
+    if core.hasComponent("flowstats"):
+        core.flowstats.record_packet_in(event.dpid, event.parsed)
+
+
+def launch(interval=5, history=60, top=10):
+    """
+    Starts the stats collector
+    """
+
+    def start():
+        collector = FlowStatsCollector(float(interval), int(history), int(top))
+        core.register("flowstats", collector.start())
+
+    core.call_when_ready(start, "openflow")
@@ -0,0 +1,558 @@
+#!/usr/bin/python
+# Offline OpenFlow switch simulator for the project2 controllers
+#
+# Replays packet traces through a controller (Firewall, Part3Controller,
+# Part4Controller, ...) without Mininet or a running POX core.  Only the
+# POX libraries are needed (pox.openflow.libopenflow_01 and pox.lib.packet),
+# which are pure Python: point --pox-dir (or $POX_HOME) at a POX checkout.
+#
+# Usage:
+#   python ofsim.py part3/part3controller.py:Part3Controller --dpid 21 \
+#       --packets 1000000 --flows 500
+#   python ofsim.py part2/part2controller.py:Firewall --trace trace.txt
+#   python ofsim.py part4/part4controller.py:Part4Controller --switch cores21
+
+import argparse
+import importlib.util
+import io
+import os
+import random
+import socket
+import struct
+import sys
+import time
+from collections import Counter, namedtuple
+from contextlib import nullcontext, redirect_stdout
+
+# A packet as seen by the switch pipeline.  MACs and IPs are plain ints so
+# that matching is a handful of integer ops per field.
+SimPacket = namedtuple(
+    "SimPacket",
+    "in_port dl_src dl_dst dl_type nw_src nw_dst nw_proto tp_src tp_dst",
+)
+
+IN_PORT, DL_SRC, DL_DST, DL_TYPE, NW_SRC, NW_DST, NW_PROTO, TP_SRC, TP_DST = range(9)
+
+ETH_IP = 0x0800
+ETH_ARP = 0x0806
+
+# OpenFlow 1.0 constants, duplicated here so the matcher does not need POX
+OFPP_IN_PORT = 0xFFF8
+OFPP_FLOOD = 0xFFFB
+OFPP_ALL = 0xFFFC
+OFPP_CONTROLLER = 0xFFFD
+OFPP_NONE = 0xFFFF
+OFPFC_ADD, OFPFC_MODIFY, OFPFC_MODIFY_STRICT, OFPFC_DELETE, OFPFC_DELETE_STRICT = range(5)
+
+# Hosts of the part3/part4 topology as seen from cores21: (port, mac, ip)
+DEFAULT_HOSTS = [
+    (1, "00:00:00:00:00:01", "10.0.1.10"),
+    (2, "00:00:00:00:00:02", "10.0.2.20"),
+    (3, "00:00:00:00:00:03", "10.0.3.30"),
+    (4, "00:00:00:00:00:04", "10.0.4.10"),
+    (5, "00:00:00:00:00:05", "172.16.10.100"),
+]
+
+
+def mac_to_int(mac):
+    return int(mac.replace(":", ""), 16)
+
+
+def ip_to_int(ip):
+    return struct.unpack("!I", socket.inet_aton(ip))[0]
+
+
+def int_to_ip(value):
+    return socket.inet_ntoa(struct.pack("!I", value))
+
+
+def flow_key(packet):
+    """
+    Key used to attribute packet-ins to a flow: (src ip, dst ip, dl_type,
+    proto)
+    """
+    return (packet[NW_SRC], packet[NW_DST], packet[DL_TYPE], packet[NW_PROTO])
+
+
+class FlowEntry(object):
+    """
+    One installed flow.  fields is a tuple of (index, mask, value) triples
+    covering only the non-wildcarded match fields.
+    """
+
+    __slots__ = ("priority", "fields", "outputs", "idle_timeout",
+                 "hard_timeout", "installed", "last_hit", "packets", "bytes",
+                 "cookie")
+
+    def __init__(self, priority, fields, outputs, idle_timeout=0,
+                 hard_timeout=0, now=0.0, cookie=0):
+        self.priority = priority
+        self.fields = fields
+        self.outputs = outputs
+        self.idle_timeout = idle_timeout
+        self.hard_timeout = hard_timeout
+        self.installed = now
+        self.last_hit = now
+        self.packets = 0
+        self.bytes = 0
+        self.cookie = cookie
+
+    def matches(self, packet):
+        for index, mask, value in self.fields:
+            if packet[index] & mask != value:
+                return False
+        return True
+
+    def covers(self, fields):
+        """
+        True if every field constrained by this entry is constrained at
+        least as tightly (and consistently) by `fields`.  Used for
+        non-strict deletes.
+        """
+        others = {index: (mask, value) for index, mask, value in fields}
+        for index, mask, value in self.fields:
+            if index not in others:
+                return False
+            other_mask, other_value = others[index]
+            if other_mask & mask != mask or other_value & mask != value:
+                return False
+        return True
+
+    def expires_at(self):
+        deadlines = []
+        if self.hard_timeout:
+            deadlines.append(self.installed + self.hard_timeout)
+        if self.idle_timeout:
+            deadlines.append(self.last_hit + self.idle_timeout)
+        return min(deadlines) if deadlines else None
+
+
+class FlowTable(object):
+    """
+    Priority-ordered flow table with an exact-match microflow cache in front
+    of it, the way OVS does it.  Any change to the table flushes the cache,
+    and so does reaching cache_size distinct packets.
+    """
+
+    def __init__(self, cache_size=65536):
+        self.entries = []
+        self.cache_size = cache_size
+        self.cache = {}
+        self.max_size = 0
+        self.next_expiry = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _changed(self):
+        self.cache.clear()
+        self.max_size = max(self.max_size, len(self.entries))
+        self._schedule()
+
+    def _schedule(self):
+        deadlines = [e.expires_at() for e in self.entries]
+        deadlines = [d for d in deadlines if d is not None]
+        self.next_expiry = min(deadlines) if deadlines else None
+
+    def apply(self, mod, now=0.0):
+        """
+        Applies a POX ofp_flow_mod to the table.
+        """
+        fields = match_fields(mod.match)
+        command = mod.command
+        if command == OFPFC_ADD:
+            self.entries = [e for e in self.entries
+                            if not (e.priority == mod.priority and e.fields == fields)]
+            entry = FlowEntry(mod.priority, fields, action_outputs(mod.actions),
+                              mod.idle_timeout, mod.hard_timeout, now,
+                              getattr(mod, "cookie", 0))
+            # Keep highest priority first; equal priorities keep install order
+            position = len(self.entries)
+            for i, existing in enumerate(self.entries):
+                if existing.priority < entry.priority:
+                    position = i
+                    break
+            self.entries.insert(position, entry)
+        elif command in (OFPFC_MODIFY, OFPFC_MODIFY_STRICT):
+            strict = command == OFPFC_MODIFY_STRICT
+            for entry in self.entries:
+                if self._selected(entry, fields, mod.priority, strict):
+                    entry.outputs = action_outputs(mod.actions)
+        elif command in (OFPFC_DELETE, OFPFC_DELETE_STRICT):
+            strict = command == OFPFC_DELETE_STRICT
+            self.entries = [e for e in self.entries
+                            if not self._selected(e, fields, mod.priority, strict)]
+        self._changed()
+
+    @staticmethod
+    def _selected(entry, fields, priority, strict):
+        if strict:
+            return entry.priority == priority and entry.fields == fields
+        return FlowEntry(priority, fields, ()).covers(entry.fields)
+
+    def expire(self, now):
+        """
+        Removes entries whose idle or hard timeout has passed.  Returns the
+        removed entries.
+        """
+        if self.next_expiry is None or now < self.next_expiry:
+            return []
+        expired = [e for e in self.entries
+                   if e.expires_at() is not None and e.expires_at() <= now]
+        if expired:
+            self.entries = [e for e in self.entries if e not in expired]
+            self._changed()
+        else:
+            # idle entries were hit since; nothing to flush
+            self._schedule()
+        return expired
+
+    def lookup(self, packet):
+        try:
+            return self.cache[packet]
+        except KeyError:
+            pass
+        entry = None
+        for candidate in self.entries:
+            if candidate.matches(packet):
+                entry = candidate
+                break
+        if len(self.cache) >= self.cache_size:
+            self.cache.clear()
+        self.cache[packet] = entry
+        return entry
+
+
+def match_fields(match):
+    """
+    Converts a POX ofp_match into (index, mask, value) triples.
+    """
+    fields = []
+    for name, index in (("in_port", IN_PORT), ("dl_type", DL_TYPE),
+                        ("nw_proto", NW_PROTO), ("tp_src", TP_SRC),
+                        ("tp_dst", TP_DST)):
+        value = getattr(match, name)
+        if value is not None:
+            fields.append((index, 0xFFFF, int(value)))
+    for name, index in (("dl_src", DL_SRC), ("dl_dst", DL_DST)):
+        value = getattr(match, name)
+        if value is not None:
+            fields.append((index, 0xFFFFFFFFFFFF, mac_to_int(str(value))))
+    for getter, index in ((match.get_nw_src, NW_SRC), (match.get_nw_dst, NW_DST)):
+        addr, bits = getter()
+        if addr is not None and bits:
+            mask = (0xFFFFFFFF << (32 - bits)) & 0xFFFFFFFF
+            fields.append((index, mask, ip_to_int(str(addr)) & mask))
+    return tuple(sorted(fields))
+
+
+def action_outputs(actions):
+    """
+    Output ports of a POX action list.  An empty tuple means drop; the
+    controllers also write drop as an output to port 0, which is no port.
+    """
+    return tuple(a.port for a in actions if getattr(a, "port", 0))
+
+
+class PacketInEvent(object):
+    """
+    Mimics the attributes of POX's PacketIn event that controllers use.
+    """
+
+    def __init__(self, connection, ofp, parsed):
+        self.connection = connection
+        self.dpid = connection.dpid
+        self.ofp = ofp
+        self.port = ofp.in_port
+        self.data = ofp.data
+        self.parsed = parsed
+
+
+class FakeConnection(object):
+    """
+    Stands in for a POX Connection.  Every message the controller sends is
+    recorded, and flow mods are applied to the simulated flow table.
+    """
+
+    def __init__(self, dpid, of_module):
+        self.dpid = dpid
+        self.of = of_module
+        self.table = FlowTable()
+        self.listeners = []
+        self.sent = Counter()
+        self.flow_mods = []
+        self.packet_outs = []
+        self.now = 0.0
+
+    def addListeners(self, obj):
+        self.listeners.append(obj)
+
+    def send(self, msg):
+        self.sent[type(msg).__name__] += 1
+        if isinstance(msg, self.of.ofp_flow_mod):
+            self.flow_mods.append(msg)
+            self.table.apply(msg, self.now)
+        elif isinstance(msg, self.of.ofp_packet_out):
+            self.packet_outs.append(msg)
+
+
+def build_frame(packet):
+    """
+    Serialises a SimPacket into raw Ethernet bytes for the packet-in path.
+    """
+    eth = struct.pack("!6s6sH", packet.dl_dst.to_bytes(6, "big"),
+                      packet.dl_src.to_bytes(6, "big"), packet.dl_type)
+    if packet.dl_type == ETH_ARP:
+        return eth + struct.pack("!HHBBH6sI6sI", 1, ETH_IP, 6, 4,
+                                 packet.nw_proto or 1,
+                                 packet.dl_src.to_bytes(6, "big"), packet.nw_src,
+                                 b"\x00" * 6, packet.nw_dst)
+    if packet.dl_type != ETH_IP:
+        return eth + b"\x00" * 46
+    if packet.nw_proto == 1:
+        l4 = struct.pack("!BBHHH", 8, 0, 0, packet.tp_src, 1) + b"\x00" * 32
+        l4 = l4[:2] + struct.pack("!H", _checksum(l4)) + l4[4:]
+    elif packet.nw_proto == 6:
+        l4 = struct.pack("!HHIIBBHHH", packet.tp_src, packet.tp_dst, 0, 0,
+                         0x50, 0x02, 65535, 0, 0)
+    elif packet.nw_proto == 17:
+        l4 = struct.pack("!HHHH", packet.tp_src, packet.tp_dst, 8, 0)
+    else:
+        l4 = b""
+    ip = struct.pack("!BBHHHBBHII", 0x45, 0, 20 + len(l4), 0, 0, 64,
+                     packet.nw_proto, 0, packet.nw_src, packet.nw_dst)
+    ip = ip[:10] + struct.pack("!H", _checksum(ip)) + ip[12:]
+    return eth + ip + l4
+
+
+def _checksum(data):
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack("!%dH" % (len(data) // 2), data))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+class SimSwitch(object):
+    """
+    One simulated switch driven by one controller instance.
+    """
+
+    def __init__(self, dpid, controller_cls, quiet=True, pox=None):
+        # pox: (libopenflow_01 module, ethernet class), loaded if not given
+        of, ethernet = pox or load_pox()
+        self.of = of
+        self.ethernet = ethernet
+        self.quiet = quiet
+        self.connection = FakeConnection(dpid, of)
+        self.packets = 0
+        self.packet_ins = 0
+        self.packet_ins_per_flow = Counter()
+        self.outputs = Counter()
+        self.dropped = 0
+        with self._output():
+            self.controller = controller_cls(self.connection)
+
+    def _output(self):
+        return redirect_stdout(io.StringIO()) if self.quiet else nullcontext()
+
+    def process(self, packet, now=0.0, size=64):
+        """
+        Runs one packet through the flow table, raising a packet-in on a miss.
+        """
+        connection = self.connection
+        table = connection.table
+        connection.now = now
+        if table.next_expiry is not None and now >= table.next_expiry:
+            table.expire(now)
+        self.packets += 1
+        entry = table.lookup(packet)
+        if entry is None:
+            self._packet_in(packet)
+            return None
+        entry.packets += 1
+        entry.bytes += size
+        entry.last_hit = now
+        if not entry.outputs:
+            self.dropped += 1
+        for port in entry.outputs:
+            if port == OFPP_CONTROLLER:
+                self._packet_in(packet)
+            else:
+                self.outputs[port] += 1
+        return entry
+
+    def _packet_in(self, packet):
+        self.packet_ins += 1
+        self.packet_ins_per_flow[flow_key(packet)] += 1
+        raw = build_frame(packet)
+        ofp = self.of.ofp_packet_in(in_port=packet.in_port, data=raw,
+                                    reason=self.of.OFPR_NO_MATCH)
+        event = PacketInEvent(self.connection, ofp, self.ethernet(raw))
+        with self._output():
+            for listener in self.connection.listeners:
+                handler = getattr(listener, "_handle_PacketIn", None)
+                if handler is not None:
+                    handler(event)
+
+    def report(self, elapsed):
+        per_flow = list(self.packet_ins_per_flow.values())
+        return {
+            "dpid": self.connection.dpid,
+            "packets": self.packets,
+            "seconds": elapsed,
+            "packets_per_sec": self.packets / elapsed if elapsed else 0.0,
+            "packet_ins": self.packet_ins,
+            "flows_seen": len(per_flow),
+            "packet_ins_per_flow_mean": (sum(per_flow) / len(per_flow)) if per_flow else 0.0,
+            "packet_ins_per_flow_max": max(per_flow) if per_flow else 0,
+            "flow_mods": self.connection.sent["ofp_flow_mod"],
+            "packet_outs": self.connection.sent["ofp_packet_out"],
+            "flow_table_size": len(self.connection.table),
+            "flow_table_max": self.connection.table.max_size,
+            "dropped": self.dropped,
+        }
+
+
+def read_trace(path):
+    """
+    Reads a text trace, one packet per line (blank lines and # comments
+    are skipped):
+
+        time in_port src_mac dst_mac ethertype src_ip dst_ip proto sport dport
+
+    ethertype may be hex (0x0800); proto/sport/dport may be '-' for ARP.
+    Yields (time, SimPacket).
+    """
+    with open(path) as trace:
+        for line in trace:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split()
+            ts, in_port, src, dst, dl_type, nw_src, nw_dst = parts[:7]
+            rest = [0 if p == "-" else int(p) for p in parts[7:10]]
+            rest += [0] * (3 - len(rest))
+            yield float(ts), SimPacket(int(in_port), mac_to_int(src),
+                                       mac_to_int(dst), int(dl_type, 0),
+                                       ip_to_int(nw_src), ip_to_int(nw_dst),
+                                       rest[0], rest[1], rest[2])
+
+
+def synthetic_trace(count, hosts=DEFAULT_HOSTS, flows=100, rate=100000.0,
+                    arp_fraction=0.01, seed=461):
+    """
+    Generates `count` packets over `flows` host-pair flows.  Flow popularity
+    is Zipf-like so a few flows carry most of the traffic, and a small
+    fraction of packets are ARP requests.  Yields (time, SimPacket).
+    """
+    rng = random.Random(seed)
+    hosts = [(port, mac_to_int(mac), ip_to_int(ip)) for port, mac, ip in hosts]
+    templates = []
+    for i in range(flows):
+        src, dst = rng.sample(hosts, 2)
+        proto = rng.choice((1, 6, 6, 17))
+        sport = rng.randrange(1024, 65536) if proto != 1 else i & 0xFFFF
+        dport = rng.choice((80, 443, 5001)) if proto != 1 else 0
+        templates.append(SimPacket(src[0], src[1], dst[1], ETH_IP, src[2],
+                                   dst[2], proto, sport, dport))
+    weights = [1.0 / (i + 1) for i in range(flows)]
+    gap = 1.0 / rate
+    now = 0.0
+    batch = 4096
+    emitted = 0
+    while emitted < count:
+        picks = rng.choices(templates, weights, k=min(batch, count - emitted))
+        for packet in picks:
+            if rng.random() < arp_fraction:
+                packet = SimPacket(packet.in_port, packet.dl_src, 0xFFFFFFFFFFFF,
+                                   ETH_ARP, packet.nw_src, packet.nw_dst, 1, 0, 0)
+            yield now, packet
+            now += gap
+        emitted += len(picks)
+
+
+def run(switch, trace):
+    start = time.perf_counter()
+    process = switch.process
+    for ts, packet in trace:
+        process(packet, ts)
+    return switch.report(time.perf_counter() - start)
+
+
+_POX = None
+
+
+def load_pox(pox_dir=None):
+    """
+    Imports the POX libraries the controllers need, initialising pox.core
+    without booting it (no OpenFlow listener is started).
+    """
+    global _POX
+    if _POX is None:
+        pox_dir = pox_dir or os.environ.get("POX_HOME")
+        if pox_dir and pox_dir not in sys.path:
+            sys.path.insert(0, pox_dir)
+        import pox.core
+        if pox.core.core is None:
+            pox.core.initialize()
+        import pox.openflow.libopenflow_01 as of
+        from pox.lib.packet.ethernet import ethernet
+        _POX = (of, ethernet)
+    return _POX
+
+
+def load_controller(spec):
+    """
+    Loads a controller class from 'path/to/module.py:ClassName'.
+    """
+    path, _, name = spec.rpartition(":")
+    module_name = os.path.splitext(os.path.basename(path))[0]
+    module_spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(module)
+    return getattr(module, name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline OpenFlow controller benchmark")
+    parser.add_argument("controller",
+                        help="Controller class as path/to/module.py:ClassName")
+    parser.add_argument("--dpid", type=int, default=1,
+                        help="Datapath id of the simulated switch")
+    parser.add_argument("--trace", help="Text trace to replay (see read_trace)")
+    parser.add_argument("--packets", type=int, default=1000000,
+                        help="Synthetic packets to generate when no trace is given")
+    parser.add_argument("--flows", type=int, default=100,
+                        help="Number of synthetic flows")
+    parser.add_argument("--topo", default="part3",
+                        help="topogen family whose hosts the synthetic trace uses")
+    parser.add_argument("--switch",
+                        help="Switch of --topo to simulate (sets --dpid and in_ports)")
+    parser.add_argument("--seed", type=int, default=461)
+    parser.add_argument("--pox-dir", help="POX checkout (defaults to $POX_HOME)")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Let controller prints through")
+    args = parser.parse_args()
+
+    hosts, dpid = DEFAULT_HOSTS, args.dpid
+    if args.switch:
+        import topogen
+        spec = topogen.FAMILIES[args.topo]()
+        hosts, dpid = spec.hosts_for_switch(args.switch), spec.switches[args.switch]
+
+    load_pox(args.pox_dir)
+    switch = SimSwitch(dpid, load_controller(args.controller),
+                       quiet=not args.verbose)
+    if args.trace:
+        trace = read_trace(args.trace)
+    else:
+        trace = synthetic_trace(args.packets, hosts=hosts, flows=args.flows,
+                                seed=args.seed)
+    for key, value in run(switch, trace).items():
+        print("%-26s %s" % (key, value))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,21 @@
 #!/usr/bin/python
 
+import os
+import sys
+
 from mininet.topo import Topo
 from mininet.net import Mininet
 from mininet.util import dumpNodeConnections
 from mininet.cli import CLI
 
+# topogen.py lives one level up (the layout is generated there)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import topogen
+
 
 class part1_topo(Topo):
     def build(self):
-        switch1 = self.addSwitch('s1')
-        for i in range(1, 5):
-            host = self.addHost('h%d' % i)
-            self.addLink('h%d' % i,switch1)
+        topogen.part1().build(self)
 
 
 topos = {"part1": part1_topo}
@@ -3,12 +3,30 @@
 # based on Lab 4 from UCSC's Networking Class
 # which is based on of_tutorial by James McCauley
 
+import os
+import sys
+
 from pox.core import core
 import pox.openflow.libopenflow_01 as of
 import pox.lib.packet as pkt
 
+# policy.py lives next to this file and the shared project2 modules one
+# level up (also when this file is symlinked into pox/ext)
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from policy import compile_policy, headers_from_packet
+from flowstats import record_packet_in
+from admission import PacketInGuard, guard_options
+
 log = core.getLogger()
 
+# The original hand-written rules: flood ICMP and ARP, drop everything else
+DEFAULT_POLICY = """
+allow icmp
+allow arp
+deny all
+"""
+
 
 class Firewall(object):
     """
@@ -16,39 +34,22 @@ class Firewall(object):
     A Connection object for that switch is passed to the __init__ function.
     """
 
-    def __init__(self, connection):
+    def __init__(self, connection, policy=None, guard=None):
         # Keep track of the connection to the switch so that we can
         # send it messages!
         self.connection = connection
 
         # This binds our PacketIn event listener
         connection.addListeners(self)
+        # Rate limits packet-ins before we do any work on them
+        self.guard = PacketInGuard(connection, **(guard or {}))
 
-        # disallow ip_v4 traffic
-        # ipv4_flow = of.ofp_flow_mod()
-        # ipv4_flow.match = of.ofp_match(dl_type=0x8000)
-    
+        # Compile the policy into a minimal, priority-ordered set of flow
+        # mods; allowed traffic is flooded, denied traffic has no actions
+        self.policy = policy or compile_policy(DEFAULT_POLICY)
         action_flood = of.ofp_action_output(port=of.OFPP_FLOOD)
-
-        # allow icmp
-        icmp_new_fm = of.ofp_flow_mod()
-        icmp_new_fm.match = of.ofp_match(dl_type=0x0800)
-        icmp_new_fm.actions.append(action_flood)
-        # only allow icmp
-        icmp_new_fm.match.nw_proto = 1
-
-        # allow arp
-        arp_new_fm = of.ofp_flow_mod()
-        arp_new_fm.match = of.ofp_match(dl_type=0x0806)
-        arp_new_fm.actions.append(action_flood)
-
-        # disallow ipv4
-        ipv4_flow = of.ofp_flow_mod()
-        ipv4_flow.actions.append(of.ofp_action_output(port=of.OFPP_NONE))
-
-        self.connection.send(icmp_new_fm)
-        self.connection.send(arp_new_fm)
-        self.connection.send(ipv4_flow)
+        for fm in self.policy.flow_mods(of, [action_flood]):
+            self.connection.send(fm)
 
 
     def _handle_PacketIn(self, event):
@@ -62,17 +63,40 @@ class Firewall(object):
             log.warning("Ignoring incomplete packet")
             return
 
+        if not self.guard.admit(event):
+            return
+
         packet_in = event.ofp  # The actual ofp_packet_in message.
-        print("Unhandled packet :" + str(packet.dump()))
+        record_packet_in(event)
+        if self.guard.sample():
+            print("Unhandled packet :" + str(packet.dump()))
+
+        # Packets can still reach us before the rules are installed; decide
+        # them in software with the same policy the switch runs
+        if self.policy.classify(headers_from_packet(packet)) == "allow":
+            msg = of.ofp_packet_out()
+            msg.data = packet_in
+            msg.actions.append(of.ofp_action_output(port=of.OFPP_FLOOD))
+            self.connection.send(msg)
 
 
-def launch():
+def launch(policy=None, **guard):
     """
-    Starts the component
+    Starts the component.  --policy=FILE loads the firewall policy from a
+    file instead of DEFAULT_POLICY; the admission.GUARD_OPTIONS set the
+    packet-in budgets (e.g. --source_rate=off).
     """
+    guard = guard_options(**guard)
+    text = DEFAULT_POLICY
+    if policy:
+        with open(policy) as f:
+            text = f.read()
+    compiled = compile_policy(text)
+    log.info("Firewall policy: %d rules compiled to %d flows",
+             compiled.source_rules, len(compiled.rules) + 1)
 
     def start_switch(event):
         log.debug("Controlling %s" % (event.connection,))
-        Firewall(event.connection)
+        Firewall(event.connection, compiled, guard)
 
     core.openflow.addListenerByName("ConnectionUp", start_switch)
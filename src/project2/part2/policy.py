@@ -0,0 +1,387 @@
+# Firewall policy language for the part2 controller
+#
+# A policy is an ordered list of rules, one per line; the first rule that
+# matches a packet decides it, and anything no rule matches gets the
+# default action.  Blank lines and '#' comments are ignored.
+#
+#   <allow|deny> [all|ip|arp|ethertype N] [icmp|tcp|udp|proto N]
+#                [src A.B.C.D[/len]] [dst A.B.C.D[/len]] [sport N] [dport N]
+#
+# e.g.
+#   allow icmp
+#   allow arp
+#   deny tcp src 10.0.0.0/24 dport 22
+#   deny all
+#
+# compile_policy() turns the text into a CompiledPolicy: shadowed and
+# redundant rules are removed, the survivors get descending OpenFlow
+# priorities, and a Classifier mirrors the switch table for the packet-in
+# path.  Nothing here needs POX except CompiledPolicy.flow_mods().
+
+import socket
+import struct
+from collections import namedtuple
+
+ETH_IP = 0x0800
+ETH_ARP = 0x0806
+
+ETHERTYPES = {"ip": ETH_IP, "arp": ETH_ARP}
+PROTOCOLS = {"icmp": 1, "tcp": 6, "udp": 17}
+ACTIONS = ("allow", "deny")
+
+# Highest priority handed out; rule i of the compiled policy gets BASE - i
+BASE_PRIORITY = 0xF000
+
+# Header fields a packet is classified on.  nw_src/nw_dst are ints.
+Headers = namedtuple("Headers", "dl_type nw_proto nw_src nw_dst tp_src tp_dst")
+
+
+class PolicyError(ValueError):
+    """
+    Raised for a malformed policy line.
+    """
+
+    def __init__(self, lineno, line, reason):
+        ValueError.__init__(self, "line %d: %s (%r)" % (lineno, reason, line))
+        self.lineno = lineno
+
+
+def parse_prefix(text):
+    """
+    'A.B.C.D/len' -> (network int, prefix length)
+    """
+    addr, _, bits = text.partition("/")
+    bits = int(bits) if bits else 32
+    if not 0 <= bits <= 32:
+        raise ValueError("bad prefix length %d" % bits)
+    mask = (0xFFFFFFFF << (32 - bits)) & 0xFFFFFFFF
+    return struct.unpack("!I", socket.inet_aton(addr))[0] & mask, bits
+
+
+def format_prefix(prefix):
+    value, bits = prefix
+    return "%s/%d" % (socket.inet_ntoa(struct.pack("!I", value)), bits)
+
+
+def _prefix_contains(outer, inner):
+    """
+    True if prefix `outer` contains prefix `inner` (None is 0.0.0.0/0).
+    """
+    if outer is None:
+        return True
+    if inner is None:
+        return False
+    value, bits = outer
+    inner_value, inner_bits = inner
+    if inner_bits < bits:
+        return False
+    mask = (0xFFFFFFFF << (32 - bits)) & 0xFFFFFFFF
+    return inner_value & mask == value
+
+
+def _prefix_overlaps(a, b):
+    return _prefix_contains(a, b) or _prefix_contains(b, a)
+
+
+class Rule(object):
+    """
+    One policy rule.  Fields left as None are wildcards.
+    """
+
+    __slots__ = ("action", "dl_type", "nw_proto", "nw_src", "nw_dst",
+                 "tp_src", "tp_dst", "lineno", "priority")
+
+    EXACT = ("dl_type", "nw_proto", "tp_src", "tp_dst")
+    PREFIX = ("nw_src", "nw_dst")
+
+    def __init__(self, action, dl_type=None, nw_proto=None, nw_src=None,
+                 nw_dst=None, tp_src=None, tp_dst=None, lineno=0):
+        self.action = action
+        self.dl_type = dl_type
+        self.nw_proto = nw_proto
+        self.nw_src = nw_src
+        self.nw_dst = nw_dst
+        self.tp_src = tp_src
+        self.tp_dst = tp_dst
+        self.lineno = lineno
+        self.priority = None
+
+    def covers(self, other):
+        """
+        True if every packet matched by `other` is also matched by self.
+        """
+        for name in self.EXACT:
+            mine = getattr(self, name)
+            if mine is not None and mine != getattr(other, name):
+                return False
+        for name in self.PREFIX:
+            if not _prefix_contains(getattr(self, name), getattr(other, name)):
+                return False
+        return True
+
+    def overlaps(self, other):
+        """
+        True if some packet could match both rules.
+        """
+        for name in self.EXACT:
+            mine, theirs = getattr(self, name), getattr(other, name)
+            if mine is not None and theirs is not None and mine != theirs:
+                return False
+        for name in self.PREFIX:
+            if not _prefix_overlaps(getattr(self, name), getattr(other, name)):
+                return False
+        return True
+
+    def matches(self, headers):
+        if self.dl_type is not None and headers.dl_type != self.dl_type:
+            return False
+        if self.nw_proto is not None and headers.nw_proto != self.nw_proto:
+            return False
+        if self.tp_src is not None and headers.tp_src != self.tp_src:
+            return False
+        if self.tp_dst is not None and headers.tp_dst != self.tp_dst:
+            return False
+        if self.nw_src is not None:
+            value, bits = self.nw_src
+            if bits and (headers.nw_src >> (32 - bits)) != value >> (32 - bits):
+                return False
+        if self.nw_dst is not None:
+            value, bits = self.nw_dst
+            if bits and (headers.nw_dst >> (32 - bits)) != value >> (32 - bits):
+                return False
+        return True
+
+    def __repr__(self):
+        parts = [self.action]
+        if self.dl_type is not None:
+            parts.append("ethertype 0x%04x" % self.dl_type)
+        if self.nw_proto is not None:
+            parts.append("proto %d" % self.nw_proto)
+        if self.nw_src is not None:
+            parts.append("src " + format_prefix(self.nw_src))
+        if self.nw_dst is not None:
+            parts.append("dst " + format_prefix(self.nw_dst))
+        if self.tp_src is not None:
+            parts.append("sport %d" % self.tp_src)
+        if self.tp_dst is not None:
+            parts.append("dport %d" % self.tp_dst)
+        if len(parts) == 1:
+            parts.append("all")
+        return "<Rule %s>" % " ".join(parts)
+
+
+def parse_rule(line, lineno=0):
+    """
+    Parses one policy line into a Rule, filling in the OpenFlow 1.0
+    prerequisites (a protocol implies IPv4, a port implies TCP/UDP).
+    """
+    tokens = line.split()
+    if not tokens or tokens[0] not in ACTIONS:
+        raise PolicyError(lineno, line, "rule must start with allow or deny")
+    rule = Rule(tokens[0], lineno=lineno)
+    i = 1
+    try:
+        while i < len(tokens):
+            token = tokens[i]
+            if token in ("all", "any"):
+                i += 1
+            elif token in ETHERTYPES:
+                rule.dl_type = ETHERTYPES[token]
+                i += 1
+            elif token in PROTOCOLS:
+                rule.dl_type, rule.nw_proto = ETH_IP, PROTOCOLS[token]
+                i += 1
+            elif token == "ethertype":
+                rule.dl_type = int(tokens[i + 1], 0)
+                i += 2
+            elif token == "proto":
+                rule.dl_type, rule.nw_proto = ETH_IP, int(tokens[i + 1], 0)
+                i += 2
+            elif token in ("src", "dst"):
+                setattr(rule, "nw_" + token, parse_prefix(tokens[i + 1]))
+                i += 2
+            elif token in ("sport", "dport"):
+                setattr(rule, "tp_src" if token == "sport" else "tp_dst",
+                        int(tokens[i + 1]))
+                i += 2
+            else:
+                raise PolicyError(lineno, line, "unknown token %r" % token)
+    except PolicyError:
+        raise
+    except (IndexError, ValueError, OSError):
+        raise PolicyError(lineno, line, "bad value for %r" % tokens[i])
+    if (rule.nw_src or rule.nw_dst) and rule.dl_type is None:
+        rule.dl_type = ETH_IP
+    if rule.tp_src is not None or rule.tp_dst is not None:
+        if rule.nw_proto not in (6, 17):
+            raise PolicyError(lineno, line, "ports need tcp or udp")
+    return rule
+
+
+def parse_policy(text):
+    rules = []
+    for lineno, line in enumerate(text.splitlines(), 1):
+        line = line.split("#", 1)[0].strip()
+        if line:
+            rules.append(parse_rule(line, lineno))
+    return rules
+
+
+def optimize(rules, default="deny"):
+    """
+    Removes rules that can never decide a packet:
+
+    - shadowed: an earlier rule matches everything this rule matches
+    - redundant: removing the rule hands its packets to a later rule (or
+      the default) with the same action, and no rule in between with a
+      different action overlaps it
+
+    Returns the surviving rules in order.
+    """
+    kept = []
+    for rule in rules:
+        if not any(earlier.covers(rule) for earlier in kept):
+            kept.append(rule)
+
+    catch_all = Rule(default)
+    # Walk bottom-up so each decision sees the final set of later rules
+    result = []
+    for rule in reversed(kept):
+        redundant = False
+        for later in result + [catch_all]:
+            if later.action != rule.action:
+                if later.overlaps(rule):
+                    break
+            elif later.covers(rule):
+                redundant = True
+                break
+        if not redundant:
+            result.insert(0, rule)
+    return result
+
+
+class Classifier(object):
+    """
+    Software twin of the compiled flow table for the packet-in path.
+
+    Rules are bucketed by (dl_type, nw_proto) so a lookup only scans rules
+    that could apply to that kind of packet, and decisions are memoised per
+    header tuple.
+    """
+
+    def __init__(self, rules, default="deny", cache_size=65536):
+        self.default = default
+        self.cache_size = cache_size
+        self.cache = {}
+        self.wild = {}
+        buckets = {}
+        keys = set((r.dl_type, r.nw_proto) for r in rules)
+        for key in keys:
+            buckets[key] = [r for r in rules
+                            if r.dl_type in (None, key[0]) and r.nw_proto in (None, key[1])]
+        self.buckets = buckets
+        self.rules = rules
+
+    def _candidates(self, headers):
+        for key in ((headers.dl_type, headers.nw_proto),
+                    (headers.dl_type, None), (None, None)):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                return bucket
+        return ()
+
+    def lookup(self, headers):
+        """
+        Returns the first matching Rule, or None for the default action.
+        """
+        try:
+            return self.cache[headers]
+        except KeyError:
+            pass
+        found = None
+        for rule in self._candidates(headers):
+            if rule.matches(headers):
+                found = rule
+                break
+        if len(self.cache) >= self.cache_size:
+            self.cache.clear()
+        self.cache[headers] = found
+        return found
+
+    def classify(self, headers):
+        rule = self.lookup(headers)
+        return rule.action if rule is not None else self.default
+
+
+class CompiledPolicy(object):
+    """
+    An optimised, prioritised policy ready to install on a switch.
+    """
+
+    def __init__(self, rules, default="deny", source_rules=0):
+        self.rules = rules
+        self.default = default
+        self.source_rules = source_rules
+        for i, rule in enumerate(rules):
+            rule.priority = BASE_PRIORITY - i
+        self.classifier = Classifier(rules, default)
+
+    def classify(self, headers):
+        return self.classifier.classify(headers)
+
+    def flow_mods(self, of, allow_actions):
+        """
+        Builds POX ofp_flow_mods for the policy.  allow_actions is the list
+        of actions for allowed packets; denied packets get no actions.  A
+        lowest-priority catch-all carries the default action.
+        """
+        mods = []
+        for rule in self.rules + [Rule(self.default)]:
+            fm = of.ofp_flow_mod()
+            fm.priority = rule.priority if rule.priority is not None else 0
+            fm.match = of.ofp_match()
+            if rule.dl_type is not None:
+                fm.match.dl_type = rule.dl_type
+            if rule.nw_proto is not None:
+                fm.match.nw_proto = rule.nw_proto
+            if rule.nw_src is not None:
+                fm.match.nw_src = format_prefix(rule.nw_src)
+            if rule.nw_dst is not None:
+                fm.match.nw_dst = format_prefix(rule.nw_dst)
+            if rule.tp_src is not None:
+                fm.match.tp_src = rule.tp_src
+            if rule.tp_dst is not None:
+                fm.match.tp_dst = rule.tp_dst
+            if rule.action == "allow":
+                fm.actions.extend(allow_actions)
+            mods.append(fm)
+        return mods
+
+
+def compile_policy(text, default="deny"):
+    rules = parse_policy(text)
+    return CompiledPolicy(optimize(rules, default), default, len(rules))
+
+
+def headers_from_packet(packet):
+    """
+    Extracts classifier Headers from a parsed POX ethernet packet.  ARP
+    packets use the sender/target protocol addresses, the way OpenFlow 1.0
+    matches them.
+    """
+    dl_type = packet.type
+    nw_proto = nw_src = nw_dst = tp_src = tp_dst = 0
+    if dl_type == ETH_IP:
+        ip = packet.payload
+        nw_proto = ip.protocol
+        nw_src, nw_dst = ip.srcip.toUnsigned(), ip.dstip.toUnsigned()
+        l4 = ip.payload
+        if nw_proto in (6, 17):
+            tp_src, tp_dst = l4.srcport, l4.dstport
+        elif nw_proto == 1:
+            tp_src, tp_dst = l4.type, l4.code
+    elif dl_type == ETH_ARP:
+        arp = packet.payload
+        nw_proto = arp.opcode
+        nw_src, nw_dst = arp.protosrc.toUnsigned(), arp.protodst.toUnsigned()
+    return Headers(dl_type, nw_proto, nw_src, nw_dst, tp_src, tp_dst)
@@ -3,29 +3,27 @@
 # based on Lab Final from UCSC's Networking Class
 # which is based on of_tutorial by James McCauley
 
+import os
+import sys
+
 from pox.core import core
 import pox.openflow.libopenflow_01 as of
 from pox.lib.addresses import IPAddr, IPAddr6, EthAddr
 
+# The shared project2 modules live one level up (also when this file is
+# symlinked into pox/ext)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from flowstats import record_packet_in
+import topogen
+from admission import PacketInGuard, guard_options
+
 log = core.getLogger()
 
-# Convenience mappings of hostnames to ips
-IPS = {
-    "h10": "10.0.1.10",
-    "h20": "10.0.2.20",
-    "h30": "10.0.3.30",
-    "serv1": "10.0.4.10",
-    "hnotrust": "172.16.10.100",
-}
-
-# Convenience mappings of hostnames to subnets
-SUBNETS = {
-    "h10": "10.0.1.0/24",
-    "h20": "10.0.2.0/24",
-    "h30": "10.0.3.0/24",
-    "serv1": "10.0.4.0/24",
-    "hnotrust": "172.16.10.0/24",
-}
+# Layouts with hand-written per-switch setups; switches of any other
+# (generated) topology get their routes from the config
+COURSE_LAYOUTS = ("part3", "part4")
+# The untrusted host of the course layout
+UNTRUSTED = "hnotrust1"
 
 
 class Part3Controller(object):
@@ -33,11 +31,14 @@ class Part3Controller(object):
     A Connection object for that switch is passed to the __init__ function.
     """
 
-    def __init__(self, connection):
+    def __init__(self, connection, config=None, guard=None):
         print(connection.dpid)
         # Keep track of the connection to the switch so that we can
         # send it messages!
         self.connection = connection
+        # Hostnames, subnets, dpids and routes of the topology
+        self.config = config or topogen.load_config(family="part3")
+        self.subnets = self.config["subnets"]
 
         arp_fm = of.ofp_flow_mod()
         arp_fm.match = of.ofp_match(dl_type=0x0806)
@@ -46,20 +47,18 @@ class Part3Controller(object):
 
         # This binds our PacketIn event listener
         connection.addListeners(self)
+        # Rate limits packet-ins before we do any work on them
+        self.guard = PacketInGuard(connection, **(guard or {}))
         # use the dpid to figure out what switch is being created
-        if connection.dpid == 1:
-            self.s1_setup()
-        elif connection.dpid == 2:
-            self.s2_setup()
-        elif connection.dpid == 3:
-            self.s3_setup()
-        elif connection.dpid == 21:
-            self.cores21_setup()
-        elif connection.dpid == 31:
-            self.dcs31_setup()
+        name = topogen.switch_name(self.config, connection.dpid)
+        if name is None:
+            log.error("Switch %s is not in the %s topology; not configuring it",
+                      connection.dpid, self.config["name"])
+            return
+        if self.config["name"] in COURSE_LAYOUTS:
+            getattr(self, name + "_setup")()
         else:
-            print("UNKNOWN SWITCH")
-            exit(1)
+            self.routes_setup(name)
 
     def s1_setup(self):
         fm = of.ofp_flow_mod()
@@ -80,51 +79,39 @@ class Part3Controller(object):
         notrust_fm = of.ofp_flow_mod()
         notrust_fm.match = of.ofp_match(dl_type=0x0800)
         notrust_fm.match.nw_proto = 1
-        notrust_fm.match.nw_src = SUBNETS["hnotrust"]
+        notrust_fm.match.nw_src = self.subnets[UNTRUSTED]
         notrust_fm.actions.append(of.ofp_action_output(port=0))
         self.connection.send(notrust_fm)
 
-        h10_fm = of.ofp_flow_mod()
-        h10_fm.match = of.ofp_match(dl_type=0x0800)
-        h10_fm.match.nw_dst = SUBNETS["h10"]
-        h10_fm.actions.append(of.ofp_action_output(port=1))
-        self.connection.send(h10_fm)
-
-        h20_fm = of.ofp_flow_mod()
-        h20_fm.match = of.ofp_match(dl_type=0x0800)
-        h20_fm.match.nw_dst = SUBNETS["h20"]
-        h20_fm.actions.append(of.ofp_action_output(port=2))
-        self.connection.send(h20_fm)
-
-        h30_fm = of.ofp_flow_mod()
-        h30_fm.match = of.ofp_match(dl_type=0x0800)
-        h30_fm.match.nw_dst = SUBNETS["h30"]
-        h30_fm.actions.append(of.ofp_action_output(port=3))
-        self.connection.send(h30_fm)
-
-        serv1_fm = of.ofp_flow_mod()
-        serv1_fm.match = of.ofp_match(dl_type=0x0800)
-        serv1_fm.match.nw_dst = SUBNETS["serv1"]
-        serv1_fm.actions.append(of.ofp_action_output(port=4))
-        self.connection.send(serv1_fm)
-
-        hnotrust_fm = of.ofp_flow_mod()
-        hnotrust_fm.match = of.ofp_match(dl_type=0x0800)
-        hnotrust_fm.match.nw_dst = SUBNETS["hnotrust"]
-        hnotrust_fm.actions.append(of.ofp_action_output(port=5))
-        self.connection.send(hnotrust_fm)
+        # One rule per subnet, out of the port the topology routes it to
+        for subnet, port in sorted(self.config["routes"]["cores21"].items()):
+            fm = of.ofp_flow_mod()
+            fm.match = of.ofp_match(dl_type=0x0800)
+            fm.match.nw_dst = subnet
+            fm.actions.append(of.ofp_action_output(port=port))
+            self.connection.send(fm)
 
     def dcs31_setup(self):
         notrust_fm = of.ofp_flow_mod()
         notrust_fm.match = of.ofp_match(dl_type=0x0800)
-        notrust_fm.match.nw_src = SUBNETS["hnotrust"]
+        notrust_fm.match.nw_src = self.subnets[UNTRUSTED]
         notrust_fm.actions.append(of.ofp_action_output(port=0))
         self.connection.send(notrust_fm)
 
         fm = of.ofp_flow_mod()
         fm.actions.append(of.ofp_action_output(port=of.OFPP_FLOOD))
         self.connection.send(fm)
-       
+
+    def routes_setup(self, name):
+        # Longer prefixes win: a host's /32 beats its subnet's route
+        for nw_dst, port in topogen.switch_routes(self.config, name):
+            fm = of.ofp_flow_mod()
+            fm.priority = of.OFP_DEFAULT_PRIORITY + int(nw_dst.split("/")[1])
+            fm.match = of.ofp_match(dl_type=0x0800)
+            fm.match.nw_dst = nw_dst
+            fm.actions.append(of.ofp_action_output(port=port))
+            self.connection.send(fm)
+
 
     # used in part 4 to handle individual ARP packets
     # not needed for part 3 (USE RULES!)
@@ -147,19 +134,29 @@ class Part3Controller(object):
             log.warning("Ignoring incomplete packet")
             return
 
+        if not self.guard.admit(event):
+            return
+
         packet_in = event.ofp  # The actual ofp_packet_in message.
-        print(
-            "Unhandled packet from " + str(self.connection.dpid) + ":" + packet.dump()
-        )
+        record_packet_in(event)
+        if self.guard.sample():
+            print(
+                "Unhandled packet from " + str(self.connection.dpid) + ":" + packet.dump()
+            )
 
 
-def launch():
+def launch(config=None, **guard):
     """
-    Starts the component
+    Starts the component.  --config=FILE loads the topology written by
+    topogen.py --config instead of the part3 layout; the
+    admission.GUARD_OPTIONS set the packet-in budgets (e.g.
+    --source_rate=100).
     """
+    config = topogen.load_config(config, family="part3")
+    guard = guard_options(**guard)
 
     def start_switch(event):
         log.debug("Controlling %s" % (event.connection,))
-        Part3Controller(event.connection)
+        Part3Controller(event.connection, config, guard)
 
     core.openflow.addListenerByName("ConnectionUp", start_switch)
@@ -3,6 +3,9 @@
 # based on Lab Final from UCSC's Networking Class
 # which is based on of_tutorial by James McCauley
 
+import os
+import sys
+
 from pox.core import core
 import pox.openflow.libopenflow_01 as of
 from pox.lib.addresses import IPAddr, IPAddr6, EthAddr
@@ -10,25 +13,21 @@ from pox.lib.packet.arp import arp
 from pox.lib.packet.ethernet import ethernet
 from collections import defaultdict
 
+# The shared project2 modules live one level up (also when this file is
+# symlinked into pox/ext)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from flowstats import record_packet_in
+import topogen
+from admission import PacketInGuard, guard_options, FORWARDING
+
 log = core.getLogger()
 
-# Convenience mappings of hostnames to ips
-IPS = {
-    "h10": "10.0.1.10",
-    "h20": "10.0.2.20",
-    "h30": "10.0.3.30",
-    "serv1": "10.0.4.10",
-    "hnotrust": "172.16.10.100",
-}
-
-# Convenience mappings of hostnames to subnets
-SUBNETS = {
-    "h10": "10.0.1.0/24",
-    "h20": "10.0.2.0/24",
-    "h30": "10.0.3.0/24",
-    "serv1": "10.0.4.0/24",
-    "hnotrust": "172.16.10.0/24",
-}
+# Layouts with hand-written per-switch setups; switches of any other
+# (generated) topology get no rules and are routed
+# by packet-in
+COURSE_LAYOUTS = ("part3", "part4")
+# The untrusted host of the course layout
+UNTRUSTED = "hnotrust1"
 
 
 class Part4Controller(object):
@@ -36,11 +35,14 @@ class Part4Controller(object):
     A Connection object for that switch is passed to the __init__ function.
     """
 
-    def __init__(self, connection):
+    def __init__(self, connection, config=None, guard=None):
         print(connection.dpid)
         # Keep track of the connection to the switch so that we can
         # send it messages!
         self.connection = connection
+        # Hostnames, subnets and dpids of the topology
+        self.config = config or topogen.load_config(family="part4")
+        self.subnets = self.config["subnets"]
         
         ipv6_fm = of.ofp_flow_mod()
         ipv6_fm.match = of.ofp_match(dl_type=0x0886)
@@ -53,20 +55,18 @@ class Part4Controller(object):
 
         # This binds our PacketIn event listener
         connection.addListeners(self)
+        # Rate limits packet-ins before we do any work on them
+        self.guard = PacketInGuard(connection, **(guard or {}))
         # use the dpid to figure out what switch is being created
-        if connection.dpid == 1:
-            self.s1_setup()
-        elif connection.dpid == 2:
-            self.s2_setup()
-        elif connection.dpid == 3:
-            self.s3_setup()
-        elif connection.dpid == 21:
-            self.cores21_setup()
-        elif connection.dpid == 31:
-            self.dcs31_setup()
+        name = topogen.switch_name(self.config, connection.dpid)
+        if name is None:
+            log.error("Switch %s is not in the %s topology; not configuring it",
+                      connection.dpid, self.config["name"])
+            return
+        if self.config["name"] in COURSE_LAYOUTS:
+            getattr(self, name + "_setup")()
         else:
-            print("UNKNOWN SWITCH")
-            exit(1)
+            log.debug("Routing %s by packet-in only", name)
 
     def s1_setup(self):
         fm = of.ofp_flow_mod()
@@ -87,14 +87,14 @@ class Part4Controller(object):
         notrust_fm = of.ofp_flow_mod()
         notrust_fm.match = of.ofp_match(dl_type=0x0800)
         notrust_fm.match.nw_proto = 1
-        notrust_fm.match.nw_src = SUBNETS["hnotrust"]
+        notrust_fm.match.nw_src = self.subnets[UNTRUSTED]
         notrust_fm.actions.append(of.ofp_action_output(port=0))
         self.connection.send(notrust_fm)
 
     def dcs31_setup(self):
         notrust_fm = of.ofp_flow_mod()
         notrust_fm.match = of.ofp_match(dl_type=0x0800)
-        notrust_fm.match.nw_src = SUBNETS["hnotrust"]
+        notrust_fm.match.nw_src = self.subnets[UNTRUSTED]
         notrust_fm.actions.append(of.ofp_action_output(port=0))
         self.connection.send(notrust_fm)
 
@@ -125,14 +125,18 @@ class Part4Controller(object):
             log.warning("Ignoring incomplete packet")
             return
 
-        packet_in = event.ofp  # The actual ofp_packet_in message.
-        print(
-            "Unhandled packet from " + str(self.connection.dpid) + ":" + packet.dump()
-        )
-
-        src_ip, dst_ip = "", ""
+        if not self.guard.admit(event):
+            return
 
-        if not packet.type == packet.ARP_TYPE:
+        packet_in = event.ofp  # The actual ofp_packet_in message.
+        record_packet_in(event)
+        if self.guard.sample():
+            print(
+                "Unhandled packet from " + str(self.connection.dpid) + ":" + packet.dump()
+            )
+
+        is_arp = packet.type == packet.ARP_TYPE
+        if not is_arp:
             # Get the ip address information
             ip_packet = packet.payload
             src_ip = ip_packet.srcip
@@ -154,25 +158,34 @@ class Part4Controller(object):
             ether.payload = arp_reply
             self.resend_packet(ether.pack(), packet_in.in_port)
 
+        # The tables are keyed by the string form; convert once
+        src_key, dst_key = str(src_ip), str(dst_ip)
+
         # If IP not in look-up table
-        if src_ip not in self.ip_to_port:
-            self.ip_to_port[str(src_ip)] = packet_in.in_port
+        if src_key not in self.ip_to_port:
+            self.ip_to_port[src_key] = packet_in.in_port
             self.port_to_mac[packet_in.in_port] = packet.src
 
         # If IP is in look-up table
-        if str(dst_ip) in self.ip_to_port.keys() and not packet.type == packet.ARP_TYPE:
+        dst_port = self.ip_to_port.get(dst_key)
+        if dst_port is not None and not is_arp:
             # Put the actual MAC address into the packet so the dst host accepts it
-            packet.dst = self.port_to_mac[self.ip_to_port[str(dst_ip)]]
-            self.resend_packet(packet.pack(), self.ip_to_port[str(dst_ip)])
+            packet.dst = self.port_to_mac[dst_port]
+            self.resend_packet(packet.pack(), dst_port)
 
 
-def launch():
+def launch(config=None, **guard):
     """
-    Starts the component
+    Starts the component.  --config=FILE loads the topology written by
+    topogen.py --config instead of the part4 layout.  Every routed packet
+    is a packet-in, so the packet-in budgets are off unless given as
+    admission.GUARD_OPTIONS (e.g. --switch_rate=5000).
     """
+    config = topogen.load_config(config, family="part4")
+    guard = guard_options(FORWARDING, **guard)
 
     def start_switch(event):
         log.debug("Controlling %s" % (event.connection,))
-        Part4Controller(event.connection)
+        Part4Controller(event.connection, config, guard)
 
     core.openflow.addListenerByName("ConnectionUp", start_switch)
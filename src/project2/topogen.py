@@ -0,0 +1,446 @@
+#!/usr/bin/python
+# Parametric topology generator for project2
+#
+# Builds a TopoSpec -- switches, hosts with deterministic MAC/IP/gateway,
+# and links -- for the hand-written part1-part4 layouts and for scalable
+# families (linear, tree, leaf-spine, fat-tree).  The same spec produces
+# the Mininet topology and the controller config (subnets, gateway IPs,
+# port maps, per-switch routes), so the two can never drift apart.
+#
+# Nothing here imports Mininet until a spec is built into a Topo, so the
+# controllers and ofsim.py can use it too.
+#
+# Usage:
+#   python topogen.py fat_tree --k 4 --config fat4.json
+#   sudo python topogen.py leaf_spine --leaves 8 --spines 2 --hosts 16 --run
+
+import argparse
+import json
+import socket
+import struct
+
+# Mininet numbers switch ports from 1 and host ports (ethN) from 0, in the
+# order links are added
+SWITCH_PORT_BASE = 1
+HOST_PORT_BASE = 0
+
+
+def _ip(value):
+    return socket.inet_ntoa(struct.pack("!I", value))
+
+
+def _ip_value(ip):
+    return struct.unpack("!I", socket.inet_aton(ip))[0]
+
+
+def host_mac(index):
+    """
+    Deterministic MAC for the index-th host (1-based), 00:00:00:00:00:01 on.
+    """
+    return ":".join("%02x" % b for b in index.to_bytes(6, "big"))
+
+
+def subnet_base(index, first=(10, 0, 1)):
+    """
+    Network address of the index-th /24 (0-based), counting up from
+    first.0/24 -- 10.0.1.0, 10.0.2.0, ... 10.0.255.0, 10.1.0.0, ...
+    """
+    start = (first[0] << 24) | (first[1] << 16) | (first[2] << 8)
+    return start + (index << 8)
+
+
+class HostSpec(object):
+    __slots__ = ("name", "mac", "ip", "prefixlen", "gateway", "route")
+
+    def __init__(self, name, mac=None, ip=None, prefixlen=24, gateway=None,
+                 route="gateway"):
+        self.name = name
+        self.mac = mac
+        self.ip = ip
+        self.prefixlen = prefixlen
+        self.gateway = gateway
+        # "gateway": default route via the gateway IP (part4 style)
+        # "iface":   default route out of eth0 (part3 style)
+        # None:      leave Mininet's default
+        self.route = route
+
+    @property
+    def subnet(self):
+        if self.ip is None:
+            return None
+        mask = (0xFFFFFFFF << (32 - self.prefixlen)) & 0xFFFFFFFF
+        return "%s/%d" % (_ip(_ip_value(self.ip) & mask), self.prefixlen)
+
+    def mininet_params(self):
+        params = {}
+        if self.mac is not None:
+            params["mac"] = self.mac
+        if self.ip is not None:
+            params["ip"] = "%s/%d" % (self.ip, self.prefixlen)
+        if self.route == "gateway" and self.gateway is not None:
+            params["defaultRoute"] = "via %s" % self.gateway
+        elif self.route == "iface":
+            params["defaultRoute"] = "%s-eth0" % self.name
+        return params
+
+
+class TopoSpec(object):
+    """
+    A topology description independent of Mininet.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.switches = {}
+        self.hosts = {}
+        self.links = []
+        self.ports = {}
+
+    def add_switch(self, name, dpid=None):
+        if dpid is None:
+            # Same rule Mininet uses: the first number in the name
+            digits = "".join(c if c.isdigit() else " " for c in name).split()
+            dpid = int(digits[0]) if digits else len(self.switches) + 1
+        self.switches[name] = dpid
+        self.ports[name] = {}
+        return name
+
+    def add_host(self, name, **params):
+        self.hosts[name] = HostSpec(name, **params)
+        self.ports[name] = {}
+        return name
+
+    def add_link(self, a, b):
+        for node, peer in ((a, b), (b, a)):
+            base = SWITCH_PORT_BASE if node in self.switches else HOST_PORT_BASE
+            self.ports[node][peer] = base + len(self.ports[node])
+        self.links.append((a, b))
+
+    def build(self, topo):
+        """
+        Adds this spec's nodes and links to a mininet.topo.Topo.
+        """
+        for name, dpid in self.switches.items():
+            topo.addSwitch(name, dpid="%016x" % dpid)
+        for host in self.hosts.values():
+            topo.addHost(host.name, **host.mininet_params())
+        for a, b in self.links:
+            topo.addLink(a, b)
+
+    def access_switch(self, host):
+        return next(iter(self.ports[host]))
+
+    def routes(self):
+        """
+        {switch: {subnet: out_port}} along shortest paths (lowest port wins
+        ties), computed with one BFS per subnet.
+        """
+        subnets = {}
+        for host in self.hosts.values():
+            if host.subnet is not None:
+                subnets.setdefault(host.subnet, set()).add(self.access_switch(host.name))
+        routes = dict((s, {}) for s in self.switches)
+        for subnet, roots in sorted(subnets.items()):
+            # Hosts of a subnet hang off their access switches directly
+            for host in self.hosts.values():
+                if host.subnet == subnet:
+                    switch = self.access_switch(host.name)
+                    port = self.ports[switch][host.name]
+                    current = routes[switch].get(subnet)
+                    routes[switch][subnet] = port if current is None else min(current, port)
+            # Walk outwards a level at a time so a switch with several
+            # equally short paths picks its lowest-numbered port
+            seen = set(roots)
+            frontier = roots
+            while frontier:
+                best = {}
+                for node in frontier:
+                    for peer in self.ports[node]:
+                        if peer in self.switches and peer not in seen:
+                            port = self.ports[peer][node]
+                            if port < best.get(peer, port + 1):
+                                best[peer] = port
+                for peer, port in best.items():
+                    routes[peer][subnet] = port
+                seen.update(best)
+                frontier = set(best)
+        return routes
+
+    def controller_config(self):
+        """
+        Everything a controller needs to know about this topology.
+        """
+        hosts = [h for h in self.hosts.values() if h.ip is not None]
+        return {
+            "name": self.name,
+            "dpids": dict(self.switches),
+            "ips": dict((h.name, h.ip) for h in hosts),
+            "macs": dict((h.name, h.mac) for h in hosts if h.mac),
+            "subnets": dict((h.name, h.subnet) for h in hosts),
+            "gateways": dict((h.subnet, h.gateway) for h in hosts if h.gateway),
+            "ports": dict((s, dict(self.ports[s])) for s in self.switches),
+            "routes": self.routes(),
+        }
+
+    def hosts_for_switch(self, switch):
+        """
+        (in_port, mac, ip) for every addressed host as seen from `switch`,
+        the form ofsim.synthetic_trace() takes.
+        """
+        routes = self.routes()[switch]
+        attached = self.ports[switch]
+        result = []
+        for i, host in enumerate(self.hosts.values(), 1):
+            if host.ip is None:
+                continue
+            # Hosts on this switch arrive on their own port; the subnet
+            # route only names one port per subnet
+            if host.name in attached:
+                port = attached[host.name]
+            elif host.subnet in routes:
+                port = routes[host.subnet]
+            else:
+                continue
+            result.append((port, host.mac or host_mac(i), host.ip))
+        return result
+
+
+def load_config(path=None, family="part3"):
+    """
+    A controller config: the JSON written by --config, or the config of
+    the `family` layout when no path is given.
+    """
+    if path is None:
+        return FAMILIES[family]().controller_config()
+    with open(path) as f:
+        return json.load(f)
+
+
+def switch_name(config, dpid):
+    """
+    The name `config` gives the switch with `dpid`, or None.
+    """
+    for name, value in config["dpids"].items():
+        if value == dpid:
+            return name
+    return None
+
+
+def switch_routes(config, switch):
+    """
+    [(nw_dst, out_port)] for `switch`, most specific first: a /32 for
+    each host attached to it, then its route for every subnet.
+    """
+    ports = config["ports"][switch]
+    entries = [("%s/32" % config["ips"][peer], port)
+               for peer, port in sorted(ports.items(), key=lambda item: item[1])
+               if peer in config["ips"]]
+    entries.extend(sorted(config["routes"][switch].items()))
+    return entries
+
+
+def _addressed_host(spec, name, index, subnet, slot, route="gateway"):
+    """
+    Host `slot` (0-based) of /24 number `subnet`: gateway .1, hosts from .2
+    """
+    base = subnet_base(subnet)
+    if slot > 252:
+        raise ValueError("at most 253 hosts per /24 subnet")
+    return spec.add_host(name, mac=host_mac(index), ip=_ip(base + 2 + slot),
+                         prefixlen=24, gateway=_ip(base + 1), route=route)
+
+
+# The original course layouts
+
+def part1():
+    spec = TopoSpec("part1")
+    s1 = spec.add_switch("s1")
+    for i in range(1, 5):
+        spec.add_host("h%d" % i, route=None)
+        spec.add_link("h%d" % i, s1)
+    return spec
+
+
+def part2():
+    spec = TopoSpec("part2")
+    s1 = spec.add_switch("s1")
+    for i, ip in enumerate(("10.0.1.2", "10.0.0.2", "10.0.0.3", "10.0.1.3"), 1):
+        spec.add_host("h%d" % i, mac=host_mac(i), ip=ip, route=None)
+        spec.add_link("h%d" % i, s1)
+    return spec
+
+
+def part3(route="iface"):
+    """
+    The part3/part4 layout.  part3 hosts route out of eth0; part4 hosts
+    (route="gateway") route via .1 of their subnet.
+    """
+    spec = TopoSpec("part3" if route == "iface" else "part4")
+    for name in ("s1", "s2", "s3", "cores21", "dcs31"):
+        spec.add_switch(name)
+    for i, (name, ip, gateway) in enumerate((
+            ("h10", "10.0.1.10", "10.0.1.1"),
+            ("h20", "10.0.2.20", "10.0.2.1"),
+            ("h30", "10.0.3.30", "10.0.3.1"),
+            ("serv1", "10.0.4.10", "10.0.4.1"),
+            ("hnotrust1", "172.16.10.100", "172.16.10.1")), 1):
+        spec.add_host(name, mac=host_mac(i), ip=ip, gateway=gateway, route=route)
+    for a, b in (("h10", "s1"), ("h20", "s2"), ("h30", "s3"),
+                 ("s1", "cores21"), ("s2", "cores21"), ("s3", "cores21"),
+                 ("serv1", "dcs31"), ("cores21", "dcs31"),
+                 ("hnotrust1", "cores21")):
+        spec.add_link(a, b)
+    return spec
+
+
+def part4():
+    return part3(route="gateway")
+
+
+# Scalable families.  Every edge switch gets its own /24.
+
+def linear(n=4, hosts=1):
+    spec = TopoSpec("linear%d" % n)
+    index = 0
+    previous = None
+    for i in range(n):
+        switch = spec.add_switch("s%d" % (i + 1), dpid=i + 1)
+        for j in range(hosts):
+            index += 1
+            spec.add_link(_addressed_host(spec, "h%d" % index, index, i, j), switch)
+        if previous:
+            spec.add_link(previous, switch)
+        previous = switch
+    return spec
+
+
+def tree(depth=2, fanout=2):
+    spec = TopoSpec("tree%d-%d" % (depth, fanout))
+    counter = {"switch": 0, "host": 0, "subnet": 0}
+
+    def add(level):
+        counter["switch"] += 1
+        switch = spec.add_switch("s%d" % counter["switch"], dpid=counter["switch"])
+        if level == depth:
+            subnet = counter["subnet"]
+            counter["subnet"] += 1
+            for slot in range(fanout):
+                counter["host"] += 1
+                index = counter["host"]
+                spec.add_link(_addressed_host(spec, "h%d" % index, index, subnet, slot), switch)
+        else:
+            for _ in range(fanout):
+                spec.add_link(switch, add(level + 1))
+        return switch
+
+    add(1)
+    return spec
+
+
+def leaf_spine(leaves=4, spines=2, hosts=4):
+    spec = TopoSpec("leafspine%d-%d" % (leaves, spines))
+    spine_names = [spec.add_switch("spine%d" % (i + 1), dpid=1000 + i + 1)
+                   for i in range(spines)]
+    index = 0
+    for i in range(leaves):
+        leaf = spec.add_switch("leaf%d" % (i + 1), dpid=i + 1)
+        for j in range(hosts):
+            index += 1
+            spec.add_link(_addressed_host(spec, "h%d" % index, index, i, j), leaf)
+        for spine in spine_names:
+            spec.add_link(leaf, spine)
+    return spec
+
+
+def fat_tree(k=4):
+    """
+    k-ary fat tree: (k/2)^2 core switches, k pods of k/2 aggregation and
+    k/2 edge switches, k^3/4 hosts.
+    """
+    if k % 2:
+        raise ValueError("fat tree k must be even")
+    half = k // 2
+    spec = TopoSpec("fattree%d" % k)
+    cores = [spec.add_switch("c%d" % i, dpid=0x10000 + i)
+             for i in range(half * half)]
+    index = 0
+    for pod in range(k):
+        aggs = [spec.add_switch("p%da%d" % (pod, a), dpid=0x20000 + pod * 256 + a)
+                for a in range(half)]
+        for e in range(half):
+            edge = spec.add_switch("p%de%d" % (pod, e), dpid=0x30000 + pod * 256 + e)
+            for slot in range(half):
+                index += 1
+                host = _addressed_host(spec, "h%d" % index, index, pod * half + e, slot)
+                spec.add_link(host, edge)
+            for agg in aggs:
+                spec.add_link(edge, agg)
+        for a, agg in enumerate(aggs):
+            for c in range(half):
+                spec.add_link(agg, cores[a * half + c])
+    return spec
+
+
+FAMILIES = {
+    "part1": part1,
+    "part2": part2,
+    "part3": part3,
+    "part4": part4,
+    "linear": linear,
+    "tree": tree,
+    "leaf_spine": leaf_spine,
+    "fat_tree": fat_tree,
+}
+
+
+def to_mininet(spec):
+    """
+    Returns a mininet Topo built from `spec`.
+    """
+    from mininet.topo import Topo
+
+    class GeneratedTopo(Topo):
+        def build(self):
+            spec.build(self)
+
+    return GeneratedTopo()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate project2 topologies")
+    parser.add_argument("family", choices=sorted(FAMILIES))
+    parser.add_argument("--n", type=int, help="linear: number of switches")
+    parser.add_argument("--depth", type=int, help="tree: depth")
+    parser.add_argument("--fanout", type=int, help="tree: fanout")
+    parser.add_argument("--leaves", type=int, help="leaf_spine: leaf switches")
+    parser.add_argument("--spines", type=int, help="leaf_spine: spine switches")
+    parser.add_argument("--hosts", type=int, help="linear/leaf_spine: hosts per switch")
+    parser.add_argument("--k", type=int, help="fat_tree: port count")
+    parser.add_argument("--config", help="Write the controller config JSON here")
+    parser.add_argument("--run", action="store_true",
+                        help="Start it in Mininet with a remote controller")
+    args = parser.parse_args()
+
+    kwargs = dict((key, value) for key, value in vars(args).items()
+                  if key in ("n", "depth", "fanout", "leaves", "spines", "hosts", "k")
+                  and value is not None)
+    spec = FAMILIES[args.family](**kwargs)
+    print("%s: %d switches, %d hosts, %d links" % (
+        spec.name, len(spec.switches), len(spec.hosts), len(spec.links)))
+
+    if args.config:
+        with open(args.config, "w") as f:
+            json.dump(spec.controller_config(), f, indent=2, sort_keys=True)
+
+    if args.run:
+        from mininet.net import Mininet
+        from mininet.node import RemoteController
+        from mininet.cli import CLI
+        net = Mininet(topo=to_mininet(spec), controller=RemoteController)
+        net.start()
+        CLI(net)
+        net.stop()
+
+
+if __name__ == "__main__":
+    main()
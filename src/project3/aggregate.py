@@ -0,0 +1,340 @@
+'''
+Summarise and compare finished bufferbloat runs.
+
+    python3 aggregate.py reno-q20 reno-q100 bbr-q20 bbr-q100 -o report
+    python3 aggregate.py sweep/*
+
+Each run directory's q, ping and fetch.txt outputs are reduced to summary
+numbers once and cached in DIR/summary.json, keyed by the inputs' sizes and
+mtimes, so re-running the report only reads runs that changed.  Comparison
+figures (one per congestion control across queue sizes, one per queue size
+across congestion controls) are drawn in this one process on a single
+reused figure.  The table is printed in the format the README uses.
+'''
+
+import argparse
+import json
+import math
+import os
+import re
+
+import numpy as np
+
+import decimate
+import stats
+import workload
+from tsformat import load_queue, load_ping
+from webprobe import parse_sample
+
+CACHE_NAME = 'summary.json'
+CACHE_VERSION = 5
+
+# Runs made before bufferbloat.py wrote params.json are named like bbr-q20
+pat_dirname = re.compile(r'(?:^|[-_])([a-z]+)-q(\d+)$')
+
+
+def find_input(run_dir, name):
+    '''DIR/NAME.ts if present, else DIR/NAME.txt, else None.'''
+    for ext in ('.ts', '.txt'):
+        path = os.path.join(run_dir, name + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def run_inputs(run_dir):
+    return {'q': find_input(run_dir, 'q'),
+            'ping': find_input(run_dir, 'ping'),
+            'fetch': find_input(run_dir, 'fetch'),
+            'flows': find_input(run_dir, 'flows'),
+            'qstats': find_input(run_dir, 'qstats'),
+            'tcpinfo': find_input(run_dir, 'tcpinfo')}
+
+
+def _stamp(path):
+    if path is None:
+        return None
+    if os.path.isdir(path):
+        # a .ts series grows by appending to its column files
+        files = [os.path.join(path, f) for f in sorted(os.listdir(path))]
+    else:
+        files = [path]
+    return [[os.path.getsize(f), os.path.getmtime(f)] for f in files]
+
+
+def run_params(run_dir):
+    path = os.path.join(run_dir, 'params.json')
+    if os.path.exists(path):
+        with open(path) as f:
+            params = json.load(f)
+        return {'cong': params.get('cong'), 'maxq': params.get('maxq'),
+                'bw_net': params.get('bw_net'), 'delay': params.get('delay'),
+                'qdisc': params.get('qdisc', 'fifo')}
+    m = pat_dirname.search(os.path.basename(os.path.normpath(run_dir)))
+    if m:
+        return {'cong': m.group(1), 'maxq': int(m.group(2)), 'qdisc': 'fifo'}
+    return {}
+
+
+def fetch_summary(path):
+    '''Fetch times from fetch.txt: "epoch,total" lines, or webprobe.py's
+    "epoch,total,connect,ttfb,bytes,status" with failures dropped.'''
+    with open(path) as f:
+        rows = [parse_sample(line) for line in f if line.strip()]
+    ok = [r for r in rows if r[5] >= 0]
+    result = {'fetch': stats.summary([r[1] for r in ok])}
+    result['fetch']['failed'] = len(rows) - len(ok)
+    ttfb = [r[3] for r in ok if not math.isnan(r[3])]
+    if ttfb:
+        result['ttfb'] = stats.summary(ttfb)
+    return result
+
+
+def qdisc_summary(path):
+    '''Final cumulative counters per qdisc from monitor's qstats.txt.'''
+    last = {}
+    with open(path) as f:
+        for line in f:
+            fields = line.strip().split(',')
+            if len(fields) == 9:
+                last[fields[1]] = {'kind': fields[2], 'packets': int(fields[5]),
+                                   'drops': int(fields[6]), 'marks': int(fields[8])}
+    return last
+
+
+def tcpinfo_summary(path):
+    '''Per-connection medians from tcpinfo.py's series, for connections
+    that carried data.'''
+    from tcpinfo import load_tcpinfo
+    cols, flows = load_tcpinfo(path)
+    result = {}
+    for flow, info in sorted(flows.items()):
+        rows = cols['flow'] == flow
+        acked = cols['bytes_acked'][rows]
+        if acked.size < 2 or acked[-1] <= acked[0]:
+            continue
+        result[str(flow)] = {
+            'cc': info['cc'], 'peer': info['peer'], 'samples': int(rows.sum()),
+            'cwnd_p50': stats.quantiles(cols['cwnd'][rows], (0.5,))[0],
+            'srtt_p50': stats.quantiles(cols['srtt'][rows], (0.5,))[0],
+            'delivery_mbps': stats.mean(cols['delivery_rate'][rows]) / 1e6,
+            'retrans': int(cols['retrans'][rows][-1])}
+    return result
+
+
+def compute_summary(inputs):
+    result = {}
+    if inputs['fetch']:
+        result.update(fetch_summary(inputs['fetch']))
+    if inputs['q']:
+        _, qlen = load_queue(inputs['q'])
+        result['q'] = stats.summary(qlen)
+    if inputs['ping']:
+        _, rtt = load_ping(inputs['ping'])
+        rtt = np.asarray(rtt, dtype=np.float64)
+        lost = int(np.isnan(rtt).sum())
+        result['rtt'] = stats.summary(rtt[~np.isnan(rtt)])
+        result['rtt']['lost'] = lost
+    if inputs['qstats']:
+        result['qdiscs'] = qdisc_summary(inputs['qstats'])
+    if inputs['tcpinfo']:
+        result['tcp'] = tcpinfo_summary(inputs['tcpinfo'])
+    if inputs['flows']:
+        result['flows'] = workload.summarize(workload.read_flows(inputs['flows']))
+    return result
+
+
+def load_run(run_dir, refresh=False):
+    '''{'dir', 'params', 'inputs', 'summary'} for one run directory, from
+    the cache when its inputs have not changed.'''
+    inputs = run_inputs(run_dir)
+    stamps = dict((k, _stamp(v)) for k, v in inputs.items())
+    cache = os.path.join(run_dir, CACHE_NAME)
+    summary = None
+    if not refresh and os.path.exists(cache):
+        try:
+            with open(cache) as f:
+                cached = json.load(f)
+            if cached.get('version') == CACHE_VERSION and cached.get('stamps') == stamps:
+                summary = cached['summary']
+        except (ValueError, KeyError):
+            summary = None
+    if summary is None:
+        summary = compute_summary(inputs)
+        try:
+            with open(cache, 'w') as f:
+                json.dump({'version': CACHE_VERSION, 'stamps': stamps,
+                           'summary': summary}, f, indent=1)
+        except OSError:
+            pass  # read-only results are still summarised, just not cached
+    return {'dir': run_dir, 'params': run_params(run_dir),
+            'inputs': inputs, 'summary': summary,
+            'runtime': run_report(run_dir, 'runtime.json'),
+            'fidelity': run_report(run_dir, 'fidelity.json')}
+
+
+def run_report(run_dir, name):
+    '''A JSON report the run wrote about itself (runtime.py's runtime.json,
+    fidelity.py's fidelity.json), or None.'''
+    path = os.path.join(run_dir, name)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def is_run_dir(path):
+    return os.path.isdir(path) and any(run_inputs(path).values())
+
+
+def run_label(run):
+    p = run['params']
+    label = '%s q%s' % (p.get('cong', '?'), p.get('maxq', '?'))
+    if p.get('qdisc', 'fifo') != 'fifo':
+        label += ' ' + p['qdisc']
+    return label
+
+
+def format_table(runs):
+    '''README-style text: one block per run with the fetch mean/stdev, plus
+    queue and RTT medians.'''
+    lines = []
+    for run in runs:
+        p, s = run['params'], run['summary']
+        lines.append('%s (%s):' % (run_label(run), run['dir']))
+        if 'fetch' in s and s['fetch']['n']:
+            lines.append('    Average: %s' % s['fetch']['mean'])
+            lines.append('    Standard Deviation: %s' % s['fetch']['std'])
+        if 'ttfb' in s:
+            lines.append('    TTFB: p50 %.4f, p99 %.4f s over %d fetches, %d failed' % (
+                s['ttfb']['p50'], s['ttfb']['p99'], s['fetch']['n'], s['fetch']['failed']))
+        if 'q' in s and s['q']['n']:
+            lines.append('    Queue: mean %.1f, p50 %.0f, max %.0f pkts' % (
+                s['q']['mean'], s['q']['p50'], s['q']['max']))
+        if 'rtt' in s and s['rtt']['n']:
+            lines.append('    RTT: p50 %.1f, p99 %.1f ms, %d lost' % (
+                s['rtt']['p50'], s['rtt']['p99'], s['rtt']['lost']))
+        for handle, q in sorted(s.get('qdiscs', {}).items()):
+            lines.append('    %s (%s): %d pkts, %d dropped, %d ECN marked' % (
+                q['kind'], handle, q['packets'], q['drops'], q['marks']))
+        for flow, c in sorted(s.get('tcp', {}).items(), key=lambda kv: int(kv[0])):
+            lines.append('    tcp %s -> %s: cwnd p50 %.0f, srtt p50 %.1f ms, '
+                         'delivery %.2f Mb/s, %d retrans' % (
+                             c['cc'], c['peer'], c['cwnd_p50'], c['srtt_p50'],
+                             c['delivery_mbps'], c['retrans']))
+        if 'flows' in s:
+            lines += ['    ' + l for l in workload.format_summary(s['flows']).split('\n') if l]
+        rt = run.get('runtime')
+        if rt and rt['procs']:
+            name, busiest = max(rt['procs'].items(), key=lambda kv: kv[1]['cpu_peak'])
+            line = '    Processes: %d, busiest %s at %.0f%% CPU' % (
+                len(rt['procs']), name, busiest['cpu_peak'])
+            if rt['failures']:
+                line += ', failed: %s' % ' '.join(rt['failures'])
+            if rt['killed']:
+                line += ', killed: %s' % ' '.join(rt['killed'])
+            lines.append(line)
+        fid = run.get('fidelity')
+        if fid:
+            lines.append('    Fidelity: %s' % ('ok' if fid['ok'] else
+                                                'SUSPECT (%s)' % '; '.join(fid['problems'])))
+    return '\n'.join(lines)
+
+
+def comparisons(runs):
+    '''(name, [runs]) groups worth overlaying: among drop-tail runs, the
+    same cong across queue sizes and the same queue size across congs; and
+    the same cong and queue size across queue disciplines.'''
+    groups = []
+    fifo = [r for r in runs if r['params'].get('qdisc', 'fifo') == 'fifo']
+    for key, other in (('cong', 'maxq'), ('maxq', 'cong')):
+        values = sorted(set(r['params'].get(key) for r in fifo
+                            if r['params'].get(key) is not None), key=str)
+        for value in values:
+            members = [r for r in fifo if r['params'].get(key) == value]
+            members.sort(key=lambda r: str(r['params'].get(other)))
+            if len(members) > 1:
+                name = ('%s' % value) if key == 'cong' else ('q%s' % value)
+                groups.append((name, members))
+    pairs = sorted(set((r['params'].get('cong'), r['params'].get('maxq')) for r in runs), key=str)
+    for cong, maxq in pairs:
+        members = [r for r in runs if (r['params'].get('cong'), r['params'].get('maxq')) == (cong, maxq)]
+        if len(set(r['params'].get('qdisc', 'fifo') for r in members)) > 1:
+            members.sort(key=lambda r: (r['params'].get('qdisc', 'fifo') != 'fifo',
+                                        r['params'].get('qdisc', 'fifo')))
+            groups.append(('%s-q%s-aqm' % (cong, maxq), members))
+    return groups
+
+
+def render(runs, out_dir, fmt='png'):
+    '''Writes OUT/<group>-buffer.png and OUT/<group>-rtt.png for every
+    comparison group, drawing each on the same figure.'''
+    from helper import plt
+    import plot_defaults
+    from matplotlib.ticker import MaxNLocator
+
+    plot_defaults.apply()
+
+    os.makedirs(out_dir, exist_ok=True)
+    fig = plt.figure(figsize=(16, 6))
+    width = int(fig.get_figwidth() * fig.dpi)
+    written = []
+
+    for name, members in comparisons(runs):
+        for kind, loader, ylabel in (('buffer', decimate.queue, 'Packets'),
+                                     ('rtt', decimate.ping, 'RTT (ms)')):
+            source = 'q' if kind == 'buffer' else 'ping'
+            fig.clf()
+            ax = fig.add_subplot(111)
+            plotted = 0
+            for run in members:
+                path = run['inputs'][source]
+                if path is None:
+                    continue
+                t, y = loader(path, width)
+                if len(t) == 0:
+                    continue
+                ax.plot(np.asarray(t) - t[0], y, lw=2, label=run_label(run))
+                plotted += 1
+            if not plotted:
+                continue
+            ax.xaxis.set_major_locator(MaxNLocator(4))
+            ax.set_xlabel('Seconds')
+            ax.set_ylabel(ylabel)
+            ax.grid(True)
+            ax.legend(loc='upper right')
+            path = os.path.join(out_dir, '%s-%s.%s' % (name, kind, fmt))
+            fig.savefig(path)
+            written.append(path)
+    plt.close(fig)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise and compare bufferbloat runs")
+    parser.add_argument('dirs', nargs='+',
+                        help="Run directories (non-run directories are skipped)")
+    parser.add_argument('--out', '-o', default=None,
+                        help="Directory for comparison figures; no figures if omitted")
+    parser.add_argument('--format', default='png')
+    parser.add_argument('--refresh', action='store_true',
+                        help="Ignore cached summaries")
+    parser.add_argument('--json', action='store_true',
+                        help="Print summaries as JSON instead of text")
+    args = parser.parse_args()
+
+    runs = [load_run(d, args.refresh) for d in args.dirs if is_run_dir(d)]
+    runs.sort(key=lambda r: (str(r['params'].get('cong')), str(r['params'].get('maxq')),
+                             str(r['params'].get('qdisc'))))
+    if args.json:
+        print(json.dumps([dict((k, r[k]) for k in ('dir', 'params', 'summary'))
+                          for r in runs], indent=1))
+    else:
+        print(format_table(runs))
+    if args.out:
+        for path in render(runs, args.out, args.format):
+            print('saving to', path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,499 @@
+'''
+Discrete-event simulator of the bufferbloat dumbbell.
+
+Models BBTopo without Mininet or root: h1 sends long-lived TCP flows to h2
+through s0, whose s0-eth2 port is a drop-tail FIFO of --maxq packets
+served at --bw-net.  Every link has --delay one way, so the base RTT is
+4 x delay.  h1 also pings h2 every 0.1 s, through the same queue.
+
+    python3 bbsim.py run --cong reno --maxq 100 --dir sim-q100
+    python3 bbsim.py sweep --cong reno bbr --maxq 10 20 50 100 200 --jobs 8
+
+`run` writes q.txt ("time,qlen") and ping.txt (`ping -D` format) just as
+bufferbloat.py does, so plot_queue.py/plot_ping.py/aggregate.py read them
+unchanged.  `sweep` runs the cross product of the parameters in a process
+pool and prints a summary table (utilisation, queue, RTT percentiles).
+
+The senders are deliberately simple:
+
+  reno   slow start, AIMD, a single halving per window of losses, loss
+         detected after three later packets are acknowledged (the FIFO
+         keeps order, so this is what three dupacks would tell us), RTO
+  bbr    windowed-max delivery rate and windowed-min RTT; STARTUP, DRAIN,
+         PROBE_BW gain cycling and PROBE_RTT; paced at gain x bottleneck
+         rate with a 2 x BDP cwnd; losses are retransmitted but do not
+         change the model
+
+All data packets are MSS-sized and ACKs return over an uncongested path.
+'''
+
+import argparse
+import heapq
+import itertools
+import os
+import time
+from collections import OrderedDict, deque
+
+PKT_BYTES = 1514
+PING_BYTES = 98
+PING_INTERVAL = 0.1
+DUPTHRESH = 3
+MIN_RTO = 0.2
+INIT_CWND = 10
+
+# Event types
+ARRIVE, DEPART, ACK, SEND, RTO, PING, QSAMPLE = range(7)
+DATA, ICMP = 0, 1
+
+
+class Reno(object):
+    name = 'reno'
+    paced = False
+
+    def __init__(self):
+        self.cwnd = float(INIT_CWND)
+        self.ssthresh = float('inf')
+        self.recover = -1
+
+    def on_ack(self, flow, now, rtt, tx):
+        if tx <= self.recover:
+            return  # still recovering from the last loss
+        if self.cwnd < self.ssthresh:
+            self.cwnd += 1
+        else:
+            self.cwnd += 1.0 / self.cwnd
+
+    def on_loss(self, flow, now, tx):
+        if tx <= self.recover:
+            return
+        self.ssthresh = max(self.cwnd / 2.0, 2.0)
+        self.cwnd = self.ssthresh
+        self.recover = flow.next_tx - 1
+
+    def on_timeout(self, flow, now):
+        self.ssthresh = max(len(flow.outstanding) / 2.0, 2.0)
+        self.cwnd = 1.0
+        self.recover = flow.next_tx - 1
+
+
+class BBR(object):
+    name = 'bbr'
+    paced = True
+
+    HIGH_GAIN = 2.885
+    CYCLE = (1.25, 0.75, 1, 1, 1, 1, 1, 1)
+    BW_WINDOW = 10          # round trips
+    RTT_WINDOW = 10.0       # seconds
+    PROBE_RTT_TIME = 0.2
+
+    def __init__(self, base_rtt):
+        self.mode = 'startup'
+        self.pacing_gain = self.cwnd_gain = self.HIGH_GAIN
+        self.bw_samples = deque()       # (round, rate) with decreasing rates
+        self.min_rtt = float('inf')
+        self.min_rtt_stamp = 0.0
+        self.round = 0
+        self.next_round_delivered = 0
+        self.full_bw = 0.0
+        self.full_bw_count = 0
+        self.cycle_index = 0
+        self.cycle_stamp = 0.0
+        self.probe_rtt_done = None
+        self.prior_mode = 'probe_bw'
+        # before any sample, assume the initial window per (guessed) RTT
+        self.initial_bw = INIT_CWND / max(base_rtt, 1e-3)
+        self.cwnd = float(INIT_CWND)
+
+    @property
+    def btlbw(self):
+        return self.bw_samples[0][1] if self.bw_samples else self.initial_bw
+
+    def bdp(self):
+        rtt = self.min_rtt if self.min_rtt < float('inf') else 1e-3
+        return self.btlbw * rtt
+
+    def pacing_rate(self):
+        return self.pacing_gain * self.btlbw
+
+    def on_ack(self, flow, now, rtt, tx):
+        info = flow.tx_info
+        delivered_at_send, delivered_time = info
+        # delivery rate sample, in packets per second
+        interval = now - delivered_time
+        if interval > 0:
+            rate = (flow.delivered - delivered_at_send) / interval
+            while self.bw_samples and self.bw_samples[-1][1] <= rate:
+                self.bw_samples.pop()
+            self.bw_samples.append((self.round, rate))
+        if flow.delivered - 1 >= self.next_round_delivered:
+            self.round += 1
+            self.next_round_delivered = flow.delivered + len(flow.outstanding)
+            while self.bw_samples and self.bw_samples[0][0] < self.round - self.BW_WINDOW:
+                self.bw_samples.popleft()
+            self.on_round(flow, now)
+        if rtt <= self.min_rtt or now - self.min_rtt_stamp > self.RTT_WINDOW:
+            if rtt > self.min_rtt and self.mode != 'probe_rtt':
+                self.enter_probe_rtt(now)
+            self.min_rtt = min(rtt, self.min_rtt) if self.mode != 'probe_rtt' else rtt
+            self.min_rtt_stamp = now
+        self.update_mode(flow, now)
+        bdp = self.bdp()
+        if self.mode == 'probe_rtt':
+            self.cwnd = 4.0
+        else:
+            self.cwnd = max(4.0, self.cwnd_gain * bdp)
+
+    def on_round(self, flow, now):
+        if self.mode == 'startup':
+            if self.btlbw >= 1.25 * self.full_bw:
+                self.full_bw = self.btlbw
+                self.full_bw_count = 0
+            else:
+                self.full_bw_count += 1
+                if self.full_bw_count >= 3:
+                    self.mode = 'drain'
+                    self.pacing_gain = 1.0 / self.HIGH_GAIN
+                    self.cwnd_gain = self.HIGH_GAIN
+
+    def enter_probe_rtt(self, now):
+        self.prior_mode = 'probe_bw' if self.mode in ('probe_bw', 'drain') else self.mode
+        self.mode = 'probe_rtt'
+        self.pacing_gain = 1.0
+        self.probe_rtt_done = None
+
+    def update_mode(self, flow, now):
+        if self.mode == 'drain' and len(flow.outstanding) <= self.bdp():
+            self.enter_probe_bw(now)
+        elif self.mode == 'probe_bw':
+            if now - self.cycle_stamp > self.min_rtt:
+                self.cycle_index = (self.cycle_index + 1) % len(self.CYCLE)
+                self.cycle_stamp = now
+                self.pacing_gain = self.CYCLE[self.cycle_index]
+        elif self.mode == 'probe_rtt':
+            if self.probe_rtt_done is None and len(flow.outstanding) <= 4:
+                self.probe_rtt_done = now + max(self.PROBE_RTT_TIME, self.min_rtt)
+            elif self.probe_rtt_done is not None and now >= self.probe_rtt_done:
+                self.min_rtt_stamp = now
+                if self.prior_mode == 'startup':
+                    self.mode = 'startup'
+                    self.pacing_gain = self.cwnd_gain = self.HIGH_GAIN
+                else:
+                    self.enter_probe_bw(now)
+
+    def enter_probe_bw(self, now):
+        self.mode = 'probe_bw'
+        self.cwnd_gain = 2.0
+        self.cycle_index = 0
+        self.cycle_stamp = now
+        self.pacing_gain = self.CYCLE[0]
+
+    def on_loss(self, flow, now, tx):
+        pass
+
+    def on_timeout(self, flow, now):
+        self.cwnd = 4.0
+
+
+class Flow(object):
+
+    def __init__(self, fid, cc):
+        self.fid = fid
+        self.cc = cc
+        self.next_seq = 0
+        self.next_tx = 0
+        self.retx = deque()             # seqs waiting to be resent
+        # tx -> (seq, send time, delivered at send, delivery time at send)
+        self.outstanding = OrderedDict()
+        self.delivered = 0
+        self.delivered_time = 0.0
+        self.tx_info = None
+        self.srtt = None
+        self.rttvar = 0.0
+        self.rto = 1.0
+        self.last_progress = 0.0
+        self.rto_pending = False
+        self.next_send = 0.0
+        self.send_pending = False
+        self.host_busy = 0.0
+        self.losses = 0
+        self.timeouts = 0
+
+
+class Sim(object):
+    '''One run.  Parameters mirror bufferbloat.py's.'''
+
+    def __init__(self, cong='reno', bw_net=1.5, delay=5.0, maxq=100, duration=15.0,
+                 bw_host=1000.0, flows=1, q_interval=0.1, ping=True):
+        if cong not in ('reno', 'bbr'):
+            raise ValueError('unknown congestion control: %s' % cong)
+        self.bw_net = bw_net * 1e6
+        self.bw_host = bw_host * 1e6
+        self.delay = delay / 1000.0
+        self.maxq = maxq
+        self.duration = duration
+        self.q_interval = q_interval
+        self.ping = ping
+        self.events = []
+        self.counter = itertools.count()
+        self.queue = deque()
+        self.busy = False
+        self.drops = 0
+        self.delivered_bytes = 0
+        self.q_samples = []
+        self.pings = []                 # (send time, seq, rtt) of answered pings
+        self.ping_times = {}            # seq -> send time
+        base_rtt = 4 * self.delay
+        self.flows = [Flow(i, Reno() if cong == 'reno' else BBR(base_rtt))
+                      for i in range(flows)]
+
+    def schedule(self, t, kind, a=None, b=None):
+        heapq.heappush(self.events, (t, next(self.counter), kind, a, b))
+
+    # ---- bottleneck
+
+    def arrive(self, now, pkt):
+        if not self.busy:
+            self.busy = True
+            self.schedule(now + pkt[3] * 8 / self.bw_net, DEPART, pkt)
+        elif len(self.queue) < self.maxq:
+            self.queue.append(pkt)
+        else:
+            self.drops += 1
+
+    def depart(self, now, pkt):
+        kind, flow, tx, size = pkt
+        if kind == DATA:
+            self.delivered_bytes += size
+            # data reaches h2 after one link delay; its ACK needs two more
+            self.schedule(now + 3 * self.delay, ACK, flow, tx)
+        else:
+            # the echo reaches h2 one delay later and the reply comes back
+            # over two more links
+            sent = self.ping_times[tx]
+            self.pings.append((sent, tx, now + 3 * self.delay - sent))
+        if self.queue:
+            nxt = self.queue.popleft()
+            self.schedule(now + nxt[3] * 8 / self.bw_net, DEPART, nxt)
+        else:
+            self.busy = False
+
+    # ---- senders
+
+    def try_send(self, flow, now):
+        cc = flow.cc
+        while len(flow.outstanding) < int(cc.cwnd):
+            if cc.paced and now < flow.next_send:
+                if not flow.send_pending:
+                    flow.send_pending = True
+                    self.schedule(flow.next_send, SEND, flow)
+                return
+            seq = flow.retx.popleft() if flow.retx else flow.next_seq
+            if seq == flow.next_seq:
+                flow.next_seq += 1
+            tx = flow.next_tx
+            flow.next_tx += 1
+            flow.outstanding[tx] = (seq, now, flow.delivered, flow.delivered_time or now)
+            start = max(now, flow.host_busy)
+            flow.host_busy = start + PKT_BYTES * 8 / self.bw_host
+            self.schedule(flow.host_busy + self.delay, ARRIVE, (DATA, flow, tx, PKT_BYTES))
+            if cc.paced:
+                flow.next_send = max(now, flow.next_send) + 1.0 / cc.pacing_rate()
+            if not flow.rto_pending:
+                flow.rto_pending = True
+                self.schedule(now + flow.rto, RTO, flow)
+
+    def on_ack(self, now, flow, tx):
+        entry = flow.outstanding.pop(tx, None)
+        if entry is None:
+            return  # already declared lost and resent
+        seq, sent, delivered_at_send, delivered_time = entry
+        flow.delivered += 1
+        flow.delivered_time = now
+        flow.last_progress = now
+        flow.tx_info = (delivered_at_send, delivered_time)
+        rtt = now - sent
+        if flow.srtt is None:
+            flow.srtt, flow.rttvar = rtt, rtt / 2
+        else:
+            flow.rttvar = 0.75 * flow.rttvar + 0.25 * abs(flow.srtt - rtt)
+            flow.srtt = 0.875 * flow.srtt + 0.125 * rtt
+        flow.rto = max(MIN_RTO, flow.srtt + 4 * flow.rttvar)
+        # FIFO delivery: anything sent DUPTHRESH transmissions before this
+        # one and still outstanding was dropped
+        while flow.outstanding:
+            first = next(iter(flow.outstanding))
+            if first + DUPTHRESH > tx:
+                break
+            lost_seq = flow.outstanding.pop(first)[0]
+            flow.retx.append(lost_seq)
+            flow.losses += 1
+            flow.cc.on_loss(flow, now, first)
+        flow.cc.on_ack(flow, now, rtt, tx)
+        self.try_send(flow, now)
+
+    def on_rto(self, now, flow):
+        flow.rto_pending = False
+        if not flow.outstanding:
+            return
+        deadline = flow.last_progress + flow.rto
+        if now < deadline:
+            flow.rto_pending = True
+            self.schedule(deadline, RTO, flow)
+            return
+        flow.timeouts += 1
+        flow.retx.extend(sorted(entry[0] for entry in flow.outstanding.values()))
+        flow.outstanding.clear()
+        flow.cc.on_timeout(flow, now)
+        flow.rto = min(flow.rto * 2, 60.0)
+        flow.last_progress = now
+        self.try_send(flow, now)
+
+    # ---- main loop
+
+    def run(self):
+        for flow in self.flows:
+            self.try_send(flow, 0.0)
+        if self.ping:
+            self.schedule(0.0, PING, 1)
+        if self.q_interval:
+            self.schedule(0.0, QSAMPLE)
+        events = self.events
+        end = self.duration
+        while events:
+            now, _, kind, a, b = heapq.heappop(events)
+            if now > end:
+                break
+            if kind == DEPART:
+                self.depart(now, a)
+            elif kind == ARRIVE:
+                self.arrive(now, a)
+            elif kind == ACK:
+                self.on_ack(now, a, b)
+            elif kind == SEND:
+                a.send_pending = False
+                self.try_send(a, now)
+            elif kind == RTO:
+                self.on_rto(now, a)
+            elif kind == QSAMPLE:
+                self.q_samples.append((now, len(self.queue)))
+                self.schedule(now + self.q_interval, QSAMPLE)
+            elif kind == PING:
+                self.ping_times[a] = now
+                self.schedule(now + self.delay, ARRIVE, (ICMP, None, a, PING_BYTES))
+                self.schedule(now + PING_INTERVAL, PING, a + 1)
+        return self
+
+    # ---- results
+
+    def summary(self):
+        import stats
+        rtts = [r for _, _, r in self.pings]
+        qlens = [q for _, q in self.q_samples]
+        sent = len(self.ping_times)
+        result = {'throughput_mbps': self.delivered_bytes * 8 / self.duration / 1e6,
+                  'utilization': self.delivered_bytes * 8 / self.duration / self.bw_net,
+                  'drops': self.drops,
+                  'losses': sum(f.losses for f in self.flows),
+                  'timeouts': sum(f.timeouts for f in self.flows),
+                  'q_mean': stats.mean(qlens) if qlens else float('nan'),
+                  'q_max': max(qlens) if qlens else 0,
+                  'ping_loss': 1 - len(rtts) / float(sent) if sent else float('nan')}
+        p50, p99 = stats.quantiles([r * 1000 for r in rtts], (0.5, 0.99))
+        result['rtt_p50'], result['rtt_p99'] = p50, p99
+        return result
+
+    def write(self, out_dir, epoch=None):
+        '''q.txt and ping.txt as bufferbloat.py's monitor and `ping -D`
+        write them, with simulated time offset to epoch.'''
+        epoch = time.time() if epoch is None else epoch
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, 'q.txt'), 'w') as f:
+            f.write(''.join('%f,%d\n' % (epoch + t, q) for t, q in self.q_samples))
+        with open(os.path.join(out_dir, 'ping.txt'), 'w') as f:
+            f.write('PING 10.0.0.2 (10.0.0.2) 56(84) bytes of data.\n')
+            for sent, seq, rtt in sorted(self.pings, key=lambda p: p[1]):
+                f.write('[%.6f] 64 bytes from 10.0.0.2: icmp_seq=%d ttl=64 time=%.1f ms\n' % (
+                    epoch + sent + rtt, seq, rtt * 1000))
+
+
+PARAMS = ['cong', 'maxq', 'bw_net', 'delay', 'time', 'flows']
+
+
+def simulate(point):
+    sim = Sim(point['cong'], point['bw_net'], point['delay'], point['maxq'],
+              point['time'], flows=point['flows'], q_interval=0.01)
+    result = dict(point)
+    result.update(sim.run().summary())
+    return result
+
+
+COLUMNS = PARAMS + ['throughput_mbps', 'utilization', 'q_mean', 'q_max', 'rtt_p50',
+                    'rtt_p99', 'drops', 'timeouts']
+
+
+def print_table(rows, csv=None):
+    def fmt(value):
+        return '%.4g' % value if isinstance(value, float) else str(value)
+
+    table = [COLUMNS] + [[fmt(row[c]) for c in COLUMNS] for row in rows]
+    widths = [max(len(r[i]) for r in table) for i in range(len(COLUMNS))]
+    for r in table:
+        print('  '.join(cell.rjust(w) for cell, w in zip(r, widths)))
+    if csv:
+        with open(csv, 'w') as f:
+            for r in table:
+                f.write(','.join(r) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the bufferbloat dumbbell")
+    sub = parser.add_subparsers(dest='mode')
+    sub.required = True
+
+    p = sub.add_parser('run', help="One run, written as q.txt and ping.txt")
+    p.add_argument('--cong', default='reno', choices=['reno', 'bbr'])
+    p.add_argument('--maxq', type=int, default=100)
+    p.add_argument('--bw-net', '-b', type=float, default=1.5)
+    p.add_argument('--bw-host', '-B', type=float, default=1000)
+    p.add_argument('--delay', type=float, default=5)
+    p.add_argument('--time', '-t', type=float, default=15)
+    p.add_argument('--flows', type=int, default=1)
+    p.add_argument('--q-interval', type=float, default=0.1,
+                   help="Queue sample interval (bufferbloat.py's monitor uses 0.1)")
+    p.add_argument('--dir', '-d', required=True)
+
+    p = sub.add_parser('sweep', help="Summaries for a grid of parameters")
+    p.add_argument('--cong', nargs='+', default=['reno', 'bbr'], choices=['reno', 'bbr'])
+    p.add_argument('--maxq', nargs='+', type=int, default=[20, 100])
+    p.add_argument('--bw-net', nargs='+', type=float, default=[1.5])
+    p.add_argument('--delay', nargs='+', type=float, default=[5])
+    p.add_argument('--time', nargs='+', type=float, default=[15])
+    p.add_argument('--flows', nargs='+', type=int, default=[1])
+    p.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1)
+    p.add_argument('--csv', default=None, help="Also write the table here")
+
+    args = parser.parse_args()
+    if args.mode == 'run':
+        sim = Sim(args.cong, args.bw_net, args.delay, args.maxq, args.time,
+                  args.bw_host, args.flows, args.q_interval).run()
+        sim.write(args.dir)
+        for key, value in sorted(sim.summary().items()):
+            print('%-16s %s' % (key, value))
+        return
+
+    points = [dict(zip(PARAMS, combo)) for combo in itertools.product(
+        args.cong, args.maxq, args.bw_net, args.delay, args.time, args.flows)]
+    start = time.perf_counter()
+    if args.jobs > 1 and len(points) > 1:
+        from multiprocessing import Pool
+        with Pool(args.jobs) as pool:
+            rows = pool.map(simulate, points, chunksize=max(1, len(points) // (4 * args.jobs)))
+    else:
+        rows = [simulate(p) for p in points]
+    elapsed = time.perf_counter() - start
+    print_table(rows, args.csv)
+    print('%d points in %.2fs (%.0f points/min)' % (len(points), elapsed, 60 * len(points) / elapsed))
+
+
+if __name__ == '__main__':
+    main()
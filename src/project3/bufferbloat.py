@@ -1,19 +1,27 @@
 from mininet.topo import Topo
-from mininet.node import CPULimitedHost, OVSBridge
+from mininet.node import CPULimitedHost, Host, OVSBridge
+from mininet.nodelib import LinuxBridge
 from mininet.link import TCLink
 from mininet.net import Mininet
 from mininet.log import lg, info
 from mininet.util import dumpNodeConnections
 from mininet.cli import CLI
 
-from subprocess import Popen, PIPE
+from subprocess import PIPE
 from time import sleep, time
-from multiprocessing import Process
 from argparse import ArgumentParser
 from monitor import monitor_qlen
+from runtime import Runtime, RunFailed
+from shmring import Ring, Drain
+from stats import RunningHistogram
+from fidelity import FidelityMonitor, FidelityError, check, format_check
+from webprobe import parse_sample
 
 import sys
 import os
+import json
+import signal
+import shutil
 import math
 import numpy as np
 
@@ -55,6 +63,97 @@ parser.add_argument('--cong',
                     help="Congestion control algorithm to use",
                     default="reno")
 
+# A Linux bridge and plain hosts need no daemon and no named cgroups, so
+# several runs can share a machine, each in its own network namespace
+# (see sweep.py).
+parser.add_argument('--switch',
+                    help="Switch implementation",
+                    choices=['ovs', 'lxbr'],
+                    default='ovs')
+
+parser.add_argument('--host',
+                    help="Host implementation (cpu = CPULimitedHost)",
+                    choices=['cpu', 'plain'],
+                    default='cpu')
+
+# Web page fetch probe (webprobe.py); --fetch-fresh opens a new
+# connection per fetch, as the curl loop this replaced did.
+parser.add_argument('--fetch-interval',
+                    type=float,
+                    help="Seconds between web page fetches (per worker)",
+                    default=0.5)
+
+parser.add_argument('--fetch-workers',
+                    type=int,
+                    help="Concurrent web page fetch loops",
+                    default=1)
+
+parser.add_argument('--fetch-fresh',
+                    action='store_true',
+                    help="New TCP connection for every fetch",
+                    default=False)
+
+# Competing traffic (workload.py).  With --bulk-flows 0 the single
+# iperf flow is used as before; short flows can be added either way.
+parser.add_argument('--bulk-flows',
+                    type=int,
+                    help="Number of long-lived flows h1->h2 (replaces iperf)",
+                    default=0)
+
+parser.add_argument('--bulk-cc',
+                    help="Comma-separated congestion controls cycled over bulk flows "
+                         "(default: --cong)",
+                    default=None)
+
+parser.add_argument('--short-rate',
+                    type=float,
+                    help="Poisson arrival rate of short flows h1->h2 (per second)",
+                    default=0)
+
+parser.add_argument('--short-sizes',
+                    help="Short flow sizes: web, fixed:BYTES or pareto:MEAN,SHAPE",
+                    default='web')
+
+# Active queue management on the bottleneck.  Several may be given; each
+# is run in turn into DIR/<qdisc>/.
+parser.add_argument('--qdisc',
+                    help="Bottleneck queue discipline(s): fifo is Mininet's drop-tail",
+                    nargs='+',
+                    choices=['fifo', 'fq_codel', 'codel', 'red', 'pie'],
+                    default=['fifo'])
+
+parser.add_argument('--tcpinfo-interval',
+                    type=float,
+                    help="Seconds between ss -tin samples of h1's connections "
+                         "into tcpinfo.ts (0 disables)",
+                    default=0.01)
+
+parser.add_argument('--pcap-snaplen',
+                    type=int,
+                    help="Capture this many bytes of every packet on s0-eth1 and s0-eth2 "
+                         "into DIR/s0-ethN.pcap for pcapflow.py (0 disables)",
+                    default=0)
+
+# Results only mean something while the machine keeps up with the
+# emulation (see fidelity.py).  warn checks every run afterwards; abort
+# also stops a run as soon as a core stays saturated or a host gets
+# throttled.
+parser.add_argument('--fidelity',
+                    help="Emulation fidelity checking",
+                    choices=['off', 'warn', 'abort'],
+                    default='warn')
+
+parser.add_argument('--fidelity-abort-after',
+                    type=float,
+                    help="Seconds of a saturated core before --fidelity abort stops the run",
+                    default=2.0)
+
+# Watch a run as it goes: start `python3 live.py serve --socket PATH`
+# first (see live.py).  Without a viewer the samples are just dropped.
+parser.add_argument('--live',
+                    help="UNIX socket of a live.py viewer to stream queue and RTT samples to",
+                    default=None)
+
 # Expt parameters
 args = parser.parse_args()
 
@@ -68,36 +167,214 @@ class BBTopo(Topo):
 
         # Here I have created a switch.  If you change its name, its
         # interface names will change from s0-eth1 to newname-eth1.
-        s0 = self.addSwitch('s0', cls=OVSBridge)
+        s0 = self.addSwitch('s0', cls=OVSBridge if args.switch == 'ovs' else LinuxBridge)
 
         # Add links with appropriate characteristics
         self.addLink(h1, s0, bw=args.bw_host, max_queue_size=args.maxq, delay=args.delay, use_htb=True)  # 1 Gbps link
         self.addLink(h2, s0, bw=args.bw_net, max_queue_size=args.maxq, delay=args.delay, use_htb=True)  # 1.5 Mbps link
 
-# Simple wrappers around monitoring utilities.  You are welcome to
-# contribute neatly written (using classes) monitoring scripts for
-# Mininet!
+# Simple wrappers around monitoring utilities.  Every process goes
+# through the runtime (runtime.py), which logs its output to
+# DIR/logs/, records its CPU and memory use and stops it at teardown.
+
+# Slack on top of --time before a process that should have finished by
+# itself is stopped
+DEADLINE_SLACK = 30
 
-def start_iperf(net):
+def start_iperf(net, rt):
     h1 = net.get('h1')
     h2 = net.get('h2')
     print("Starting iperf server...")
     # For those who are curious about the -w 16m parameter, it ensures
     # that the TCP flow is not receiver window limited.  If it is,
     # there is a chance that the router buffer may not get filled up.
-    server = h2.popen("iperf -s -w 16m")
+    rt.popen(h2, "iperf -s -w 16m", 'iperf-server', required=True)
 
     # TODO: Start the iperf client on h1.  Ensure that you create a
     # long lived TCP flow.
-    client = h1.popen(f'iperf -c {h2.IP()} -t {args.time}')
+    return rt.popen(h1, f'iperf -c {h2.IP()} -t {args.time}', 'iperf',
+                    deadline=args.time + DEADLINE_SLACK)
 
-def start_qmon(iface, interval_sec=0.1, outfile="q.txt"):
-    monitor = Process(target=monitor_qlen,
-                      args=(iface, interval_sec, outfile))
-    monitor.start()
-    return monitor
+def start_workload(net, rt):
+    '''Starts workload.py's sink on h2 and generator on h1.  Flow records
+    go to flows.txt; returns the generator process, or None if there is
+    no workload to run.'''
+    if args.bulk_flows <= 0 and args.short_rate <= 0:
+        return None
+    h1 = net.get('h1')
+    h2 = net.get('h2')
+    rt.popen(h2, 'python3 workload.py sink', 'workload-sink', required=True)
+    sleep(0.5)
+    cmd = ['python3', 'workload.py', 'gen', h2.IP(),
+           '--bulk', str(args.bulk_flows),
+           '--bulk-cc', args.bulk_cc or args.cong,
+           '--short-rate', str(args.short_rate),
+           '--short-cc', args.cong,
+           '--sizes', args.short_sizes,
+           '--duration', str(args.time),
+           '--out', '%s/flows.txt' % args.dir]
+    return rt.popen(h1, cmd, 'workload')
+
+def aqm_args(qdisc):
+    '''tc arguments for an AQM holding at most args.maxq packets, with ECN.'''
+    if qdisc == 'red':
+        # RED thresholds are in bytes; mark between 1/4 and 3/4 full
+        limit = args.maxq * 1514
+        qmax = limit * 3 // 4
+        qmin = max(qmax // 3, 1514)
+        burst = (2 * qmin + qmax) // (3 * 1000) + 1
+        return ('red limit %d min %d max %d avpkt 1000 burst %d ecn adaptive '
+                'bandwidth %gmbit probability 0.1' % (limit, qmin, qmax, burst, args.bw_net))
+    return '%s limit %d ecn' % (qdisc, args.maxq)
+
+def install_qdisc(net, qdisc, iface='s0-eth2'):
+    '''Puts an AQM under Mininet's htb/netem on the bottleneck (as a child
+    of netem 10: if there is one, else of the htb class 5:1) and turns on
+    ECN in the hosts.  Returns the AQM's handle, or None for fifo.'''
+    if qdisc == 'fifo':
+        return None
+    s0 = net.get('s0')
+    parent = '10:1' if 'netem 10:' in s0.cmd('tc qdisc show dev %s' % iface) else '5:1'
+    out = s0.cmd('tc qdisc replace dev %s parent %s handle 20: %s' % (iface, parent, aqm_args(qdisc)))
+    if out.strip():
+        raise RuntimeError('installing %s on %s failed: %s' % (qdisc, iface, out.strip()))
+    for host in net.hosts:
+        host.cmd('sysctl -w net.ipv4.tcp_ecn=1')
+    print(s0.cmd('tc qdisc show dev %s' % iface))
+    return '20:'
+
+def set_congestion_control(net, cong):
+    '''Sets the default TCP congestion control in every host.  The sysctl
+    is per network namespace, so setting it where bufferbloat.py runs
+    (the root namespace, or sweep.py's) does not reach the hosts.  Reads
+    it back in h1, the sender, and raises if it did not take.'''
+    for host in net.hosts:
+        host.cmd('sysctl -w net.ipv4.tcp_congestion_control=%s' % cong)
+    got = net.get('h1').cmd('sysctl -n net.ipv4.tcp_congestion_control').strip()
+    if got != cong:
+        raise RuntimeError('h1 uses %s, not %s (is tcp_%s loaded?)' % (got, cong, cong))
+
+def start_qmon(rt, iface, interval_sec=0.1, outfile="q.txt", qdisc=None, stats_outfile=None,
+               ring=None):
+    return rt.spawn(monitor_qlen, 'qmon',
+                    args=(iface, interval_sec, outfile),
+                    kwargs={'qdisc': qdisc, 'stats_fname': stats_outfile,
+                            'live': args.live, 'ring': ring},
+                    required=True)
 
-def start_ping(net):
+class QueueStats(object):
+    '''Running queue-length percentiles, fed by the queue monitor through
+    a shared-memory ring (see shmring.py) rather than q.txt.'''
+
+    def __init__(self):
+        self.ring = Ring(capacity=1 << 16)
+        self.hist = RunningHistogram()
+        try:
+            self.drain = Drain(self.ring, lambda rows: self.hist.update_batch(rows['qlen']))
+            self.drain.start()
+        except Exception:
+            self.ring.close()
+            raise
+
+    def summary(self):
+        p50, p95, p99, top = self.hist.quantiles((0.5, 0.95, 0.99, 1.0))
+        return {'samples': self.hist.n, 'dropped': self.ring.dropped,
+                'p50': p50, 'p95': p95, 'p99': p99, 'max': top}
+
+    def stop(self):
+        '''Final summary, also kept in queue.json.'''
+        self.drain.stop()
+        result = self.summary()
+        self.ring.close()
+        with open('%s/queue.json' % args.dir, 'w') as f:
+            json.dump(result, f, indent=1, sort_keys=True)
+        print("Queue length: p50 %(p50)g p95 %(p95)g p99 %(p99)g max %(max)g packets "
+              "(%(samples)d samples, %(dropped)d dropped)" % result)
+        return result
+
+def start_live(rt):
+    '''Announces the run to the live viewer and follows ping.txt and
+    fetch.txt for it; the queue monitor sends its own samples.'''
+    if not args.live:
+        return None
+    from live import Publisher
+    publisher = Publisher(args.live)
+    publisher.hello(os.path.abspath(args.dir))
+    publisher.close()
+    # the tail waits for these to appear; don't let it follow a previous run's
+    for name in ('ping.txt', 'fetch.txt'):
+        if os.path.exists('%s/%s' % (args.dir, name)):
+            os.remove('%s/%s' % (args.dir, name))
+    return rt.popen(None, ['python3', 'live.py', 'tail', '--socket', args.live,
+                           '--ping', '%s/ping.txt' % args.dir,
+                           '--fetch', '%s/fetch.txt' % args.dir], 'live-tail')
+
+def start_tcpinfo(net, rt):
+    '''Samples cwnd, RTT, delivery/pacing rate and retransmits of every
+    connection from h1 to h2 (see tcpinfo.py).'''
+    if args.tcpinfo_interval <= 0:
+        return None
+    h1 = net.get('h1')
+    h2 = net.get('h2')
+    # series are append-only; don't mix in an earlier run's samples
+    shutil.rmtree('%s/tcpinfo.ts' % args.dir, ignore_errors=True)
+    return rt.popen(h1, ['python3', 'tcpinfo.py', '--dst', h2.IP(),
+                         '--interval', str(args.tcpinfo_interval),
+                         '--out', '%s/tcpinfo.ts' % args.dir], 'tcpinfo')
+
+def start_capture(rt):
+    '''tcpdump on both sides of the bottleneck (see pcapflow.py).  The
+    switch lives in the root namespace, so the captures run there.'''
+    if args.pcap_snaplen <= 0:
+        return []
+    procs = []
+    for iface in ('s0-eth1', 's0-eth2'):
+        # -Z root: don't drop privileges before opening the output file
+        procs.append(rt.popen(None, ['tcpdump', '-i', iface, '-n', '-Z', 'root',
+                                     '-s', str(args.pcap_snaplen), '-B', '8192',
+                                     '-w', '%s/%s.pcap' % (args.dir, iface)],
+                              'tcpdump-' + iface, required=True))
+    # tcpdump takes a moment to open the interfaces
+    sleep(1)
+    return procs
+
+def abort_run(reason):
+    print("*** emulation fidelity: %s, aborting the run" % reason)
+    # the monitor runs in a thread; let the main thread raise
+    os.kill(os.getpid(), signal.SIGUSR1)
+
+def _fidelity_abort(signum, frame):
+    raise FidelityError('emulation could not keep up')
+
+def ignore_abort():
+    '''From here on a trip must not raise: an exception in the teardown
+    would skip net.stop().  The monitor still records it.'''
+    if args.fidelity == 'abort':
+        signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+
+def start_fidelity(net):
+    '''Samples CPU, the hosts' cgroups and the bottleneck's tx rate into
+    fidelity.txt.'''
+    if args.fidelity == 'off':
+        return None
+    abort = args.fidelity == 'abort'
+    if abort:
+        signal.signal(signal.SIGUSR1, _fidelity_abort)
+    hosts = dict((h.name, h.pid) for h in net.hosts)
+    return FidelityMonitor('s0-eth2', hosts, 0.1, '%s/fidelity.txt' % args.dir,
+                           abort_after=args.fidelity_abort_after if abort else None,
+                           on_trip=abort_run).start()
+
+def report_fidelity(monitor):
+    result = check(args.dir, args.bw_net)
+    if monitor.tripped:
+        result['ok'] = False
+        result['problems'].insert(0, 'aborted: %s' % monitor.tripped)
+    with open('%s/fidelity.json' % args.dir, 'w') as f:
+        json.dump(result, f, indent=1, sort_keys=True)
+    print(format_check(result))
+
+def start_ping(net, rt):
     # TODO: Start a ping train from h1 to h2 (or h2 to h1, does it
     # matter?)  Measure RTTs every 0.1 second.  Read the ping man page
     # to see how to do this.
@@ -108,39 +385,122 @@ def start_ping(net):
     h1 = net.get('h1')
     h2 = net.get('h2')
     
-    h1.popen(f'ping -i 0.1 {h2.IP()} > ./ping.txt', shell=True)
+    # -D prefixes every reply with its epoch time so RTTs can be plotted
+    # (and lined up with q.txt) on the real time axis
+    with open('%s/ping.txt' % args.dir, 'w') as f:
+        return rt.popen(h1, f'ping -D -i 0.1 {h2.IP()}', 'ping', stdout=f, required=True)
 
-def start_webserver(net):
+def start_webserver(net, rt):
     h1 = net.get('h1')
-    proc = h1.popen("python http/webserver.py", shell=True)
+    proc = rt.popen(h1, "python3 http/webserver.py", 'webserver', required=True)
     sleep(1)
-    return [proc]
+    return proc
 
-def bufferbloat():
+def measure_fetches(net, rt):
+    '''Runs webprobe.py on h2 against the webserver on h1 for the length
+    of the experiment.  Samples stream back over its stdout and are also
+    kept in fetch.txt; returns the successful fetch times (seconds).'''
+    h1 = net.get('h1')
+    h2 = net.get('h2')
+    print("h1.IP: " + h1.IP())
+    print("h2.IP: " + h2.IP())
+    cmd = ['python3', 'webprobe.py', 'http://%s/' % h1.IP(),
+           '--interval', str(args.fetch_interval),
+           '--workers', str(args.fetch_workers),
+           '--duration', str(args.time),
+           '--out', '%s/fetch.txt' % args.dir]
+    if args.fetch_fresh:
+        cmd.append('--fresh')
+    if os.path.exists('%s/fetch.txt' % args.dir):
+        os.remove('%s/fetch.txt' % args.dir)
+    probe = rt.popen(h2, cmd, 'webprobe', stdout=PIPE, deadline=args.time + DEADLINE_SLACK)
+    times = []
+    failed = 0
+    start_time = time()
+    last_report = start_time
+    for line in probe.handle.stdout:
+        _, total, _, ttfb, _, status = parse_sample(line.decode())
+        if status < 0:
+            failed += 1
+        else:
+            times.append(total)
+        now = time()
+        if now - last_report >= 5:
+            last_report = now
+            print("%.1fs left... %d fetches, last %.3fs (ttfb %.3fs), %d failed" % (
+                args.time - (now - start_time), len(times), total, ttfb, failed))
+    rt.wait(probe)
+    print("%d fetches, %d failed" % (len(times), failed))
+    return times
+
+def run_experiment(qdisc):
     if not os.path.exists(args.dir):
         os.makedirs(args.dir)
-    os.system("sysctl -w net.ipv4.tcp_congestion_control=%s" % args.cong)
+    # Record what produced this directory, for sweep.py and later analysis
+    with open('%s/params.json' % args.dir, 'w') as f:
+        json.dump(dict(vars(args), qdisc=qdisc), f, indent=2, sort_keys=True)
     topo = BBTopo()
-    net = Mininet(topo=topo, host=CPULimitedHost, link=TCLink, controller=None)
+    net = Mininet(topo=topo, host=CPULimitedHost if args.host == 'cpu' else Host,
+                  link=TCLink, controller=None)
     net.start()
+    # Ensure that all processes you create within Mininet are killed:
+    # the runtime stops whatever is still running (SIGTERM, then SIGKILL)
+    # on the way out, also on errors and Ctrl-C.
+    fidelity = qstats = None
+    try:
+        fidelity = start_fidelity(net)
+        qstats = QueueStats()
+        set_congestion_control(net, args.cong)
+        with Runtime(args.dir) as rt:
+            try:
+                experiment(net, rt, qdisc, qstats)
+            finally:
+                ignore_abort()
+        rt.check()
+    finally:
+        ignore_abort()
+        if qstats is not None:
+            qstats.stop()
+        if fidelity is not None:
+            fidelity.stop()
+        net.stop()
+        if fidelity is not None:
+            report_fidelity(fidelity)
+    if fidelity is not None and fidelity.tripped:
+        # tripped during the teardown, after the run itself had finished
+        raise FidelityError(fidelity.tripped)
+
+def experiment(net, rt, qdisc, qstats):
     # This dumps the topology and how nodes are interconnected through
     # links.
     dumpNodeConnections(net.hosts)
     # This performs a basic all pairs ping test.
     net.pingAll()
 
+    aqm = install_qdisc(net, qdisc)
+    start_live(rt)
+    start_capture(rt)
+
     # TODO: Start monitoring the queue sizes.  Since the switch I
     # created is "s0", I monitor one of the interfaces.  Which
     # interface?  The interface numbering starts with 1 and increases.
     # Depending on the order you add links to your network, this
     # number may be 1 or 2.  Ensure you use the correct number.
-    qmon = start_qmon(iface='s0-eth2',
-                      outfile='%s/q.txt' % (args.dir))
+    # With an AQM under netem, packets handed to it leave netem's count,
+    # so record the htb root, which holds every queued packet.
+    start_qmon(rt, iface='s0-eth2',
+               outfile='%s/q.txt' % (args.dir),
+               qdisc='5:' if aqm else None,
+               stats_outfile='%s/qstats.txt' % (args.dir),
+               ring=qstats.ring.name)
 
     # TODO: Start iperf, webservers, etc.
-    start_iperf(net)
-    start_ping(net)
-    start_webserver(net)
+    if args.bulk_flows <= 0:
+        start_iperf(net, rt)
+    workload = start_workload(net, rt)
+    start_tcpinfo(net, rt)
+    start_ping(net, rt)
+    start_webserver(net, rt)
 
     # TODO: measure the time it takes to complete webpage transfer
     # from h1 to h2 (say) 3 times.  Hint: check what the following
@@ -152,31 +512,8 @@ def bufferbloat():
 
     # Hint: have a separate function to do this and you may find the
     # loop below useful.
-    h1 = net.get('h1')
-    h2 = net.get('h2')
-    start_time = time()
-    while True:
-        # do the measurement (say) 3 times.
-        times = []
-        print("h1.IP: " + h1.IP())
-        print("h2.IP: " + h2.IP())
-        for i in range(3):
-            process = h2.popen("curl -o /dev/null -s -w %{time_total} " + h1.IP(), shell=True)
-            text_value = process.stdout.read().strip()
-            if text_value != '':
-                times.append(float(text_value))
-                print(f'Recorded time was {text_value}s for iteration {i}')
-            else:
-                print(f"Recorded time was '' for iteration {i}")
-        average = np.mean(times)
-        std_dev = np.std(times)
-        print("Average: {}\nStandard Deviation: {}".format(average, std_dev))
-        sleep(5)
-        now = time()
-        delta = now - start_time
-        if delta > args.time:
-            break
-        print("%.1fs left..." % (args.time - delta))
+    times = measure_fetches(net, rt)
+    print("Average: {}\nStandard Deviation: {}".format(np.mean(times), np.std(times)))
 
     # TODO: compute average (and standard deviation) of the fetch
     # times.  You don't need to plot them.  Just note it in your
@@ -187,11 +524,36 @@ def bufferbloat():
     # emulated hosts h1 and h2.
     # CLI(net)
 
-    qmon.terminate()
-    net.stop()
-    # Ensure that all processes you create within Mininet are killed.
-    # Sometimes they require manual killing.
-    Popen("pgrep -f webserver.py | xargs kill -9", shell=True).wait()
+    if workload is not None:
+        # the generator stops by itself once short flows in flight finish
+        rt.wait(workload, DEADLINE_SLACK)
+        with open(workload.log) as f:
+            print(f.read())
+
+def bufferbloat():
+    base = args.dir
+    aborted = []
+    failed = []
+    for qdisc in args.qdisc:
+        if len(args.qdisc) > 1:
+            args.dir = os.path.join(base, qdisc)
+        print("*** %s ***" % qdisc)
+        try:
+            run_experiment(qdisc)
+        except FidelityError:
+            aborted.append(qdisc)
+        except RunFailed as e:
+            print("*** %s: %s" % (qdisc, e))
+            failed.append(qdisc)
+    args.dir = base
+    problems = []
+    if aborted:
+        problems.append("aborted for emulation fidelity: %s" % ' '.join(aborted))
+    if failed:
+        problems.append("failed (see runtime.json): %s" % ' '.join(failed))
+    if problems:
+        # a non-zero exit keeps sweep.py from caching the run as done
+        sys.exit("runs %s" % '; '.join(problems))
 
 if __name__ == "__main__":
     bufferbloat()
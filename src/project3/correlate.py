@@ -0,0 +1,217 @@
+'''
+How much of the ping RTT is the bottleneck queue?
+
+Lines up a run's queue trace (q.txt or q.ts) with its ping RTTs and
+compares the queueing delay the queue length implies,
+
+    qlen * packet size * 8 / bw-net
+
+with what ping measured on top of the base RTT (4 x --delay when the run
+has params.json, else the smallest RTT seen).  Reports the correlation at
+the ping timestamps and the lag at which the two series agree best,
+together with the least-squares fit measured ~ slope * predicted +
+intercept.  A slope near 1 and a small intercept mean the queue accounts
+for the extra RTT.
+
+    python3 correlate.py reno-q20 reno-q100 [--json]
+    python3 correlate.py --bw-net 1.5 --delay 5 old-run
+
+`ping -D` stamps each reply when it arrives, so RTT samples trail the
+queue they waited in by about one RTT; the lag search finds this rather
+than assuming it.  Alignment is np.searchsorted interpolation and the lag
+search one FFT cross-correlation, so hour-long traces of millions of
+samples take about a second.
+'''
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+import decimate
+
+PACKET_BYTES = 1500
+MAX_LAG = 5.0
+# queue samples further apart than this are a gap, not something to
+# interpolate across
+MAX_GAP = 1.0
+
+
+def interp_at(t, tx, x, max_gap=MAX_GAP):
+    '''x (sampled at increasing times tx) linearly interpolated at times t;
+    NaN outside tx and inside gaps longer than max_gap.'''
+    t = np.asarray(t, dtype=np.float64)
+    out = np.full(t.shape, np.nan)
+    if len(tx) == 0:
+        return out
+    i = np.searchsorted(tx, t, 'right')
+    exact = (i > 0) & (tx[np.maximum(i - 1, 0)] == t)
+    out[exact] = x[i[exact] - 1]
+    inside = (i > 0) & (i < len(tx)) & ~exact
+    lo, hi = i[inside] - 1, i[inside]
+    span = tx[hi] - tx[lo]
+    w = (t[inside] - tx[lo]) / span
+    out[inside] = np.where(span <= max_gap, x[lo] + w * (x[hi] - x[lo]), np.nan)
+    return out
+
+
+def queue_delay_ms(qlen, bw_net, packet_bytes=PACKET_BYTES):
+    '''Time (ms) for the bottleneck (bw_net Mb/s) to drain qlen packets.'''
+    return np.asarray(qlen, dtype=np.float64) * packet_bytes * 8 / (bw_net * 1e6) * 1e3
+
+
+def pearson(x, y):
+    ok = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[ok], y[ok]
+    if len(x) < 2 or np.std(x) == 0 or np.std(y) == 0:
+        return float('nan')
+    return float(np.corrcoef(x, y)[0, 1])
+
+
+def fill_gaps(y):
+    '''NaNs replaced by interpolation between their neighbours.'''
+    bad = np.isnan(y)
+    if bad.any() and not bad.all():
+        idx = np.arange(len(y))
+        y = y.copy()
+        y[bad] = np.interp(idx[bad], idx[~bad], y[~bad])
+    return y
+
+
+def best_lag(x, y, max_shift):
+    '''Shift k in [-max_shift, max_shift] maximising the correlation of
+    y[i + k] with x[i] (k > 0: y trails x), and that correlation.  Both
+    series are on one uniform grid, without NaNs.'''
+    n = len(x)
+    max_shift = min(max_shift, n - 2)
+    if max_shift < 0:
+        return 0, float('nan')
+    x = x - x.mean()
+    y = y - y.mean()
+    nfft = 1 << (2 * n - 1).bit_length()
+    cc = np.fft.irfft(np.fft.rfft(y, nfft) * np.conj(np.fft.rfft(x, nfft)), nfft)
+    shifts = np.arange(-max_shift, max_shift + 1)
+    overlap = n - np.abs(shifts)
+    # sum over the overlap -> mean product, so long shifts aren't penalised
+    score = cc[shifts % nfft] / overlap
+    k = int(shifts[np.argmax(score)])
+    a, b = (x[:n - k], y[k:]) if k >= 0 else (x[-k:], y[:n + k])
+    return k, pearson(a, b)
+
+
+def fit(x, y):
+    '''(slope, intercept) of the least-squares line y ~ x.'''
+    ok = ~(np.isnan(x) | np.isnan(y))
+    if ok.sum() < 2 or np.std(x[ok]) == 0:
+        return float('nan'), float('nan')
+    slope, intercept = np.polyfit(x[ok], y[ok], 1)
+    return float(slope), float(intercept)
+
+
+def correlate(qt, qlen, pt, rtt, bw_net, base_rtt=None,
+              packet_bytes=PACKET_BYTES, max_lag=MAX_LAG):
+    '''Compares queueing delay implied by (qt, qlen) with ping's (pt, rtt)
+    above base_rtt (ms; the smallest RTT if None).  Returns a dict.'''
+    qt, qlen = np.asarray(qt, np.float64), np.asarray(qlen, np.float64)
+    pt, rtt = np.asarray(pt, np.float64), np.asarray(rtt, np.float64)
+    replied = ~np.isnan(rtt)
+    result = {'pings': int(len(rtt)), 'lost': int((~replied).sum()),
+              'queue_samples': int(len(qt)), 'bw_net': bw_net,
+              'packet_bytes': packet_bytes}
+    if base_rtt is None:
+        base_rtt = float(np.min(rtt[replied])) if replied.any() else float('nan')
+    result['base_rtt_ms'] = base_rtt
+
+    # at the ping timestamps
+    predicted = queue_delay_ms(interp_at(pt, qt, qlen), bw_net, packet_bytes)
+    measured = rtt - base_rtt
+    both = ~(np.isnan(predicted) | np.isnan(measured))
+    result['aligned'] = int(both.sum())
+    if result['aligned'] < 2:
+        result['corr'] = float('nan')
+        return result
+    result['predicted_ms'] = float(predicted[both].mean())
+    result['measured_ms'] = float(measured[both].mean())
+    result['corr'] = pearson(predicted, measured)
+
+    # on a uniform grid at the ping interval, over the span both cover
+    step = float(np.median(np.diff(pt)))
+    t0, t1 = max(qt[0], pt[0]), min(qt[-1], pt[-1])
+    grid = t0 + step * np.arange(int((t1 - t0) / step) + 1)
+    x = fill_gaps(queue_delay_ms(interp_at(grid, qt, qlen), bw_net, packet_bytes))
+    y = fill_gaps(interp_at(grid, pt[replied], measured[replied]))
+    k, result['lag_corr'] = best_lag(x, y, int(round(max_lag / step)))
+    result['lag_sec'] = round(k * step, 6)
+
+    # the fit is at the best lag: RTTs against the queue they saw
+    shifted = queue_delay_ms(interp_at(pt - k * step, qt, qlen), bw_net, packet_bytes)
+    result['slope'], result['intercept_ms'] = fit(shifted, measured)
+    return result
+
+
+def analyse(run_dir, bw_net=None, delay=None, freq=10, **kw):
+    '''correlate() on a run directory; bw_net and delay (ms) default to
+    the run's params.json.'''
+    from aggregate import find_input, run_params
+    params = run_params(run_dir)
+    bw_net = bw_net if bw_net is not None else params.get('bw_net')
+    delay = delay if delay is not None else params.get('delay')
+    if bw_net is None:
+        raise ValueError('%s: no params.json; give --bw-net' % run_dir)
+    q, ping = find_input(run_dir, 'q'), find_input(run_dir, 'ping')
+    if q is None or ping is None:
+        raise ValueError('%s: needs both q and ping output' % run_dir)
+    qt, qlen = decimate.decimate(decimate.queue_chunks(q), 0)
+    pt, rtt = decimate.decimate(decimate.ping_chunks(ping, freq), 0)
+    # h1 -> s0 -> h2 and back: four links of --delay each
+    base = 4 * delay if delay is not None else None
+    result = correlate(qt, qlen, pt, rtt, bw_net, base, **kw)
+    result['dir'] = run_dir
+    return result
+
+
+def format_result(r):
+    lines = ['%s: %d pings (%d lost), %d queue samples, base RTT %.1f ms' % (
+        r.get('dir', '-'), r['pings'], r['lost'], r['queue_samples'], r['base_rtt_ms'])]
+    if r['aligned'] < 2:
+        lines.append('    queue and ping traces do not overlap')
+        return '\n'.join(lines)
+    lines.append('    queueing delay: predicted %.1f ms, measured %.1f ms (mean)' % (
+        r['predicted_ms'], r['measured_ms']))
+    lines.append('    correlation %.3f; best %.3f with RTT %.2fs behind the queue' % (
+        r['corr'], r['lag_corr'], r['lag_sec']))
+    lines.append('    measured = %.2f x predicted %+.1f ms' % (r['slope'], r['intercept_ms']))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Correlate queue length with ping RTT")
+    parser.add_argument('dirs', nargs='+', help="Run directories with q and ping output")
+    parser.add_argument('--bw-net', '-b', type=float, default=None,
+                        help="Bottleneck rate (Mb/s), default from params.json")
+    parser.add_argument('--delay', type=float, default=None,
+                        help="Link delay (ms) for the base RTT, default from params.json, "
+                             "else the smallest RTT")
+    parser.add_argument('--packet-bytes', type=int, default=PACKET_BYTES)
+    parser.add_argument('--max-lag', type=float, default=MAX_LAG,
+                        help="Largest lag (s) to search either way")
+    parser.add_argument('--freq', type=int, default=10, help="Frequency of pings (per second)")
+    parser.add_argument('--json', action='store_true',
+                        help="Also write DIR/correlation.json")
+    args = parser.parse_args()
+    for d in args.dirs:
+        try:
+            r = analyse(d, args.bw_net, args.delay, args.freq,
+                        packet_bytes=args.packet_bytes, max_lag=args.max_lag)
+        except (ValueError, OSError) as e:
+            print(e)
+            continue
+        print(format_result(r))
+        if args.json:
+            with open(os.path.join(d, 'correlation.json'), 'w') as f:
+                json.dump(r, f, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
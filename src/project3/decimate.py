@@ -0,0 +1,183 @@
+'''
+Min/max-preserving downsampling of long traces for plotting.
+
+A line plot cannot show more than one column of pixels per x pixel, so
+for every pixel column M4 keeps just four samples: the first, the last,
+the minimum and the maximum.  Drawn as a line, that gives the same pixels
+as the full trace, spikes included, which a stride (`--every`) does not.
+
+M4 here works in one pass over chunks, so hours-long q.txt and ping
+files (or .ts series, see tsformat.py) never have to be in memory at
+once.  When the time span is cheap to learn (a series, or the first and
+last line of q.txt) the bins are exactly the pixel columns.  Otherwise
+(ping output) bins start as fine as the first chunk allows and pairs are
+merged whenever the trace outgrows them, which keeps between one and two
+bins per pixel.
+
+    t, q = decimate.queue('reno-q100/q.txt', width=1600)
+    t, rtt = decimate.ping('reno-q100/ping.txt', width=1600)
+'''
+
+import io
+
+import numpy as np
+
+from tsformat import is_series, open_series
+import pingparse
+
+CHUNK_ROWS = 1 << 20
+CHUNK_BYTES = 1 << 24
+
+
+class M4(object):
+    '''Streaming M4 over width time bins spanning span=(t0, t1), or over
+    width to 2 * width bins if the span is not known.'''
+
+    def __init__(self, width, span=None):
+        width = max(int(width), 1)
+        if span is None:
+            self.n, self.t0, self.dt = 2 * width, None, None
+        else:
+            self.n, self.t0 = width, span[0]
+            self.dt = max((span[1] - span[0]) / width, 1e-9)
+        nan = np.full(self.n, np.nan)
+        self.first_t, self.first_y = nan.copy(), nan.copy()
+        self.last_t, self.last_y = nan.copy(), nan.copy()
+        self.lo, self.hi = nan.copy(), nan.copy()
+
+    def _merge(self):
+        '''Halves the resolution: bins 2i and 2i+1 become bin i.  An odd
+        number of bins is padded with an empty one.'''
+        def even(a):
+            return np.append(a, np.nan) if len(a) % 2 else a
+
+        def pairs(a, pick):
+            a = even(a)
+            merged = pick(a[0::2], a[1::2])
+            return np.concatenate([merged, np.full(self.n - len(merged), np.nan)])
+        empty0 = np.isnan(even(self.first_t)[0::2])
+        empty1 = np.isnan(even(self.last_t)[1::2])
+        self.first_t = pairs(self.first_t, lambda a, b: np.where(empty0, b, a))
+        self.first_y = pairs(self.first_y, lambda a, b: np.where(empty0, b, a))
+        self.last_t = pairs(self.last_t, lambda a, b: np.where(empty1, a, b))
+        self.last_y = pairs(self.last_y, lambda a, b: np.where(empty1, a, b))
+        self.lo = pairs(self.lo, np.fmin)
+        self.hi = pairs(self.hi, np.fmax)
+        self.dt *= 2
+
+    def add(self, t, y):
+        t = np.asarray(t, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if len(t) == 0:
+            return
+        if len(t) > 1 and np.any(t[1:] < t[:-1]):
+            order = np.argsort(t, kind='stable')
+            t, y = t[order], y[order]
+        if self.t0 is None:
+            self.t0 = t[0]
+            self.dt = max((t[-1] - t[0]) / self.n, 1e-9)
+        # with a known span the last sample lands on the upper edge; clip it
+        while t[-1] - self.t0 > self.n * self.dt:
+            self._merge()
+
+        b = np.clip(((t - self.t0) / self.dt).astype(np.int64), 0, self.n - 1)
+        starts = np.flatnonzero(np.r_[True, b[1:] != b[:-1]])
+        ends = np.r_[starts[1:], len(t)] - 1
+        bins = b[starts]
+        self.lo[bins] = np.fmin(self.lo[bins], np.fmin.reduceat(y, starts))
+        self.hi[bins] = np.fmax(self.hi[bins], np.fmax.reduceat(y, starts))
+        new = np.isnan(self.first_t[bins])
+        self.first_t[bins[new]] = t[starts[new]]
+        self.first_y[bins[new]] = y[starts[new]]
+        self.last_t[bins] = t[ends]
+        self.last_y[bins] = y[ends]
+
+    def result(self):
+        '''(t, y) with up to four points per occupied bin, in time order.'''
+        used = ~np.isnan(self.first_t)
+        ft, fy = self.first_t[used], self.first_y[used]
+        lt, ly = self.last_t[used], self.last_y[used]
+        lo, hi = self.lo[used], self.hi[used]
+        mid = (ft + lt) / 2
+        t = np.stack([ft, mid, mid, lt], axis=1)
+        y = np.stack([fy, lo, hi, ly], axis=1)
+        # a bin holding one sample needs one point, not four
+        keep = np.ones(t.shape, dtype=bool)
+        keep[:, 1:] = (lt > ft)[:, None]
+        return t[keep], y[keep]
+
+
+def queue_span(path):
+    '''(first, last) time of a queue trace without reading all of it.'''
+    if is_series(path):
+        t = open_series(path)['t']
+        return (float(t[0]), float(t[-1])) if len(t) else None
+    with open(path, 'rb') as f:
+        first = f.readline()
+        f.seek(0, 2)
+        f.seek(max(f.tell() - 4096, 0))
+        lines = [l for l in f.read().splitlines() if b',' in l]
+    try:
+        return float(first.split(b',')[0]), float(lines[-1].split(b',')[0])
+    except (IndexError, ValueError):
+        return None
+
+
+def queue_chunks(path, chunk_rows=CHUNK_ROWS):
+    '''(t, qlen) chunks of a queue series or "time,qlen" text file.'''
+    if is_series(path):
+        cols = open_series(path)
+        for i in range(0, len(cols['t']), chunk_rows):
+            yield cols['t'][i:i + chunk_rows], cols['qlen'][i:i + chunk_rows]
+        return
+    with open(path, 'rb') as f:
+        rest = b''
+        while True:
+            data = f.read(CHUNK_BYTES)
+            if not data:
+                break
+            data = rest + data
+            cut = data.rfind(b'\n') + 1
+            data, rest = data[:cut], data[cut:]
+            if data.strip():
+                rows = np.loadtxt(io.BytesIO(data), delimiter=',', usecols=(0, 1), ndmin=2)
+                yield rows[:, 0], rows[:, 1]
+        if rest.strip():
+            rows = np.loadtxt(io.BytesIO(rest), delimiter=',', usecols=(0, 1), ndmin=2)
+            yield rows[:, 0], rows[:, 1]
+
+
+def ping_chunks(path, freq=10, chunk_rows=CHUNK_ROWS):
+    '''(t, rtt) chunks of a ping series or ping output (lost probes NaN).'''
+    if is_series(path):
+        cols = open_series(path)
+        for i in range(0, len(cols['t']), chunk_rows):
+            yield cols['t'][i:i + chunk_rows], cols['rtt'][i:i + chunk_rows]
+        return
+    for chunk in pingparse.iter_ping_chunks(path, chunk_size=chunk_rows, freq=freq):
+        yield chunk['t'], chunk['rtt']
+
+
+def decimate(chunks, width, span=None):
+    '''M4 of a (t, y) chunk stream down to width pixel columns spanning
+    span, if known.  width 0 (or None) concatenates the chunks unchanged.'''
+    if not width:
+        ts, ys = [], []
+        for t, y in chunks:
+            ts.append(np.asarray(t, dtype=np.float64))
+            ys.append(np.asarray(y, dtype=np.float64))
+        if not ts:
+            return np.empty(0), np.empty(0)
+        return np.concatenate(ts), np.concatenate(ys)
+    m4 = M4(width, span)
+    for t, y in chunks:
+        m4.add(t, y)
+    return m4.result()
+
+
+def queue(path, width):
+    return decimate(queue_chunks(path), width, queue_span(path) if width else None)
+
+
+def ping(path, width, freq=10):
+    return decimate(ping_chunks(path, freq), width)
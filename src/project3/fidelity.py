@@ -0,0 +1,295 @@
+'''
+Emulation fidelity: did the machine keep up with the emulated network?
+
+Mininet's links are only as good as the CPU running them.  When a core
+saturates, htb dequeues late, netem delays stretch and the bottleneck
+runs below --bw-net with a full queue, which looks just like a slower
+link.  FidelityMonitor samples, every interval, into DIR/fidelity.txt:
+
+  - overall and busiest-core utilisation from /proc/stat,
+  - CPU time and CFS throttling of each host's cgroup (CPULimitedHost
+    puts every host in one; plain hosts have none and are skipped),
+  - tx_bytes of the bottleneck interface.
+
+It can trip while the run is going (a core saturated for abort_after
+seconds, or a host throttled), and check() judges a finished run: besides
+the CPU figures it measures the link rate over the intervals in which
+q.txt shows a standing queue, where an honest emulation sends at bw-net.
+The verdict goes to DIR/fidelity.json:
+
+    python3 fidelity.py reno-q100 [--bw-net 1.5]
+
+fidelity.txt has a '#' header naming its columns:
+
+    time,busy,busiest,tx_bytes[,<host>_cpu_ns,<host>_throttled...]
+'''
+
+import argparse
+import json
+import os
+import threading
+from time import time
+
+import numpy as np
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+# A core this busy is saturated; runs with more than MAX_SATURATED of
+# their samples saturated are flagged
+SATURATED = 0.95
+MAX_SATURATED = 0.05
+# Allowed deviation of the backlogged link rate from --bw-net
+RATE_TOLERANCE = 0.1
+# Queue length (packets) that counts as backlogged
+BACKLOG = 5
+
+
+class FidelityError(Exception):
+    '''Raised in the runner when a monitor with abort set trips.'''
+
+
+def parse_proc_stat(text):
+    '''{cpu name: (busy jiffies, total jiffies)} from /proc/stat; 'cpu' is
+    the sum over all cores.  iowait counts as idle.'''
+    cpus = {}
+    for line in text.splitlines():
+        if not line.startswith('cpu'):
+            continue
+        fields = line.split()
+        # user nice system idle iowait irq softirq steal (guest is in user)
+        values = [int(v) for v in fields[1:9]]
+        total = sum(values)
+        cpus[fields[0]] = (total - values[3] - values[4], total)
+    return cpus
+
+
+def cpu_busy(prev, cur):
+    '''(overall, busiest core) utilisation between two parse_proc_stat()s.'''
+    def frac(name):
+        busy = cur[name][0] - prev[name][0]
+        total = cur[name][1] - prev[name][1]
+        return busy / float(total) if total > 0 else 0.0
+    cores = [frac(name) for name in cur if name != 'cpu' and name in prev]
+    return frac('cpu'), max(cores) if cores else frac('cpu')
+
+
+def cgroup_of(pid):
+    '''CPU accounting directory and cpu.stat path of a process's cgroup
+    as (usage file, stat file), or None for the root cgroup.'''
+    try:
+        with open('/proc/%d/cgroup' % pid) as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    for line in lines:
+        _, controllers, path = line.split(':', 2)
+        if 'cpuacct' in controllers.split(','):
+            if path == '/':
+                return None
+            return (os.path.join(CGROUP_ROOT, 'cpuacct', path.lstrip('/'), 'cpuacct.usage'),
+                    os.path.join(CGROUP_ROOT, 'cpu', path.lstrip('/'), 'cpu.stat'))
+    for line in lines:
+        if line.startswith('0::') and line[3:] != '/':
+            stat = os.path.join(CGROUP_ROOT, line[3:].lstrip('/'), 'cpu.stat')
+            return stat, stat
+    return None
+
+
+def read_cgroup(paths):
+    '''(CPU ns, throttled periods) of a cgroup_of() result.'''
+    usage_path, stat_path = paths
+    stat = {}
+    try:
+        with open(stat_path) as f:
+            for line in f:
+                key, _, value = line.partition(' ')
+                stat[key] = int(value)
+        if usage_path == stat_path:
+            usage = stat.get('usage_usec', 0) * 1000
+        else:
+            with open(usage_path) as f:
+                usage = int(f.read())
+    except (OSError, ValueError):
+        return 0, 0
+    return usage, stat.get('nr_throttled', 0)
+
+
+def read_tx_bytes(iface):
+    with open('/sys/class/net/%s/statistics/tx_bytes' % iface) as f:
+        return int(f.read())
+
+
+class FidelityMonitor(object):
+    '''Samples in a thread of the runner; see the module docstring.
+    hosts maps names to pids (Mininet's host.pid).  With abort_after set,
+    on_trip(reason) is called once when a core has been saturated for that
+    many seconds or a host got throttled.'''
+
+    def __init__(self, iface, hosts=None, interval_sec=0.1, fname='fidelity.txt',
+                 abort_after=None, on_trip=None):
+        self.iface = iface
+        self.cgroups = []
+        for name, pid in sorted((hosts or {}).items()):
+            paths = cgroup_of(pid)
+            if paths is not None and os.path.exists(paths[1]):
+                self.cgroups.append((name, paths))
+        self.interval = interval_sec
+        self.fname = fname
+        self.abort_after = abort_after
+        self.on_trip = on_trip
+        self.tripped = None
+        self.done = threading.Event()
+        self.thread = None
+
+    def columns(self):
+        cols = ['time', 'busy', 'busiest', 'tx_bytes']
+        for name, _ in self.cgroups:
+            cols += ['%s_cpu_ns' % name, '%s_throttled' % name]
+        return cols
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='fidelity')
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.done.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        with open('/proc/stat') as f:
+            prev = parse_proc_stat(f.read())
+        throttled = dict((name, read_cgroup(paths)[1]) for name, paths in self.cgroups)
+        saturated_since = None
+        with open(self.fname, 'w') as out:
+            out.write('# %s\n' % ','.join(self.columns()))
+            while not self.done.wait(self.interval):
+                now = time()
+                with open('/proc/stat') as f:
+                    cur = parse_proc_stat(f.read())
+                busy, busiest = cpu_busy(prev, cur)
+                prev = cur
+                row = ['%f' % now, '%.3f' % busy, '%.3f' % busiest,
+                       '%d' % read_tx_bytes(self.iface)]
+                reason = None
+                for name, paths in self.cgroups:
+                    usage, nr = read_cgroup(paths)
+                    row += ['%d' % usage, '%d' % nr]
+                    if nr > throttled[name]:
+                        reason = '%s throttled by its CPU limit' % name
+                out.write(','.join(row) + '\n')
+                out.flush()
+
+                if busiest >= SATURATED:
+                    saturated_since = now if saturated_since is None else saturated_since
+                    if now - saturated_since >= (self.abort_after or 0):
+                        reason = reason or 'a core saturated for %.1fs' % (now - saturated_since)
+                else:
+                    saturated_since = None
+                if reason and self.abort_after is not None and self.tripped is None:
+                    self.tripped = reason
+                    if self.on_trip is not None:
+                        self.on_trip(reason)
+
+
+def load_fidelity(path):
+    '''{column: array} of a fidelity.txt.'''
+    with open(path) as f:
+        header = f.readline().lstrip('#').strip().split(',')
+    data = np.loadtxt(path, delimiter=',', comments='#', ndmin=2)
+    if data.size == 0:
+        data = np.zeros((0, len(header)))
+    return dict((name, data[:, i]) for i, name in enumerate(header))
+
+
+def backlogged_rate(t, tx_bytes, qt, qlen):
+    '''(bits/s, seconds) sent over the sampling intervals during which the
+    queue held at least BACKLOG packets at both ends.'''
+    if len(t) < 2 or len(qt) == 0:
+        return float('nan'), 0.0
+    q = np.interp(t, qt, qlen, left=0, right=0)
+    busy = (q[:-1] >= BACKLOG) & (q[1:] >= BACKLOG)
+    seconds = float(np.sum(np.diff(t)[busy]))
+    if seconds == 0:
+        return float('nan'), 0.0
+    return 8.0 * float(np.sum(np.diff(tx_bytes)[busy])) / seconds, seconds
+
+
+def check(run_dir, bw_net=None):
+    '''Verdict on a finished run: {'ok', 'problems', ...figures}.  bw_net
+    (Mb/s) defaults to the run's params.json.'''
+    from tsformat import load_queue
+    from aggregate import find_input
+    if bw_net is None:
+        with open(os.path.join(run_dir, 'params.json')) as f:
+            bw_net = json.load(f)['bw_net']
+    cols = load_fidelity(os.path.join(run_dir, 'fidelity.txt'))
+    t = cols['time']
+    result = {'samples': len(t), 'bw_net': bw_net, 'problems': []}
+    problems = result['problems']
+    if len(t) < 2:
+        problems.append('too few fidelity samples')
+        result['ok'] = False
+        return result
+
+    result['busy_mean'] = float(np.mean(cols['busy']))
+    result['busiest_p95'] = float(np.percentile(cols['busiest'], 95))
+    result['saturated'] = float(np.mean(cols['busiest'] >= SATURATED))
+    if result['saturated'] > MAX_SATURATED:
+        problems.append('a core was saturated in %.0f%% of samples' % (100 * result['saturated']))
+
+    span = t[-1] - t[0]
+    result['hosts'] = {}
+    for name in [c[:-len('_cpu_ns')] for c in cols if c.endswith('_cpu_ns')]:
+        cpu = cols[name + '_cpu_ns']
+        thr = cols[name + '_throttled']
+        result['hosts'][name] = {'cpu': float(cpu[-1] - cpu[0]) / 1e9 / span,
+                                 'throttled': int(thr[-1] - thr[0])}
+        if thr[-1] > thr[0]:
+            problems.append('%s was throttled %d times' % (name, thr[-1] - thr[0]))
+
+    q = find_input(run_dir, 'q')
+    if q is not None:
+        qt, qlen = load_queue(q)
+        rate, seconds = backlogged_rate(t, cols['tx_bytes'], np.asarray(qt), np.asarray(qlen))
+        result['backlogged_s'] = seconds
+        if seconds > 0:
+            result['link_ratio'] = rate / (bw_net * 1e6)
+            if abs(result['link_ratio'] - 1) > RATE_TOLERANCE:
+                problems.append('bottleneck sent %.2f Mb/s with a standing queue, '
+                                'configured %g Mb/s' % (rate / 1e6, bw_net))
+    result['ok'] = not problems
+    return result
+
+
+def format_check(result):
+    lines = ['fidelity: %s' % ('ok' if result['ok'] else 'SUSPECT')]
+    if 'busy_mean' in result:
+        lines.append('    CPU: mean %.0f%%, busiest core p95 %.0f%%, saturated %.0f%% of samples' % (
+            100 * result['busy_mean'], 100 * result['busiest_p95'], 100 * result['saturated']))
+    for name, h in sorted(result.get('hosts', {}).items()):
+        lines.append('    %s: %.2f cores, throttled %d' % (name, h['cpu'], h['throttled']))
+    if 'link_ratio' in result:
+        lines.append('    link: %.3f x bw-net over %.1fs with a standing queue' % (
+            result['link_ratio'], result['backlogged_s']))
+    lines += ['    ! ' + p for p in result['problems']]
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a run for emulation overhead")
+    parser.add_argument('dir', help="Run directory with fidelity.txt")
+    parser.add_argument('--bw-net', '-b', type=float, default=None,
+                        help="Bottleneck rate (Mb/s), default from params.json")
+    args = parser.parse_args()
+    result = check(args.dir, args.bw_net)
+    with open(os.path.join(args.dir, 'fidelity.json'), 'w') as f:
+        json.dump(result, f, indent=1, sort_keys=True)
+    print(format_check(result))
+
+
+if __name__ == '__main__':
+    main()
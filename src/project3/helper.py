@@ -1,15 +1,20 @@
 '''
-Helper module for the plot scripts.
+Helper module for the plot scripts.  matplotlib (m) and pyplot (plt)
+are imported, with the Agg backend, on first use of either name.
 '''
 
-import re
 import itertools
-import matplotlib as m
-import os
-m.use("Agg")
-import matplotlib.pyplot as plt
-import argparse
-import math
+
+import stats
+
+def __getattr__(name):
+    if name in ('m', 'plt'):
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot
+        globals().update(m=matplotlib, plt=matplotlib.pyplot)
+        return globals()[name]
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 def read_list(fname, delim=','):
     lines = open(fname)
@@ -23,12 +28,7 @@ def read_list(fname, delim=','):
 def ewma(alpha, values):
     if alpha == 0:
         return values
-    ret = []
-    prev = 0
-    for v in values:
-        prev = alpha * prev + (1 - alpha) * v
-        ret.append(prev)
-    return ret
+    return stats.ewma(alpha, values)
 
 def col(n, obj = None, clean = lambda e: e):
     """A versatile column extractor.
@@ -59,12 +59,10 @@ def transpose(l):
     return zip(*l)
 
 def avg(lst):
-    return sum(map(float, lst)) / len(lst)
+    return stats.mean(lst)
 
 def stdev(lst):
-    mean = avg(lst)
-    var = avg(list(map(lambda e: (e - mean)**2, lst)))
-    return math.sqrt(var)
+    return stats.stdev(lst)
 
 def xaxis(values, limit):
     l = len(values)
@@ -73,51 +71,16 @@ def xaxis(values, limit):
 def grouper(n, iterable, fillvalue=None):
     "grouper(3, 'ABCDEFG', 'x') --> ABC DEF Gxx"
     args = [iter(iterable)] * n
-    return itertools.izip_longest(fillvalue=fillvalue, *args)
+    return itertools.zip_longest(fillvalue=fillvalue, *args)
 
 def cdf(values):
-    values.sort()
-    prob = 0
-    l = len(values)
-    x, y = [], []
-
-    for v in values:
-        prob += 1.0 / l
-        x.append(v)
-        y.append(prob)
-
-    return (x, y)
-
-def parse_cpu_usage(fname, nprocessors=8):
-    """Returns (user,system,nice,iowait,hirq,sirq,steal) tuples
-	aggregated over all processors.  DOES NOT RETURN IDLE times."""
-
-    data = grouper(nprocessors, open(fname).readlines())
-
-    """Typical line looks like:
-    Cpu0  :  0.0%us,  1.0%sy,  0.0%ni, 97.0%id,  0.0%wa,  0.0%hi,  2.0%si,  0.0%st
-    """
-    ret = [] 
-    for collection in data:
-        total = [0]*8
-        for cpu in collection:
-          usages = cpu.split(':')[1]
-          usages = map(lambda e: e.split('%')[0],
-                       usages.split(','))
-          for i in xrange(len(usages)):
-              total[i] += float(usages[i])
-        total = map(lambda t: t/nprocessors, total)
-		# Skip idle time
-        ret.append(total[0:3] + total[4:])
-    return ret
+    return stats.cdf(values)
 
 def pc95(lst):
-    l = len(lst)
-    return sorted(lst)[ int(0.95 * l) ]
+    return stats.quantiles(lst, (0.95,))[0]
 
 def pc99(lst):
-    l = len(lst)
-    return sorted(lst)[ int(0.99 * l) ]
+    return stats.quantiles(lst, (0.99,))[0]
 
 def coeff_variation(lst):
     return stdev(lst) / avg(lst)
@@ -0,0 +1,130 @@
+'''
+Load benchmark: webserver.py against the standard library's
+ThreadingHTTPServer, serving the same directory on loopback.
+
+    python3 http/bench.py [--clients 16] [--duration 5] [--fresh]
+
+Each client is a separate process running webprobe.Probe in a closed loop
+(keep-alive unless --fresh), so the load generator is not limited by one
+interpreter.  Reports requests/s and latency percentiles per server.
+'''
+
+import argparse
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(HERE))
+
+from webprobe import Probe, FetchError
+import stats
+
+THREADING_SERVER = '''
+import functools, sys
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+class Handler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    def log_message(self, *args):
+        pass
+ThreadingHTTPServer.request_queue_size = 1024
+ThreadingHTTPServer(("127.0.0.1", int(sys.argv[1])),
+                    functools.partial(Handler, directory=sys.argv[2])).serve_forever()
+'''
+
+
+def free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def wait_listening(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('server on port %d did not start' % port)
+
+
+def client(url, duration, keepalive, queue):
+    probe = Probe(url, keepalive)
+    latencies = []
+    errors = 0
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        try:
+            total, _, _, _, status = probe.fetch()
+        except (OSError, FetchError):
+            errors += 1
+            continue
+        if status == 200:
+            latencies.append(total)
+        else:
+            errors += 1
+    probe.close()
+    queue.put((latencies, errors))
+
+
+def load(url, clients, duration, keepalive):
+    queue = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=client, args=(url, duration, keepalive, queue))
+             for _ in range(clients)]
+    for p in procs:
+        p.start()
+    latencies, errors = [], 0
+    for _ in procs:
+        lat, err = queue.get()
+        latencies += lat
+        errors += err
+    for p in procs:
+        p.join()
+    return latencies, errors
+
+
+def bench(name, cmd, port, path, args):
+    server = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_listening(port)
+        url = 'http://127.0.0.1:%d%s' % (port, path)
+        latencies, errors = load(url, args.clients, args.duration, not args.fresh)
+    finally:
+        server.terminate()
+        server.wait()
+    p50, p99 = stats.quantiles(latencies, (0.5, 0.99))
+    print('%-22s %9.0f req/s   p50 %7.3f ms   p99 %7.3f ms   %d errors' % (
+        name, len(latencies) / args.duration, p50 * 1e3, p99 * 1e3, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark webserver.py against ThreadingHTTPServer")
+    parser.add_argument('--clients', '-c', type=int, default=16)
+    parser.add_argument('--duration', '-t', type=float, default=5.0)
+    parser.add_argument('--path', default='/index.html')
+    parser.add_argument('--root', default=HERE)
+    parser.add_argument('--fresh', action='store_true',
+                        help="New connection per request instead of keep-alive")
+    args = parser.parse_args()
+
+    print('%d clients, %.0fs, %s, %s' % (args.clients, args.duration, args.path,
+                                        'fresh connections' if args.fresh else 'keep-alive'))
+    port = free_port()
+    bench('ThreadingHTTPServer', [sys.executable, '-c', THREADING_SERVER, str(port), args.root],
+          port, args.path, args)
+    port = free_port()
+    bench('webserver.py (asyncio)', [sys.executable, os.path.join(HERE, 'webserver.py'),
+                                     '--host', '127.0.0.1', '--port', str(port),
+                                     '--root', args.root],
+          port, args.path, args)
+
+
+if __name__ == '__main__':
+    main()
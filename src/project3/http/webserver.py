@@ -1,14 +1,223 @@
-import SimpleHTTPServer
-import SocketServer
+'''
+Static file server for the bufferbloat experiment.
+
+asyncio HTTP/1.1 with keep-alive, serving files under --root (by default
+this directory, so / is index.html):
+
+    python3 http/webserver.py [--port 80] [--root DIR]
+
+Small files are kept in memory and re-read only when their mtime or size
+changes; larger ones go out with loop.sendfile.  Responses carry an ETag,
+If-None-Match gets a 304, and FILE.gz is sent instead of FILE to clients
+that accept gzip when it is at least as new as FILE.
+
+bench.py compares this against the standard library's ThreadingHTTPServer.
+'''
+
+import argparse
+import asyncio
+import email.utils
+import mimetypes
+import os
+import sys
+from urllib.parse import unquote, urlsplit
 
 PORT = 80
 
-class Handler(SimpleHTTPServer.SimpleHTTPRequestHandler):
-    # Disable logging DNS lookups
-    def address_string(self):
-        return str(self.client_address[0])
+# Files up to this size are cached in memory; bigger ones are sendfile()d
+CACHE_MAX = 1 << 20
+MAX_HEADER = 1 << 16
+KEEPALIVE_TIMEOUT = 30.0
+
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 403: 'Forbidden',
+           404: 'Not Found', 405: 'Method Not Allowed', 408: 'Request Timeout',
+           431: 'Request Header Fields Too Large', 505: 'HTTP Version Not Supported'}
+
+
+class Entry(object):
+    '''What we know about one file on disk (or its .gz variant).'''
+
+    __slots__ = ('path', 'mtime_ns', 'size', 'etag', 'ctype', 'body', 'last_modified')
+
+    def __init__(self, path, st, ctype, gz=False):
+        self.path = path
+        self.mtime_ns = st.st_mtime_ns
+        self.size = st.st_size
+        self.etag = '"%x-%x%s"' % (st.st_mtime_ns, st.st_size, '-gz' if gz else '')
+        self.ctype = ctype
+        self.last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+        self.body = None
+        if self.size <= CACHE_MAX:
+            with open(path, 'rb') as f:
+                self.body = f.read()
+
+    def fresh(self, st):
+        return st.st_mtime_ns == self.mtime_ns and st.st_size == self.size
+
+
+class FileCache(object):
+    '''Maps request paths to Entry objects, revalidating with one stat().'''
+
+    def __init__(self, root):
+        self.root = os.path.realpath(root)
+        self.entries = {}
+
+    def resolve(self, url_path):
+        '''Filesystem path for a URL path, or None if it escapes the root.
+        Raises ValueError for paths no file can have (%00).'''
+        rel = os.path.normpath(unquote(url_path)).lstrip('/')
+        if '\0' in rel:
+            raise ValueError('NUL in path')
+        path = os.path.realpath(os.path.join(self.root, rel))
+        if path != self.root and not path.startswith(self.root + os.sep):
+            return None
+        if os.path.isdir(path):
+            path = os.path.join(path, 'index.html')
+        return path
+
+    def _get(self, path, ctype, gz=False):
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.entries.pop(path, None)
+            return None
+        entry = self.entries.get(path)
+        if entry is None or not entry.fresh(st):
+            entry = Entry(path, st, ctype, gz)
+            self.entries[path] = entry
+        return entry
+
+    def lookup(self, path, accept_gzip):
+        '''(entry, gzipped) for a resolved path, or (None, False).'''
+        ctype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        entry = self._get(path, ctype)
+        if entry is None:
+            return None, False
+        if accept_gzip:
+            gz = self._get(path + '.gz', ctype, gz=True)
+            if gz is not None and gz.mtime_ns >= entry.mtime_ns:
+                return gz, True
+        return entry, False
+
+
+class Server(object):
+
+    def __init__(self, root):
+        self.cache = FileCache(root)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'),
+                                                  KEEPALIVE_TIMEOUT)
+                except asyncio.LimitOverrunError:
+                    await self.error(writer, 431)
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    break
+                if not await self.respond(head, writer):
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def error(self, writer, status, keep=False):
+        body = ('%d %s\n' % (status, REASONS[status])).encode()
+        writer.write(self.head(status, [('Content-Type', 'text/plain'),
+                                        ('Content-Length', str(len(body)))], keep) + body)
+        await writer.drain()
+        return keep
+
+    def head(self, status, headers, keep):
+        lines = ['HTTP/1.1 %d %s' % (status, REASONS[status]),
+                 'Server: cse461-bufferbloat',
+                 'Date: ' + email.utils.formatdate(usegmt=True),
+                 'Connection: ' + ('keep-alive' if keep else 'close')]
+        lines += ['%s: %s' % h for h in headers]
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def respond(self, head, writer):
+        '''Answers one request.  Returns whether to keep the connection.'''
+        try:
+            lines = head.decode('latin-1').split('\r\n')
+            method, target, version = lines[0].split(' ')
+        except ValueError:
+            return await self.error(writer, 400)
+        if not version.startswith('HTTP/1.'):
+            return await self.error(writer, 505)
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+        conn = headers.get('connection', '').lower()
+        keep = conn == 'keep-alive' if version == 'HTTP/1.0' else conn != 'close'
+        if method not in ('GET', 'HEAD'):
+            # we never read request bodies, so the stream cannot be reused
+            return await self.error(writer, 405)
+
+        try:
+            path = self.cache.resolve(urlsplit(target).path)
+            if path is None:
+                return await self.error(writer, 403, keep)
+            entry, gzipped = self.cache.lookup(path, 'gzip' in headers.get('accept-encoding', ''))
+        except ValueError:
+            return await self.error(writer, 400, keep)
+        if entry is None:
+            return await self.error(writer, 404, keep)
+
+        common = [('ETag', entry.etag), ('Last-Modified', entry.last_modified),
+                  ('Vary', 'Accept-Encoding')]
+        inm = headers.get('if-none-match')
+        if inm is not None and (inm.strip() == '*' or entry.etag in
+                                [t.strip() for t in inm.split(',')]):
+            writer.write(self.head(304, common, keep))
+            await writer.drain()
+            return keep
+
+        hdrs = [('Content-Type', entry.ctype), ('Content-Length', str(entry.size))] + common
+        if gzipped:
+            hdrs.append(('Content-Encoding', 'gzip'))
+        writer.write(self.head(200, hdrs, keep))
+        if method == 'HEAD':
+            await writer.drain()
+        elif entry.body is not None:
+            writer.write(entry.body)
+            await writer.drain()
+        else:
+            await writer.drain()
+            with open(entry.path, 'rb') as f:
+                await asyncio.get_running_loop().sendfile(writer.transport, f, 0, entry.size)
+        return keep
+
+
+async def serve(host, port, root, ready=None):
+    server = Server(root)
+    srv = await asyncio.start_server(server.handle, host, port,
+                                     limit=MAX_HEADER, reuse_address=True, backlog=1024)
+    print("Server1: httpd serving at port", port)
+    sys.stdout.flush()
+    if ready is not None:
+        ready.set()
+    async with srv:
+        await srv.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Static HTTP/1.1 file server")
+    parser.add_argument('--port', '-p', type=int, default=PORT)
+    parser.add_argument('--host', default='')
+    parser.add_argument('--root', '-r', default=os.path.dirname(os.path.abspath(__file__)),
+                        help="Directory to serve (default: this script's directory)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host or None, args.port, args.root))
+    except KeyboardInterrupt:
+        pass
+
 
-Handler = Handler
-httpd = SocketServer.TCPServer(("", PORT), Handler)
-print("Server1: httpd serving at port", PORT)
-httpd.serve_forever()
+if __name__ == '__main__':
+    main()
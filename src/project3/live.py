@@ -0,0 +1,496 @@
+'''
+Live view of a bufferbloat run: queue length, ping RTT and web fetch
+times as they are measured.
+
+Samples travel as UNIX datagrams to a socket the viewer binds.  Senders
+never block and never fail: with no viewer (or a slow one) samples are
+simply dropped, so a run behaves the same with or without one watching.
+
+    python3 live.py serve --socket /tmp/bb.sock --port 8461 [--tui] [--allow-abort]
+    sudo python3 bufferbloat.py ... --live /tmp/bb.sock
+
+and open http://localhost:8461/ (server-sent events, no JavaScript
+libraries), or watch the terminal with --tui (--port 0 for the TUI
+alone).  bufferbloat.py publishes queue samples from the monitor
+process (monitor_qlen(live=...)) and runs `live.py tail` to follow
+ping.txt and fetch.txt.  With --allow-abort the page gets a button that
+sends the run SIGTERM; the run then tears down as after Ctrl-C, keeping
+what it measured so far.
+
+The socket is private to its owner unless --socket-mode says otherwise
+(root can always write to it).  The pid to abort is the one the kernel
+reports for the sender of the run line (SCM_CREDENTIALS), and it must
+still be running bufferbloat.py.  The abort POST has to carry the
+per-session token embedded in the page and, if it has an Origin, come
+from the page's own origin.
+
+Datagrams hold one or more lines:
+
+    <kind> <epoch time> <value>     kind is q (packets), rtt (ms, nan if
+                                    lost) or fetch (seconds)
+    run <pid> <dir>                 a run started (the viewer uses the
+                                    sender's pid, not this one)
+'''
+
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import secrets
+import signal
+import socket
+import struct
+import sys
+from collections import deque
+from time import sleep, time
+
+KINDS = ('q', 'rtt', 'fetch')
+WINDOW = 60.0
+PORT = 8461
+SOCKET_MODE = 0o600
+MAX_DATAGRAM = 1 << 18
+# struct ucred, the payload of SCM_CREDENTIALS
+UCRED = struct.Struct('3i')
+
+
+class Publisher(object):
+    '''Fire-and-forget sender of samples to a viewer's socket.'''
+
+    def __init__(self, path):
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.dropped = 0
+
+    def send_raw(self, data):
+        try:
+            self.sock.sendto(data, self.path)
+        except OSError:
+            # no viewer, or its buffer is full
+            self.dropped += 1
+
+    def send(self, kind, t, value):
+        self.send_raw(('%s %f %g\n' % (kind, t, value)).encode())
+
+    def send_many(self, kind, samples):
+        if samples:
+            self.send_raw(''.join('%s %f %g\n' % (kind, t, v) for t, v in samples).encode())
+
+    def hello(self, run_dir):
+        self.send_raw(('run %d %s\n' % (os.getpid(), run_dir)).encode())
+
+    def close(self):
+        self.sock.close()
+
+
+# ------------------------------------------------------------- tailing
+
+def follow(f, stopped, poll_sec=0.05):
+    '''Lines of a growing file, as `tail -f`, until stopped() is true.'''
+    partial = ''
+    while True:
+        line = f.readline()
+        if line:
+            partial += line
+            if partial.endswith('\n'):
+                yield partial
+                partial = ''
+            continue
+        if stopped():
+            return
+        sleep(poll_sec)
+
+
+def wait_for(path, stopped, poll_sec=0.1):
+    while not os.path.exists(path):
+        if stopped():
+            return None
+        sleep(poll_sec)
+    return open(path)
+
+
+def tail(publisher, ping=None, fetch=None, freq=10):
+    '''Publishes RTTs from ping -D output and fetch times from webprobe's
+    fetch.txt as the files grow, until SIGTERM.'''
+    import threading
+    import pingparse
+    from webprobe import parse_sample
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    def ping_loop():
+        f = wait_for(ping, stop.is_set)
+        if f is not None:
+            for t, _, _, rtt in pingparse.iter_ping(follow(f, stop.is_set), freq):
+                publisher.send('rtt', t, rtt)
+
+    def fetch_loop():
+        f = wait_for(fetch, stop.is_set)
+        if f is not None:
+            for line in follow(f, stop.is_set):
+                t, total, _, _, _, status = parse_sample(line)
+                if status >= 0:
+                    publisher.send('fetch', t, total)
+
+    threads = [threading.Thread(target=loop, daemon=True)
+               for loop, path in ((ping_loop, ping), (fetch_loop, fetch)) if path]
+    for thread in threads:
+        thread.start()
+    while not stop.wait(0.5) and any(thread.is_alive() for thread in threads):
+        pass
+    stop.set()
+    for thread in threads:
+        thread.join(1.0)
+
+
+# --------------------------------------------------------------- viewer
+
+class Window(object):
+    '''The last window_sec seconds of every kind, plus what is new since
+    the last take_new().'''
+
+    def __init__(self, window_sec=WINDOW):
+        self.window = window_sec
+        self.series = dict((k, deque()) for k in KINDS)
+        self.new = dict((k, []) for k in KINDS)
+        self.run = None
+        self.received = 0
+
+    def feed(self, data, pid=None):
+        '''Takes one datagram; pid is its sender's, as the kernel saw it.'''
+        for line in data.decode('utf-8', 'replace').splitlines():
+            fields = line.split(' ', 2)
+            if len(fields) != 3:
+                continue
+            if fields[0] == 'run':
+                self.run = {'pid': pid, 'dir': fields[2]}
+                for k in KINDS:
+                    self.series[k].clear()
+                continue
+            if fields[0] not in self.series:
+                continue
+            try:
+                t, v = float(fields[1]), float(fields[2])
+            except ValueError:
+                continue
+            # JSON has no NaN; a lost probe is a gap (null)
+            sample = (t, v if v == v else None)
+            self.received += 1
+            series = self.series[fields[0]]
+            series.append(sample)
+            while series and series[0][0] < sample[0] - self.window:
+                series.popleft()
+            self.new[fields[0]].append(sample)
+
+    def take_new(self):
+        new = dict((k, v) for k, v in self.new.items() if v)
+        self.new = dict((k, []) for k in KINDS)
+        return new
+
+    def snapshot(self):
+        return dict((k, list(v)) for k, v in self.series.items())
+
+
+def receive(sock, window):
+    '''Feeds every datagram waiting on sock to window, with the sender's
+    pid from its SCM_CREDENTIALS.'''
+    while True:
+        try:
+            data, ancdata, _, _ = sock.recvmsg(MAX_DATAGRAM, socket.CMSG_SPACE(UCRED.size))
+        except (BlockingIOError, InterruptedError):
+            return
+        pid = None
+        for level, kind, value in ancdata:
+            if level == socket.SOL_SOCKET and kind == socket.SCM_CREDENTIALS:
+                pid = UCRED.unpack(value[:UCRED.size])[0]
+        window.feed(data, pid)
+
+
+def bind_socket(path, mode=SOCKET_MODE):
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    # have the kernel attach each sender's credentials
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_PASSCRED, 1)
+    sock.bind(path)
+    # a root run can write to a user's viewer regardless; anything else
+    # needs a wider --socket-mode
+    os.chmod(path, mode)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    sock.setblocking(False)
+    return sock
+
+
+def is_bufferbloat(pid):
+    '''Whether pid is running bufferbloat.py.  Checked right before it is
+    signalled, since the run may be gone and its pid reused.'''
+    try:
+        with open('/proc/%d/cmdline' % pid, 'rb') as f:
+            argv = f.read().split(b'\0')
+    except OSError:
+        return False
+    scripts = [a for a in argv if a.endswith(b'.py')]
+    return bool(scripts) and os.path.basename(scripts[0]) == b'bufferbloat.py'
+
+
+def sse(event, payload):
+    return ('event: %s\ndata: %s\n\n' % (event, json.dumps(payload, separators=(',', ':')))).encode()
+
+
+class Viewer(object):
+    '''SSE web page over a Window; pushes new samples every push_sec.'''
+
+    def __init__(self, window, allow_abort=False, push_sec=0.1):
+        self.window = window
+        self.allow_abort = allow_abort
+        self.push = push_sec
+        self.clients = set()
+        # only the page we served knows it
+        self.token = secrets.token_urlsafe(16)
+
+    async def broadcast(self):
+        while True:
+            await asyncio.sleep(self.push)
+            new = self.window.take_new()
+            if new and self.clients:
+                message = sse('samples', new)
+                for queue in list(self.clients):
+                    if queue.qsize() < 100:
+                        queue.put_nowait(message)
+
+    def abort(self, headers):
+        run = self.window.run
+        if not self.allow_abort or run is None:
+            return 403, 'abort not allowed\n'
+        token = headers.get('x-abort-token', '').encode('latin-1')
+        if not hmac.compare_digest(token, self.token.encode()):
+            return 403, 'missing or wrong abort token\n'
+        origin = headers.get('origin')
+        if origin is not None and origin != 'http://' + headers.get('host', ''):
+            return 403, 'abort from a foreign origin\n'
+        if run['pid'] is None or not is_bufferbloat(run['pid']):
+            return 409, 'run %s is not a running bufferbloat.py\n' % run['pid']
+        try:
+            os.kill(run['pid'], signal.SIGTERM)
+        except OSError as e:
+            return 409, 'could not signal run: %s\n' % e
+        return 200, 'sent SIGTERM to %d\n' % run['pid']
+
+    async def handle(self, reader, writer):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+            lines = head.decode('latin-1').split('\r\n')
+            method, target = lines[0].split(' ')[:2]
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            if method == 'GET' and target == '/':
+                body = PAGE.replace('__TOKEN__', self.token).encode()
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n'
+                             b'Content-Length: %d\r\nConnection: close\r\n\r\n' % len(body) + body)
+            elif method == 'GET' and target == '/events':
+                await self.events(writer)
+            elif method == 'POST' and target == '/abort':
+                status, text = self.abort(headers)
+                writer.write(('HTTP/1.1 %d -\r\nContent-Type: text/plain\r\nContent-Length: %d\r\n'
+                              'Connection: close\r\n\r\n%s' % (status, len(text), text)).encode())
+            else:
+                writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError,
+                ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def events(self, writer):
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n'
+                     b'Cache-Control: no-cache\r\nConnection: close\r\n\r\n')
+        writer.write(sse('history', {'window': self.window.window, 'run': self.window.run,
+                                     'abort': self.allow_abort,
+                                     'series': self.window.snapshot()}))
+        await writer.drain()
+        queue = asyncio.Queue()
+        self.clients.add(queue)
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), 15)
+                except asyncio.TimeoutError:
+                    message = b': keepalive\n\n'
+                writer.write(message)
+                await writer.drain()
+        finally:
+            self.clients.discard(queue)
+
+
+BARS = ' ▁▂▃▄▅▆▇█'
+
+
+def sparkline(samples, t1, window, width):
+    '''One text row: per column, the max of the samples that fall in it.'''
+    cols = [None] * width
+    for t, v in samples:
+        i = int((t - (t1 - window)) / window * (width - 1))
+        if 0 <= i < width and v is not None:
+            cols[i] = v if cols[i] is None else max(cols[i], v)
+    top = max([c for c in cols if c is not None] or [0]) or 1
+    return ''.join(' ' if c is None else BARS[int(round(c / top * (len(BARS) - 1)))]
+                   for c in cols), top
+
+
+async def tui(window, refresh_sec=0.5):
+    units = {'q': 'pkts', 'rtt': 'ms', 'fetch': 's'}
+    while True:
+        await asyncio.sleep(refresh_sec)
+        width = max(os.get_terminal_size(sys.stdout.fileno()).columns - 2, 20) \
+            if sys.stdout.isatty() else 78
+        series = window.snapshot()
+        now = max([s[-1][0] for s in series.values() if s] or [time()])
+        run = window.run
+        lines = ['\x1b[H\x1b[2J%s  (%d samples, last %.0fs)' % (
+            'run %(pid)d %(dir)s' % run if run else 'waiting for a run...',
+            window.received, window.window)]
+        for k in KINDS:
+            row, top = sparkline(series[k], now, window.window, width)
+            last = ('%g' % series[k][-1][1]) if series[k] and series[k][-1][1] is not None else '-'
+            lines.append('%s: last %s %s, max %g' % (k, last, units[k], top if series[k] else 0))
+            lines.append(' ' + row)
+        sys.stdout.write('\n'.join(lines) + '\n')
+        sys.stdout.flush()
+
+
+async def serve(args):
+    loop = asyncio.get_running_loop()
+    window = Window(args.window)
+    sock = bind_socket(args.socket, args.socket_mode)
+    loop.add_reader(sock.fileno(), receive, sock, window)
+    tasks = []
+    if args.port:
+        viewer = Viewer(window, args.allow_abort)
+        server = await asyncio.start_server(viewer.handle, args.host, args.port, reuse_address=True)
+        tasks += [server.serve_forever(), viewer.broadcast()]
+        print('live view on http://%s:%d/ (samples on %s)' % (args.host, args.port, args.socket))
+        sys.stdout.flush()
+    if args.tui:
+        tasks.append(tui(window))
+    await asyncio.gather(*tasks)
+
+
+PAGE = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>bufferbloat live</title>
+<style>
+body { font-family: sans-serif; margin: 1em 2em; }
+canvas { width: 100%; height: 220px; border: 1px solid #ccc; margin-bottom: 1em; }
+#status { color: #555; } button { float: right; }
+</style></head><body>
+<button id="abort" hidden>Abort run</button>
+<h3>bufferbloat live <span id="status">connecting...</span></h3>
+<div>Queue (packets) <span id="q-last"></span></div><canvas id="q"></canvas>
+<div>Ping RTT (ms) <span id="rtt-last"></span></div><canvas id="rtt"></canvas>
+<div>Fetch time (s) <span id="fetch-last"></span></div><canvas id="fetch"></canvas>
+<script>
+const kinds = ["q", "rtt", "fetch"], colors = {q: "red", rtt: "black", fetch: "blue"};
+let series = {q: [], rtt: [], fetch: []}, windowSec = 60, dirty = true;
+function add(kind, samples) {
+  const s = series[kind];
+  for (const p of samples) s.push(p);
+  if (s.length) {
+    const cut = s[s.length - 1][0] - windowSec;
+    let i = 0; while (i < s.length && s[i][0] < cut) i++;
+    if (i) s.splice(0, i);
+    const v = s[s.length - 1][1];
+    document.getElementById(kind + "-last").textContent = "last " + (v === null ? "lost" : v.toPrecision(4));
+  }
+  dirty = true;
+}
+function draw() {
+  if (dirty) {
+    dirty = false;
+    const now = Math.max(0, ...kinds.map(k => series[k].length ? series[k][series[k].length - 1][0] : 0));
+    for (const k of kinds) {
+      const c = document.getElementById(k), ctx = c.getContext("2d");
+      c.width = c.clientWidth; c.height = c.clientHeight;
+      const s = series[k], top = Math.max(1, ...s.map(p => p[1]).filter(v => v !== null)) * 1.1;
+      ctx.fillStyle = "#888"; ctx.font = "12px sans-serif";
+      ctx.fillText(top.toPrecision(3), 2, 12); ctx.fillText("-" + windowSec + "s", 2, c.height - 4);
+      ctx.strokeStyle = colors[k]; ctx.lineWidth = 2; ctx.beginPath();
+      let pen = false;
+      for (const [t, v] of s) {
+        const x = c.width * (1 - (now - t) / windowSec), y = c.height * (1 - v / top);
+        if (v === null) { pen = false; continue; }
+        if (pen) ctx.lineTo(x, y); else ctx.moveTo(x, y);
+        pen = k !== "fetch";
+        if (!pen) ctx.fillRect(x - 2, y - 2, 4, 4);
+      }
+      ctx.stroke();
+    }
+  }
+  requestAnimationFrame(draw);
+}
+const es = new EventSource("events");
+es.addEventListener("history", e => {
+  const h = JSON.parse(e.data);
+  windowSec = h.window; series = {q: [], rtt: [], fetch: []};
+  for (const k of kinds) add(k, h.series[k]);
+  document.getElementById("status").textContent = h.run ? "run " + h.run.pid + " " + h.run.dir : "waiting for a run";
+  document.getElementById("abort").hidden = !h.abort;
+});
+es.addEventListener("samples", e => { const d = JSON.parse(e.data); for (const k in d) add(k, d[k]); });
+es.onerror = () => { document.getElementById("status").textContent = "disconnected"; };
+document.getElementById("abort").onclick = () => {
+  if (confirm("Stop the run now?"))
+    fetch("abort", {method: "POST", headers: {"X-Abort-Token": "__TOKEN__"}})
+      .then(r => r.text()).then(alert);
+};
+requestAnimationFrame(draw);
+</script></body></html>
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live view of a bufferbloat run")
+    sub = parser.add_subparsers(dest='mode')
+    sub.required = True
+
+    p = sub.add_parser('serve', help="Receive samples and show them")
+    p.add_argument('--socket', '-s', required=True, help="UNIX socket to receive samples on")
+    p.add_argument('--port', '-p', type=int, default=PORT, help="HTTP port (0 for none)")
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--window', '-w', type=float, default=WINDOW, help="Seconds to show")
+    p.add_argument('--tui', action='store_true', help="Draw in the terminal")
+    p.add_argument('--allow-abort', action='store_true',
+                   help="Let the page stop the run (SIGTERM to bufferbloat.py)")
+    p.add_argument('--socket-mode', type=lambda v: int(v, 8), default=SOCKET_MODE,
+                   help="Permissions of the socket, octal (default 600: only its "
+                        "owner and root can send)")
+
+    p = sub.add_parser('tail', help="Publish ping RTTs and fetch times as the files grow")
+    p.add_argument('--socket', '-s', required=True)
+    p.add_argument('--ping', help="ping -D output to follow")
+    p.add_argument('--fetch', help="webprobe.py fetch.txt to follow")
+    p.add_argument('--freq', type=int, default=10)
+
+    args = parser.parse_args()
+    if args.mode == 'serve':
+        if not args.port and not args.tui:
+            parser.error('nothing to show: give --port or --tui')
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            asyncio.run(serve(args))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if os.path.exists(args.socket):
+                os.unlink(args.socket)
+    else:
+        publisher = Publisher(args.socket)
+        tail(publisher, args.ping, args.fetch, args.freq)
+        publisher.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,382 @@
-from time import sleep, time
+from time import sleep, time, monotonic_ns, time_ns
 from subprocess import *
 import re
+import signal
+import socket
+import struct
 
 default_dir = '.'
 
-def monitor_qlen(iface, interval_sec = 0.01, fname='%s/qlen.txt' % default_dir):
-    pat_queued = re.compile(rb'backlog\s[^\s]+\s([\d]+)p')
-    cmd = "tc -s qdisc show dev %s" % (iface)
-    ret = []
-    open(fname, 'w').write('')
-    while 1:
-        p = Popen(cmd, shell=True, stdout=PIPE)
-        output = p.stdout.read()
-        # Not quite right, but will do for now
-        matches = pat_queued.findall(output)
-        if matches and len(matches) > 1:
-            ret.append(matches[1])
-            t = "%f" % time()
-            open(fname, 'a').write('{},{}\n'.format(t, matches[1].decode('utf-8')))
-        sleep(interval_sec)
-    #open('qlen.txt', 'w').write('\n'.join(ret))
+# rtnetlink constants (linux/netlink.h, linux/rtnetlink.h, linux/gen_stats.h)
+NETLINK_ROUTE = 0
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWQDISC = 36
+RTM_GETQDISC = 38
+TCA_KIND = 1
+TCA_STATS = 3
+TCA_STATS2 = 7
+TCA_STATS_BASIC = 1
+TCA_STATS_QUEUE = 3
+TCA_STATS_APP = 4
+
+NLMSGHDR = struct.Struct('=IHHII')
+TCMSG = struct.Struct('=BBHiIII')
+RTATTR = struct.Struct('=HH')
+GNET_BASIC = struct.Struct('=QI')
+GNET_QUEUE = struct.Struct('=IIIII')
+
+# how often monitor_qlen sends samples to a live viewer
+LIVE_NS = 100 * 1000 * 1000
+
+SIZE_UNITS = {'b': 1, 'Kb': 1024, 'Mb': 1024 * 1024, 'Gb': 1024 ** 3}
+
+
+def _handle_str(handle):
+    if handle == 0xFFFFFFFF:
+        return 'root'
+    major, minor = handle >> 16, handle & 0xFFFF
+    return '%x:%x' % (major, minor) if minor else '%x:' % major
+
+
+def _attrs(data, offset, end):
+    """Yields (type, payload) for the rtattrs in data[offset:end]."""
+    while offset + RTATTR.size <= end:
+        length, kind = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            break
+        yield kind & 0x7FFF, data[offset + RTATTR.size:offset + length]
+        offset += (length + 3) & ~3
+
+
+class NetlinkQdiscSampler(object):
+    """Reads qdisc stats for one interface over a long-lived rtnetlink
+    socket, the same data `tc -s qdisc show dev IFACE` prints, without
+    forking anything."""
+
+    def __init__(self, iface):
+        self.iface = iface
+        self.ifindex = socket.if_nametoindex(iface)
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        self.sock.bind((0, 0))
+        self.seq = 0
+        self.buf = bytearray(1 << 16)
+
+    def close(self):
+        self.sock.close()
+
+    def sample(self):
+        """Returns a list of qdisc stat dicts in the order tc prints them."""
+        self.seq += 1
+        request = (NLMSGHDR.pack(NLMSGHDR.size + TCMSG.size, RTM_GETQDISC,
+                                 NLM_F_REQUEST | NLM_F_DUMP, self.seq, 0) +
+                   TCMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0, 0, 0))
+        self.sock.send(request)
+        qdiscs = []
+        while True:
+            n = self.sock.recv_into(self.buf)
+            data = memoryview(self.buf)[:n]
+            offset = 0
+            while offset + NLMSGHDR.size <= n:
+                length, kind, flags, seq, pid = NLMSGHDR.unpack_from(data, offset)
+                if kind == NLMSG_DONE:
+                    return qdiscs
+                if kind == NLMSG_ERROR:
+                    errno = -struct.unpack_from('=i', data, offset + NLMSGHDR.size)[0]
+                    raise OSError(errno, 'RTM_GETQDISC failed')
+                if kind == RTM_NEWQDISC and seq == self.seq:
+                    qdisc = self._parse(data, offset + NLMSGHDR.size, offset + length)
+                    if qdisc is not None:
+                        qdiscs.append(qdisc)
+                offset += (length + 3) & ~3
+
+    def _parse(self, data, offset, end):
+        family, _, _, ifindex, handle, parent, info = TCMSG.unpack_from(data, offset)
+        if ifindex != self.ifindex:
+            return None
+        qdisc = {'kind': '', 'handle': _handle_str(handle),
+                 'parent': _handle_str(parent), 'bytes': 0, 'packets': 0,
+                 'drops': 0, 'overlimits': 0, 'requeues': 0,
+                 'backlog': 0, 'qlen': 0, 'marks': 0, 'xstats': None}
+        for kind, payload in _attrs(data, offset + TCMSG.size, end):
+            if kind == TCA_KIND:
+                qdisc['kind'] = bytes(payload).rstrip(b'\0').decode()
+            elif kind == TCA_STATS2:
+                for skind, spayload in _attrs(payload, 0, len(payload)):
+                    if skind == TCA_STATS_BASIC:
+                        qdisc['bytes'], qdisc['packets'] = GNET_BASIC.unpack_from(spayload)
+                    elif skind == TCA_STATS_QUEUE:
+                        (qdisc['qlen'], qdisc['backlog'], qdisc['drops'],
+                         qdisc['requeues'], qdisc['overlimits']) = GNET_QUEUE.unpack_from(spayload)
+                    elif skind == TCA_STATS_APP:
+                        qdisc['xstats'] = bytes(spayload)
+        if qdisc['xstats'] is not None:
+            qdisc['marks'] = xstats_marks(qdisc['kind'], qdisc['xstats'])
+        return qdisc
+
+
+def xstats_marks(kind, xstats):
+    """ECN marks from an AQM's TCA_STATS_APP blob (the structs in
+    linux/pkt_sched.h), or 0 for qdiscs that do not mark."""
+    words = len(xstats) // 4
+    try:
+        if kind == 'red':
+            # tc_red_xstats: early, pdrop, other, marked
+            return struct.unpack_from('=I', xstats, 12)[0]
+        if kind == 'codel':
+            # tc_codel_xstats: maxpacket, count, lastcount, ldelay,
+            # drop_next, drop_overlimit, ecn_mark, ...
+            return struct.unpack_from('=I', xstats, 24)[0]
+        if kind == 'fq_codel':
+            # tc_fq_codel_xstats: type, then maxpacket, drop_overlimit, ecn_mark, ...
+            if struct.unpack_from('=I', xstats, 0)[0] == 0:
+                return struct.unpack_from('=I', xstats, 12)[0]
+        if kind == 'pie' and words:
+            # tc_pie_xstats ends with ecn_mark (its middle grew over time)
+            return struct.unpack_from('=I', xstats, (words - 1) * 4)[0]
+    except struct.error:
+        pass
+    return 0
+
+
+pat_qdisc = re.compile(r'^qdisc\s+(\S+)\s+(\S+)\s+(root|parent\s+(\S+))')
+pat_sent = re.compile(r'Sent\s+(\d+)\s+bytes\s+(\d+)\s+pkt\s+\(dropped\s+(\d+),\s+'
+                      r'overlimits\s+(\d+)\s+requeues\s+(\d+)\)')
+pat_backlog = re.compile(r'backlog\s+(\d+)([KMG]?b)\s+(\d+)p')
+pat_marks = re.compile(r'\b(?:ecn_mark|marked)\s+(\d+)')
+
+
+def parse_tc_output(text):
+    """Parses `tc -s qdisc show` output into the same dicts
+    NetlinkQdiscSampler.sample() returns."""
+    qdiscs = []
+    for line in text.splitlines():
+        m = pat_qdisc.match(line)
+        if m:
+            qdiscs.append({'kind': m.group(1), 'handle': m.group(2),
+                           'parent': m.group(4) or 'root', 'bytes': 0,
+                           'packets': 0, 'drops': 0, 'overlimits': 0,
+                           'requeues': 0, 'backlog': 0, 'qlen': 0,
+                           'marks': 0, 'xstats': None})
+            continue
+        if not qdiscs:
+            continue
+        qdisc = qdiscs[-1]
+        m = pat_sent.search(line)
+        if m:
+            (qdisc['bytes'], qdisc['packets'], qdisc['drops'],
+             qdisc['overlimits'], qdisc['requeues']) = map(int, m.groups())
+            continue
+        m = pat_backlog.search(line)
+        if m:
+            qdisc['backlog'] = int(m.group(1)) * SIZE_UNITS[m.group(2)]
+            qdisc['qlen'] = int(m.group(3))
+            continue
+        m = pat_marks.search(line)
+        if m:
+            qdisc['marks'] = int(m.group(1))
+    return qdiscs
+
+
+class TcCommandSampler(object):
+    """Fallback that forks `tc` per sample, for when netlink is not
+    available."""
+
+    def __init__(self, iface):
+        self.cmd = ['tc', '-s', 'qdisc', 'show', 'dev', iface]
+
+    def sample(self):
+        return parse_tc_output(check_output(self.cmd).decode())
+
+    def close(self):
+        pass
+
+
+class TcReplaySampler(object):
+    """Replays recorded `tc -s qdisc show` output, so the monitor can be
+    exercised without root.  Snapshots in the file are separated by lines
+    starting with '@' (optionally followed by the time they were taken);
+    sample() returns None once the recording runs out."""
+
+    def __init__(self, fname):
+        self.snapshots = []
+        current = None
+        with open(fname) as f:
+            for line in f:
+                if line.startswith('@'):
+                    current = []
+                    self.snapshots.append(current)
+                elif current is not None:
+                    current.append(line)
+        self.snapshots = [parse_tc_output(''.join(s)) for s in self.snapshots]
+        self.index = 0
+
+    def sample(self):
+        if self.index >= len(self.snapshots):
+            return None
+        self.index += 1
+        return self.snapshots[self.index - 1]
+
+    def close(self):
+        pass
+
+
+def open_sampler(iface):
+    """Netlink if we can, otherwise fork tc."""
+    try:
+        return NetlinkQdiscSampler(iface)
+    except (OSError, AttributeError):
+        return TcCommandSampler(iface)
+
+
+def wallclock_anchor():
+    """(time_ns, monotonic_ns) taken together, to turn monotonic sample
+    times into epoch seconds that line up with `ping -D` timestamps."""
+    return time_ns(), monotonic_ns()
+
+
+def to_epoch(mono_ns, anchor):
+    return (anchor[0] + (mono_ns - anchor[1])) / 1e9
+
+
+def _stop(signum, frame):
+    raise SystemExit(0)
+
+
+def select_qdisc(qdiscs, qdisc_index=1, qdisc=None):
+    """The qdisc to report: the first whose handle or kind is qdisc, if
+    given, else the qdisc_index-th."""
+    if qdisc is not None:
+        for q in qdiscs:
+            if q['handle'] == qdisc or q['kind'] == qdisc:
+                return q
+        return None
+    return qdiscs[qdisc_index] if len(qdiscs) > qdisc_index else None
+
+
+QSTATS_FIELDS = ('qlen', 'backlog', 'packets', 'drops', 'overlimits', 'marks')
+
+
+def monitor_qlen(iface, interval_sec = 0.01, fname='%s/qlen.txt' % default_dir,
+                 qdisc_index=1, flush_sec=1.0, sampler=None, qdisc=None,
+                 stats_fname=None, live=None, ring=None):
+    """Samples the backlog (packets) of the qdisc_index-th qdisc on iface
+    (or the one whose handle or kind is qdisc) every interval_sec and writes
+    "time,qlen" lines to fname (or a binary series, see tsformat.py, if
+    fname ends in .ts).  Samples are timestamped with monotonic_ns and
+    buffered in memory; the file is written in bulk every flush_sec and
+    when the process is terminated.
+
+    If stats_fname is given, every qdisc on iface is also recorded there
+    each sample as "time,handle,kind,qlen,backlog,packets,drops,overlimits,marks"
+    (counters are cumulative, as the kernel keeps them).
+
+    If live is a socket path, samples are also sent to a live viewer
+    there every LIVE_NS (see live.py); with no viewer they are dropped.
+    If ring names a shmring.Ring, every sample is also appended to it as
+    it is taken, for the parent to read without going through fname."""
+    sampler = sampler or open_sampler(iface)
+    try:
+        signal.signal(signal.SIGTERM, _stop)
+    except ValueError:
+        # Not the main thread; the caller owns signal handling
+        pass
+    anchor = wallclock_anchor()
+    interval_ns = int(interval_sec * 1e9)
+    flush_ns = int(flush_sec * 1e9)
+    samples = []
+    qstats = []
+    stats_out = open(stats_fname, 'w') if stats_fname else None
+    if fname.endswith('.ts'):
+        # Binary columnar series (see tsformat.py)
+        import tsformat
+        out = tsformat.SeriesWriter(fname, tsformat.QUEUE_COLUMNS, 'queue')
+
+        def flush():
+            out.extend([to_epoch(t, anchor) for t, q in samples],
+                       [q for t, q in samples])
+            del samples[:]
+    else:
+        out = open(fname, 'w')
+
+        def flush():
+            out.write(''.join('%f,%d\n' % (to_epoch(t, anchor), q) for t, q in samples))
+            out.flush()
+            del samples[:]
+
+    if ring is not None:
+        import shmring
+        ring = shmring.Ring(ring)
+
+    publisher = None
+    published = [0]
+
+    def publish():
+        if publisher is not None:
+            publisher.send_many('q', [(to_epoch(t, anchor), q)
+                                      for t, q in samples[published[0]:]])
+            published[0] = len(samples)
+
+    if live:
+        import live as live_view
+        publisher = live_view.Publisher(live)
+        file_flush = flush
+
+        def flush():
+            publish()
+            file_flush()
+            published[0] = 0
+
+    def flush_all():
+        flush()
+        if stats_out is not None:
+            stats_out.write(''.join(
+                '%f,%s,%s,%s\n' % (to_epoch(t, anchor), q['handle'], q['kind'],
+                                   ','.join(str(q[f]) for f in QSTATS_FIELDS))
+                for t, qdiscs in qstats for q in qdiscs))
+            stats_out.flush()
+            del qstats[:]
+
+    try:
+        next_sample = last_flush = last_publish = monotonic_ns()
+        while 1:
+            now = monotonic_ns()
+            qdiscs = sampler.sample()
+            if qdiscs is None:
+                break
+            selected = select_qdisc(qdiscs, qdisc_index, qdisc)
+            if selected is not None:
+                samples.append((now, selected['qlen']))
+                if ring is not None:
+                    ring.append(to_epoch(now, anchor), selected['qlen'])
+            if stats_out is not None:
+                qstats.append((now, qdiscs))
+            if now - last_flush >= flush_ns:
+                flush_all()
+                last_flush = now
+            elif now - last_publish >= LIVE_NS:
+                publish()
+                last_publish = now
+            # Schedule against absolute deadlines so sampling cost does
+            # not stretch the interval
+            next_sample += interval_ns
+            delay = next_sample - monotonic_ns()
+            if delay > 0:
+                sleep(delay / 1e9)
+            else:
+                next_sample = monotonic_ns()
+    finally:
+        flush_all()
+        out.close()
+        if stats_out is not None:
+            stats_out.close()
+        if publisher is not None:
+            publisher.close()
+        if ring is not None:
+            ring.close()
+        sampler.close()
     return
 
 def monitor_devs_ng(fname="%s/txrate.txt" % default_dir, interval_sec=0.01):
@@ -0,0 +1,382 @@
+'''
+Per-flow analysis of packet captures from the bottleneck switch.
+
+bufferbloat.py --pcap-snaplen 96 runs `tcpdump -s 96 -w` on s0-eth1 (from
+h1) and s0-eth2 (towards h2, after the bottleneck queue) into
+DIR/s0-eth1.pcap and DIR/s0-eth2.pcap.  Headers are all that is kept, so
+an hour at 1.5 Mb/s is a few hundred MB rather than gigabytes.  Then
+
+    python3 pcapflow.py run DIR                  # both captures of a run
+    python3 pcapflow.py flows s0-eth1.pcap       # per-flow table
+    python3 pcapflow.py delay s0-eth1.pcap s0-eth2.pcap -o owd.ts
+
+For each TCP flow (one direction of a connection) and capture: packets,
+bytes, goodput (new sequence space per second of the flow's life) and
+retransmits (data packets that add nothing past the highest sequence
+number seen).  Retransmits are counted on s0-eth1, before the
+bottleneck, which sees every copy the sender sent.
+
+A packet seen on both interfaces (same addresses, ports, IP ID, seq and
+ack) gives its one-way delay through the switch: the bottleneck's
+queueing plus the link's netem delay.  Both captures use the same clock.
+Per-packet delays go to a series (see tsformat.py) and each flow gets
+percentiles.  Packets seen going in but never coming out within
+MAX_DELAY were dropped at the bottleneck.
+
+The reader is pure Python: the capture is mmapped and headers decoded
+with struct.unpack_from in place, one packet at a time.  Memory is
+bounded by the number of flows and by the packets in flight inside
+MAX_DELAY, not by the size of the capture: pages already read are
+released as the reader goes.  Both classic pcap
+timestamp resolutions (tcpdump writes microseconds, --nano nanoseconds),
+either byte order, and Ethernet or Linux cooked captures are understood.
+'''
+
+import argparse
+import heapq
+import json
+import mmap
+import os
+import struct
+from array import array
+from collections import OrderedDict
+
+import stats
+
+# a packet not out of the switch this long after it went in was dropped
+MAX_DELAY = 5.0
+# delays are summarised in batches of this many
+BATCH = 4096
+# pages of the capture already read are dropped every this many bytes
+RELEASE_BYTES = 16 << 20
+
+MAGIC = {0xa1b2c3d4: 1e-6, 0xa1b23c4d: 1e-9}
+LINKTYPE_ETHERNET = 1
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+ETH_P_IP = 0x0800
+ETH_P_8021Q = 0x8100
+IPPROTO_TCP = 6
+TCP_SYN = 0x02
+
+ETHERTYPE = struct.Struct('!H')
+IPV4 = struct.Struct('!BxHH2xxB2x4s4s')
+TCP = struct.Struct('!HHIIB')
+SEQ = 1 << 32
+HALF = 1 << 31
+
+OWD_COLUMNS = [('t', '<f8'), ('flow', '<i4'), ('delay', '<f8')]
+
+
+class PcapError(Exception):
+    pass
+
+
+class PcapReader(object):
+    '''Packets of a classic pcap file, mmapped.  Iterating yields
+    (time, offset, caplen): the frame is self.buf[offset:offset + caplen].'''
+
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path, 'rb')
+        try:
+            self.buf = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file: tcpdump never got to write its header
+            self.buf = b''
+        if len(self.buf) < 24:
+            self.close()
+            raise PcapError('%s: not a pcap file' % path)
+        for order in '<>':
+            magic, = struct.unpack_from(order + 'I', self.buf, 0)
+            if magic in MAGIC:
+                break
+        else:
+            self.close()
+            raise PcapError('%s: not a pcap file (pcapng is not supported)' % path)
+        self.order = order
+        self.scale = MAGIC[magic]
+        self.linktype = struct.unpack_from(order + 'I', self.buf, 20)[0] & 0xFFFF
+        self.record = struct.Struct(order + 'IIII')
+        if hasattr(self.buf, 'madvise'):
+            self.buf.madvise(mmap.MADV_SEQUENTIAL)
+
+    def __iter__(self):
+        buf, record, scale = self.buf, self.record, self.scale
+        offset, end = 24, len(self.buf)
+        released = 0
+        release = hasattr(buf, 'madvise')
+        while offset + 16 <= end:
+            if release and offset - released >= RELEASE_BYTES:
+                # clean file pages, but they would still count against
+                # the process's RSS until the kernel needs them
+                upto = offset - offset % mmap.PAGESIZE
+                buf.madvise(mmap.MADV_DONTNEED, released, upto - released)
+                released = upto
+            sec, frac, caplen, _ = record.unpack_from(buf, offset)
+            offset += 16
+            if offset + caplen > end:
+                # the last record of a capture cut short
+                break
+            yield sec + frac * scale, offset, caplen
+            offset += caplen
+
+    def close(self):
+        if isinstance(self.buf, mmap.mmap):
+            self.buf.close()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def network_offset(buf, offset, caplen, linktype):
+    '''Offset of the IPv4 header in a frame, or None if it is not IPv4.'''
+    if linktype == LINKTYPE_ETHERNET:
+        proto_at, start = offset + 12, offset + 14
+        if caplen >= 18 and ETHERTYPE.unpack_from(buf, proto_at)[0] == ETH_P_8021Q:
+            proto_at, start = proto_at + 4, start + 4
+    elif linktype == LINKTYPE_LINUX_SLL:
+        proto_at, start = offset + 14, offset + 16
+    elif linktype == LINKTYPE_LINUX_SLL2:
+        proto_at, start = offset, offset + 20
+    else:
+        return None
+    if start > offset + caplen or ETHERTYPE.unpack_from(buf, proto_at)[0] != ETH_P_IP:
+        return None
+    return start
+
+
+def parse_tcp(buf, offset, caplen, linktype):
+    '''(flow, match key, seq, flags, payload length) of a TCP/IPv4 frame,
+    else None.  flow is (src, dst, sport, dport) with addresses as
+    bytes; the match key identifies this transmission of the packet.'''
+    ip = network_offset(buf, offset, caplen, linktype)
+    if ip is None or ip + 20 > offset + caplen:
+        return None
+    vihl, total, ipid, proto, src, dst = IPV4.unpack_from(buf, ip)
+    ihl = (vihl & 0x0F) * 4
+    tcp = ip + ihl
+    if proto != IPPROTO_TCP or vihl >> 4 != 4 or tcp + 14 > offset + caplen:
+        return None
+    sport, dport, seq, ack, doff = TCP.unpack_from(buf, tcp)
+    flags = buf[tcp + 13]
+    # from the IP header: the payload itself is past the snaplen
+    payload = total - ihl - (doff >> 4) * 4
+    key = buf[ip + 4:ip + 6] + buf[tcp:tcp + 12]
+    return (src, dst, sport, dport), key, seq, flags, payload
+
+
+class FlowStats(object):
+    '''What one capture saw of one flow.'''
+
+    __slots__ = ('packets', 'data_packets', 'bytes', 'new_bytes', 'retransmits',
+                 'first', 'last', 'high')
+
+    def __init__(self, t):
+        self.packets = self.data_packets = self.bytes = 0
+        self.new_bytes = self.retransmits = 0
+        self.first = self.last = t
+        self.high = None
+
+    def add(self, t, seq, flags, payload):
+        self.packets += 1
+        self.last = t
+        if flags & TCP_SYN:
+            self.high = (seq + 1) % SEQ
+        if payload <= 0:
+            return
+        self.data_packets += 1
+        self.bytes += payload
+        end = (seq + payload) % SEQ
+        if self.high is None:
+            # picked up mid-connection
+            self.high = seq
+        # sequence numbers wrap; compare within half the space
+        ahead = (end - self.high + HALF) % SEQ - HALF
+        if ahead > 0:
+            self.new_bytes += ahead
+            self.high = end
+        else:
+            self.retransmits += 1
+
+    def summary(self):
+        span = self.last - self.first
+        return {'packets': self.packets, 'data_packets': self.data_packets,
+                'bytes': self.bytes, 'new_bytes': self.new_bytes,
+                'retransmits': self.retransmits,
+                'first': self.first, 'last': self.last,
+                'goodput_mbps': self.new_bytes * 8 / span / 1e6 if span > 0 else float('nan')}
+
+
+def flow_name(flow):
+    src, dst, sport, dport = flow
+    return '%s:%d>%s:%d' % ('.'.join(map(str, src)), sport, '.'.join(map(str, dst)), dport)
+
+
+def summarise(d):
+    '''Moves a flow's batch of delays into its histogram and stats.'''
+    hist, running, batch = d
+    if batch:
+        hist.update_batch(batch)
+        running.update_batch(batch)
+        del batch[:]
+
+
+def packets(readers):
+    '''(time, reader index, parsed TCP header) over all readers, merged in
+    time order.'''
+    def one(i, reader):
+        buf, linktype = reader.buf, reader.linktype
+        for t, offset, caplen in reader:
+            tcp = parse_tcp(buf, offset, caplen, linktype)
+            if tcp is not None:
+                yield t, i, tcp
+    return heapq.merge(*[one(i, r) for i, r in enumerate(readers)], key=lambda p: p[0])
+
+
+def analyse(paths, owd_out=None, max_delay=MAX_DELAY):
+    '''Per-flow stats of every capture in paths and, for two captures,
+    one-way delays from the first to the second (or the second to the
+    first, for flows going the other way).  Per-packet delays are
+    appended to the series owd_out if given.  Returns
+    {'captures': [...], 'flows': {name: {...}}}.'''
+    readers = [PcapReader(p) for p in paths]
+    flows = {}
+    ids = {}
+    pending = OrderedDict()
+    delays = {}
+    unmatched = {}
+    out = None
+    if owd_out is not None and len(readers) == 2:
+        import tsformat
+        out = tsformat.SeriesWriter(owd_out, OWD_COLUMNS, 'owd')
+    try:
+        for t, i, (flow, key, seq, flags, payload) in packets(readers):
+            per = flows.get(flow)
+            if per is None:
+                per = flows[flow] = [None] * len(readers)
+                ids[flow] = len(ids)
+            if per[i] is None:
+                per[i] = FlowStats(t)
+            per[i].add(t, seq, flags, payload)
+            if len(readers) != 2:
+                continue
+
+            # packets still inside the switch after max_delay were dropped
+            while pending:
+                oldest = next(iter(pending.values()))
+                if t - oldest[0] <= max_delay:
+                    break
+                _, _, lost_flow = pending.popitem(last=False)[1]
+                unmatched[lost_flow] = unmatched.get(lost_flow, 0) + 1
+            seen = pending.pop(key, None)
+            if seen is None:
+                pending[key] = (t, i, flow)
+            elif seen[1] != i:
+                delay = t - seen[0]
+                d = delays.get(flow)
+                if d is None:
+                    d = delays[flow] = (stats.RunningHistogram(1e-4), stats.RunningStats(),
+                                        array('d'))
+                d[2].append(delay)
+                if len(d[2]) >= BATCH:
+                    summarise(d)
+                if out is not None:
+                    out.append(seen[0], ids[flow], delay)
+            else:
+                # the same transmission twice on one interface; keep the later
+                pending[key] = (t, i, flow)
+        for _, _, flow in pending.values():
+            unmatched[flow] = unmatched.get(flow, 0) + 1
+    finally:
+        if out is not None:
+            out.close()
+        for r in readers:
+            r.close()
+
+    result = {'captures': list(paths), 'flows': {}}
+    for flow, per in flows.items():
+        entry = {'id': ids[flow],
+                 'captures': [p.summary() if p is not None else None for p in per]}
+        if flow in delays:
+            summarise(delays[flow])
+            hist, running, _ = delays[flow]
+            p50, p99 = hist.quantiles((0.5, 0.99))
+            entry['delay'] = {'n': running.n, 'mean_ms': running.mean * 1e3,
+                              'p50_ms': p50 * 1e3, 'p99_ms': p99 * 1e3,
+                              'max_ms': running.max * 1e3}
+        if len(readers) == 2:
+            entry['unmatched'] = unmatched.get(flow, 0)
+        result['flows'][flow_name(flow)] = entry
+    return result
+
+
+def format_result(result):
+    names = [os.path.basename(p) for p in result['captures']]
+    lines = ['%-44s %-12s %8s %9s %9s %8s %16s' % (
+        'flow', 'capture', 'packets', 'MB', 'Mb/s', 'retrans', 'delay p50/p99 ms')]
+    order = sorted(result['flows'].items(),
+                   key=lambda kv: -max(c['bytes'] for c in kv[1]['captures'] if c))
+    for name, entry in order:
+        for i, c in enumerate(entry['captures']):
+            if c is None:
+                continue
+            delay = ''
+            if i == 0 and 'delay' in entry:
+                delay = '%.1f/%.1f' % (entry['delay']['p50_ms'], entry['delay']['p99_ms'])
+            lines.append('%-44s %-12s %8d %9.2f %9.3f %8d %16s' % (
+                name if i == 0 or entry['captures'][0] is None else '', names[i],
+                c['packets'], c['bytes'] / 1e6, c['goodput_mbps'], c['retransmits'], delay))
+        if entry.get('unmatched'):
+            lines.append('%-44s %d packets in but not out (dropped)' % ('', entry['unmatched']))
+    return '\n'.join(lines)
+
+
+def write_json(result, path):
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=1, sort_keys=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-flow analysis of bottleneck captures")
+    sub = parser.add_subparsers(dest='command')
+    sub.required = True
+
+    p = sub.add_parser('flows', help="Per-flow packets, goodput and retransmits")
+    p.add_argument('pcaps', nargs='+')
+
+    p = sub.add_parser('delay', help="Also one-way delay from the first capture to the second")
+    p.add_argument('ingress')
+    p.add_argument('egress')
+    p.add_argument('--out', '-o', help="Series to append per-packet delays to")
+    p.add_argument('--max-delay', type=float, default=MAX_DELAY)
+
+    p = sub.add_parser('run', help="s0-eth1.pcap and s0-eth2.pcap of run directories")
+    p.add_argument('dirs', nargs='+')
+    p.add_argument('--max-delay', type=float, default=MAX_DELAY)
+
+    args = parser.parse_args()
+    if args.command == 'flows':
+        for path in args.pcaps:
+            print(format_result(analyse([path])))
+    elif args.command == 'delay':
+        print(format_result(analyse([args.ingress, args.egress], args.out, args.max_delay)))
+    else:
+        import shutil
+        for d in args.dirs:
+            owd = os.path.join(d, 'owd.ts')
+            # series are append-only; start this one afresh
+            shutil.rmtree(owd, ignore_errors=True)
+            result = analyse([os.path.join(d, 's0-eth1.pcap'), os.path.join(d, 's0-eth2.pcap')],
+                             owd, args.max_delay)
+            write_json(result, os.path.join(d, 'pcapflows.json'))
+            print('%s:' % d)
+            print(format_result(result))
+
+
+if __name__ == '__main__':
+    main()
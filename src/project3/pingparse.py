@@ -0,0 +1,192 @@
+'''
+Streaming parser for ping output.
+
+Reads `ping -D` output (the [epoch] prefix on each line) incrementally and
+yields one record per ICMP sequence number, including the ones that never
+got a reply, so RTTs can be plotted on their real time axis and loss can
+be measured.  Memory use is constant: records come out as a generator or
+as fixed-size NumPy chunks.
+
+    for t, seq, ttl, rtt in iter_ping(open('ping.txt')): ...
+    for chunk in iter_ping_chunks('ping.txt'): chunk['rtt'] ...
+
+Lost probes have rtt = NaN and ttl = -1.  Replies that come back out of
+order are put in their probe's place rather than taken for duplicates.
+Malformed lines are counted in PingStats.malformed and skipped rather
+than ending the parse.
+'''
+
+import math
+import re
+from array import array
+from collections import deque
+
+import numpy as np
+
+NAN = float('nan')
+SEQ_MOD = 1 << 16
+# Probes a reply may come back behind and still count (see iter_ping)
+REORDER_WINDOW = 8
+
+pat_reply = re.compile(r'^(?:\[(\d+(?:\.\d+)?)\]\s+)?\d+ bytes from [^:]+: '
+                       r'icmp_seq=(\d+)(?: ttl=(\d+))?(?: time=([\d.]+) ms)?')
+pat_seq = re.compile(r'icmp_seq=(\d+)')
+
+
+class PingStats(object):
+    '''Counters filled in while parsing.'''
+
+    def __init__(self):
+        self.received = 0
+        self.lost = 0
+        self.duplicates = 0
+        self.late = 0
+        self.malformed = 0
+
+    @property
+    def sent(self):
+        return self.received + self.lost
+
+    @property
+    def loss_rate(self):
+        return self.lost / self.sent if self.sent else 0.0
+
+
+def iter_ping(lines, freq=10, stats=None, window=REORDER_WINDOW):
+    '''Yields (t, seq, ttl, rtt) per probe, in seq order.  t is the epoch
+    time of the reply from `ping -D`; without -D it is seq / freq.  seq is
+    unwrapped past 65535.  Gaps in the sequence are lost probes, with t
+    interpolated between the neighbouring replies.
+
+    Records are held back until a reply more than `window` probes further
+    on has arrived, so a reply that comes back out of order fills its
+    probe's slot (keeping the interpolated t, so t stays increasing).  A
+    reply later than that is counted in PingStats.late and its probe stays
+    lost.'''
+    stats = stats if stats is not None else PingStats()
+    # [t, seq, ttl, rtt] from the oldest unreported probe up to `highest`
+    pending = deque()
+    highest = highest_t = None
+    wraps = 0
+
+    def report(record):
+        if math.isnan(record[3]):
+            stats.lost += 1
+        return tuple(record)
+
+    for line in lines:
+        if 'icmp_seq=' not in line:
+            continue
+        m = pat_reply.match(line)
+        if m is None:
+            # "no answer yet", "Destination Host Unreachable", ...: the
+            # probe is accounted for by the sequence gap, if it stays lost
+            if pat_seq.search(line) is None:
+                stats.malformed += 1
+            continue
+        stamp, raw_seq, ttl, rtt = m.groups()
+        if rtt is None:
+            stats.malformed += 1
+            continue
+        seq = int(raw_seq) + wraps * SEQ_MOD
+        if highest is not None:
+            if seq < highest - SEQ_MOD // 2:
+                wraps += 1
+                seq += SEQ_MOD
+            elif seq > highest + SEQ_MOD // 2 and wraps:
+                # a late reply from before the last wrap
+                seq -= SEQ_MOD
+        t = float(stamp) if stamp is not None else seq / float(freq)
+        ttl = int(ttl) if ttl is not None else -1
+
+        if highest is None or seq > highest:
+            if highest is not None:
+                gap = seq - highest
+                for k in range(1, gap):
+                    pending.append([highest_t + (t - highest_t) * k / gap,
+                                    highest + k, -1, NAN])
+            pending.append([t, seq, ttl, float(rtt)])
+            stats.received += 1
+            highest, highest_t = seq, t
+            while pending[0][1] < highest - window:
+                yield report(pending.popleft())
+            continue
+
+        first = pending[0][1] if pending else highest + 1
+        if seq < first:
+            # already reported
+            if 'DUP!' in line:
+                stats.duplicates += 1
+            else:
+                stats.late += 1
+            continue
+        slot = pending[seq - first]
+        if not math.isnan(slot[3]):
+            stats.duplicates += 1
+            continue
+        slot[2], slot[3] = ttl, float(rtt)
+        stats.received += 1
+
+    while pending:
+        yield report(pending.popleft())
+
+
+def iter_ping_chunks(fname, chunk_size=1 << 16, freq=10, stats=None):
+    '''Like iter_ping but yields dicts of NumPy arrays ('t' float64, 'seq'
+    int64, 'ttl' int32, 'rtt' float32) of up to chunk_size probes.'''
+    cols = (array('d'), array('q'), array('i'), array('f'))
+
+    def emit():
+        chunk = {'t': np.frombuffer(cols[0], dtype=np.float64).copy(),
+                 'seq': np.frombuffer(cols[1], dtype=np.int64).copy(),
+                 'ttl': np.frombuffer(cols[2], dtype=np.int32).copy(),
+                 'rtt': np.frombuffer(cols[3], dtype=np.float32).copy()}
+        for col in cols:
+            del col[:]
+        return chunk
+
+    t_col, seq_col, ttl_col, rtt_col = cols
+    with open(fname) as f:
+        for t, seq, ttl, rtt in iter_ping(f, freq, stats):
+            t_col.append(t)
+            seq_col.append(seq)
+            ttl_col.append(ttl)
+            rtt_col.append(rtt)
+            if len(t_col) >= chunk_size:
+                yield emit()
+    if t_col:
+        yield emit()
+
+
+def read_ping(fname, freq=10, stats=None):
+    '''Whole file as one dict of arrays (concatenated chunks).'''
+    chunks = list(iter_ping_chunks(fname, freq=freq, stats=stats))
+    if not chunks:
+        return {'t': np.empty(0), 'seq': np.empty(0, np.int64),
+                'ttl': np.empty(0, np.int32), 'rtt': np.empty(0, np.float32)}
+    return dict((k, np.concatenate([c[k] for c in chunks])) for k in chunks[0])
+
+
+def main():
+    import argparse
+    from stats import RunningStats
+    parser = argparse.ArgumentParser(description="Summarise a ping log in constant memory")
+    parser.add_argument('file')
+    parser.add_argument('--freq', type=int, default=10)
+    args = parser.parse_args()
+
+    stats = PingStats()
+    rtts = RunningStats()
+    for chunk in iter_ping_chunks(args.file, freq=args.freq, stats=stats):
+        rtt = chunk['rtt']
+        rtts.update_batch(rtt[~np.isnan(rtt)])
+    print("sent %d received %d lost %d (%.2f%%) dup %d late %d malformed %d" % (
+        stats.sent, stats.received, stats.lost, 100 * stats.loss_rate,
+        stats.duplicates, stats.late, stats.malformed))
+    if rtts.n:
+        print("rtt min/avg/max/stdev = %.3f/%.3f/%.3f/%.3f ms" % (
+            rtts.min, rtts.mean, rtts.max, rtts.stdev))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+'''
+Plots for bufferbloat runs, one command for all of them:
+
+    python3 plot.py queue -f reno-q100/q.txt -o q.png
+    python3 plot.py ping -f reno-q100/ping.txt -o rtt.png
+    python3 plot.py run reno-q20 reno-q100     # q.png and rtt.png in each
+
+Arguments are parsed before anything heavy is imported; matplotlib and
+NumPy load only once there is something to draw, and `run` draws all its
+figures in one process on one reused figure.  plot_queue.py and
+plot_ping.py are the old names for `queue` and `ping`.
+'''
+
+import argparse
+import os
+
+
+def get_style(i):
+    if i == 0:
+        return {'color': 'red'}
+    else:
+        return {'color': 'black', 'ls': '-.'}
+
+
+def figure():
+    from helper import plt
+    import plot_defaults
+    plot_defaults.apply()
+    return plt.figure(figsize=(16, 6))
+
+
+def pixel_width(fig, width):
+    '''Columns to decimate to: the figure's width unless given.'''
+    return int(fig.get_figwidth() * fig.dpi) if width is None else width
+
+
+def save(fig, out):
+    if out:
+        print('saving to', out)
+        fig.savefig(out)
+    else:
+        from helper import plt
+        plt.show()
+
+
+def plot_queue(fig, files, out=None, legend=None, width=None, every=1):
+    '''Queue occupancy over time, one line per q.txt (or queue series).'''
+    import decimate
+    from matplotlib.ticker import MaxNLocator
+
+    legend = legend or files
+    width = pixel_width(fig, width)
+    fig.clf()
+    ax = fig.add_subplot(111)
+    for i, f in enumerate(files):
+        # Text "time,qlen" files and binary .ts series both work
+        times, qlens = decimate.queue(f, width)
+        xaxis = times - times[0]
+        if not width:
+            xaxis = xaxis[::every]
+            qlens = qlens[::every]
+        ax.plot(xaxis, qlens, label=legend[i], lw=2, **get_style(i))
+        ax.xaxis.set_major_locator(MaxNLocator(4))
+
+    ax.set_ylabel("Packets")
+    ax.grid(True)
+    ax.set_xlabel("Seconds")
+    save(fig, out)
+
+
+def plot_ping(fig, files, out=None, freq=10, width=None):
+    '''Ping RTTs over time, one line per ping output (or ping series).'''
+    import decimate
+    from matplotlib.ticker import MaxNLocator
+
+    width = pixel_width(fig, width)
+    fig.clf()
+    ax = fig.add_subplot(111)
+    for f in files:
+        # ping text output and binary .ts series both work
+        times, rtts = decimate.ping(f, width, freq)
+        xaxis = times - times[0]
+
+        ax.plot(xaxis, rtts, lw=2)
+        ax.xaxis.set_major_locator(MaxNLocator(4))
+
+    ax.set_ylabel("RTT (ms)")
+    ax.grid(True)
+    save(fig, out)
+
+
+def plot_runs(fig, dirs, freq=10, width=None):
+    '''DIR/q.png and DIR/rtt.png for every run directory.'''
+    from aggregate import find_input
+    for d in dirs:
+        q = find_input(d, 'q')
+        if q is not None:
+            plot_queue(fig, [q], os.path.join(d, 'q.png'), width=width)
+        ping = find_input(d, 'ping')
+        if ping is not None:
+            plot_ping(fig, [ping], os.path.join(d, 'rtt.png'), freq, width)
+        if q is None and ping is None:
+            print('%s: no q or ping output, skipped' % d)
+
+
+def width_arg(parser):
+    parser.add_argument('--width',
+                        help="Downsample to this many pixel columns, keeping each column's "
+                             "min and max (default: the figure's width; 0 plots every sample)",
+                        default=None,
+                        type=int)
+
+
+def freq_arg(parser):
+    parser.add_argument('--freq',
+                        help="Frequency of pings (per second)",
+                        type=int,
+                        default=10)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Plot bufferbloat queue and RTT traces")
+    sub = parser.add_subparsers(dest='command')
+    sub.required = True
+
+    p = sub.add_parser('queue', help="Plot queue occupancy over time")
+    p.add_argument('--files', '-f',
+                   help="Queue timeseries output to one plot",
+                   required=True,
+                   action="store",
+                   nargs='+',
+                   dest="files")
+    p.add_argument('--legend', '-l',
+                   help="Legend to use if there are multiple plots.  File names used as default.",
+                   action="store",
+                   nargs="+",
+                   default=None,
+                   dest="legend")
+    p.add_argument('--out', '-o',
+                   help="Output png file for the plot.",
+                   default=None, # Will show the plot
+                   dest="out")
+    p.add_argument('--labels',
+                   help="Labels for x-axis if summarising; defaults to file names",
+                   required=False,
+                   default=[],
+                   nargs="+",
+                   dest="labels")
+    width_arg(p)
+    p.add_argument('--every',
+                   help="With --width 0, plot one of every EVERY (x,y) point (default 1).",
+                   default=1,
+                   type=int)
+
+    p = sub.add_parser('ping', help="Plot ping RTTs over time")
+    p.add_argument('--files', '-f',
+                   help="Ping output files to plot",
+                   required=True,
+                   action="store",
+                   nargs='+')
+    freq_arg(p)
+    p.add_argument('--out', '-o',
+                   help="Output png file for the plot.",
+                   default=None) # Will show the plot
+    width_arg(p)
+
+    p = sub.add_parser('run', help="Write q.png and rtt.png into each run directory")
+    p.add_argument('dirs', nargs='+', help="Run directories")
+    freq_arg(p)
+    width_arg(p)
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    fig = figure()
+    if args.command == 'queue':
+        plot_queue(fig, args.files, args.out, args.legend, args.width, args.every)
+    elif args.command == 'ping':
+        plot_ping(fig, args.files, args.out, args.freq, args.width)
+    else:
+        plot_runs(fig, args.dirs, args.freq, args.width)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,8 @@
 '''
-Matplotlib parameters to create pretty plots
+Matplotlib parameters to create pretty plots.  Nothing changes until
+apply() (or quarter_size()) is called, so importing this is free.
 '''
 
-from matplotlib import rc, rcParams
-
 
 DEF_AXIS_LEFT = 0.15
 DEF_AXIS_RIGHT = 0.95
@@ -29,27 +28,32 @@ COLOR_HLINES = 'black'
 HLINE_LABELSIZE = 24
 HLINE_LINEWIDTH = 2
 
-rc('axes', **{'labelsize' : 'large',
-              'titlesize' : 'large',
-              'grid' : True})
-rc('legend', **{'fontsize': 'xx-large'})
-rcParams['axes.labelsize'] = AXES_LABELSIZE
-rcParams['xtick.labelsize'] = TICK_LABELSIZE
-rcParams['ytick.labelsize'] = TICK_LABELSIZE
-rcParams['xtick.major.pad'] = 4
-rcParams['ytick.major.pad'] = 6
-rcParams['figure.subplot.top'] = DEF_AXIS_TOP
-rcParams['figure.subplot.bottom'] = DEF_AXIS_BOTTOM
-rcParams['figure.subplot.left'] = DEF_AXIS_LEFT
-rcParams['figure.subplot.right'] = DEF_AXIS_RIGHT
-rcParams['lines.linewidth'] = 2
-rcParams['grid.color'] = COLOR_LIGHTGRAY
-rcParams['grid.linewidth'] = 0.6
-rcParams['ps.useafm'] = True
-rcParams['pdf.use14corefonts'] = True
-#rcParams['text.usetex'] = True
+def apply():
+    from matplotlib import rc, rcParams
+
+    rc('axes', **{'labelsize' : 'large',
+                  'titlesize' : 'large',
+                  'grid' : True})
+    rc('legend', **{'fontsize': 'xx-large'})
+    rcParams['axes.labelsize'] = AXES_LABELSIZE
+    rcParams['xtick.labelsize'] = TICK_LABELSIZE
+    rcParams['ytick.labelsize'] = TICK_LABELSIZE
+    rcParams['xtick.major.pad'] = 4
+    rcParams['ytick.major.pad'] = 6
+    rcParams['figure.subplot.top'] = DEF_AXIS_TOP
+    rcParams['figure.subplot.bottom'] = DEF_AXIS_BOTTOM
+    rcParams['figure.subplot.left'] = DEF_AXIS_LEFT
+    rcParams['figure.subplot.right'] = DEF_AXIS_RIGHT
+    rcParams['lines.linewidth'] = 2
+    rcParams['grid.color'] = COLOR_LIGHTGRAY
+    rcParams['grid.linewidth'] = 0.6
+    rcParams['ps.useafm'] = True
+    rcParams['pdf.use14corefonts'] = True
+    #rcParams['text.usetex'] = True
 
 def quarter_size():
+    from matplotlib import rc, rcParams
+
     QUARTER_AXIS_LEFT = 0.25
     QUARTER_AXIS_RIGHT = 0.92
     QUARTER_AXIS_BOTTOM = 0.20
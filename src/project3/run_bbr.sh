@@ -12,15 +12,21 @@ cong="bbr" # TODO: check if this is correct
 
 iperf_port=5001
 
+dirs=""
 for qsize in 20 100; do
-    dir=bb-q$qsize
+    dir=$cong-q$qsize
+    dirs="$dirs $dir"
 
     # TODO: Run bufferbloat.py here...
     python3 bufferbloat.py --dir=$dir --time=$time --bw-net=$bwnet --delay=$delay --maxq=$qsize --cong=$cong
-
-    # TODO: Ensure the input file names match the ones you use in
-    # bufferbloat.py script.  Also ensure the plot file names match
-    # the required naming convention when submitting your tarball.
-    python3 plot_queue.py -f $dir/q.txt -o $dir/q.png
-    python3 plot_ping.py -f $dir/ping.txt -o $dir/rtt.png
 done
+
+# TODO: Ensure the input file names match the ones you use in
+# bufferbloat.py script.  Also ensure the plot file names match
+# the required naming convention when submitting your tarball.
+# One invocation draws $dir/q.png and $dir/rtt.png for every run.
+python3 plot.py run $dirs
+
+# Summaries for the README and reno/bbr, q20/q100 comparison figures,
+# using the reno runs left behind by run.sh.
+python3 aggregate.py reno-q* bbr-q* -o report
@@ -0,0 +1,406 @@
+'''
+Process supervision for an experiment run.
+
+Everything bufferbloat.py starts (iperf, ping, the web server, probes,
+monitors) is registered with a Runtime, which
+
+  - sends each command's output to DIR/logs/<name>.log instead of a pipe
+    nobody reads,
+  - watches for processes that die early and for per-process deadlines,
+  - samples CPU and RSS of every process from /proc into DIR/usage.txt,
+  - on teardown SIGTERMs whatever is still running, newest first, and
+    SIGKILLs what is left after a grace period.
+
+Commands started with node.popen() run under `mnexec -d`, which puts them
+in a process group of their own, so a shell and everything it started
+are signalled and measured together.  Teardown writes DIR/runtime.json
+(exit status, CPU seconds, peak CPU and RSS per process) and prints the
+same as a table.  A required process that exits early, or one that
+needs SIGKILL, fails the run; check() raises RunFailed for it once the
+block is left:
+
+    with Runtime(args.dir) as rt:
+        rt.popen(h1, 'ping -D -i 0.1 10.0.0.2', 'ping', stdout=f)
+        rt.spawn(monitor_qlen, 'qmon', args=('s0-eth2',))
+        ...
+    rt.check()
+
+usage.txt has one line per process per sample:
+
+    time,name,pid,cpu,rss
+
+with cpu in percent of one core over the last interval and rss in kB.
+'''
+
+import json
+import os
+import signal
+import threading
+from subprocess import Popen, STDOUT, TimeoutExpired
+from time import monotonic, sleep, time
+
+CLK_TCK = os.sysconf('SC_CLK_TCK')
+PAGE_KB = os.sysconf('SC_PAGE_SIZE') // 1024
+
+# A process this busy is itself a bottleneck; its results need a second look
+CPU_BOUND = 90.0
+
+
+class RunFailed(Exception):
+    '''A required process exited early or a process had to be killed.'''
+
+
+def read_stat(pid):
+    '''(pgrp, cpu ticks, rss pages) of a process from /proc, or None if
+    it is gone or a zombie.  CPU includes reaped children, so a shell's
+    count covers what it ran.'''
+    try:
+        with open('/proc/%d/stat' % pid, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    # comm may contain spaces; fields after it start with state (field 3)
+    fields = data[data.rindex(b')') + 2:].split()
+    if fields[0] == b'Z':
+        return None
+    ticks = int(fields[11]) + int(fields[12]) + int(fields[13]) + int(fields[14])
+    return int(fields[2]), ticks, int(fields[21])
+
+
+def scan_proc():
+    '''{pid: (pgrp, ticks, rss pages)} for every process.'''
+    table = {}
+    for name in os.listdir('/proc'):
+        if name.isdigit():
+            stat = read_stat(int(name))
+            if stat is not None:
+                table[int(name)] = stat
+    return table
+
+
+class Proc(object):
+    '''One supervised process: a Popen or a multiprocessing.Process.'''
+
+    def __init__(self, name, handle, cmd=None, deadline=None, required=False, log=None,
+                 own_group=True):
+        self.name = name
+        self.handle = handle
+        self.pid = handle.pid
+        self.cmd = cmd
+        self.log = log
+        self.required = required
+        self.start = monotonic()
+        self.deadline = None if deadline is None else self.start + deadline
+        self.own_group = own_group
+        self.group = False      # leads its own process group
+        self.noticed = False    # its exit has been reported
+        self.returncode = None
+        self.end = None
+        self.stopping = False   # we asked it to stop
+        self.kill_at = None
+        self.killed = False     # needed SIGKILL
+        self.expired = False    # ran into its deadline
+        self.cpu = 0.0          # seconds
+        self.cpu_peak = 0.0     # percent of one core
+        self.rss_max = 0        # kB
+        self._ticks = None
+        self._sampled = None
+
+    def poll(self):
+        if self.returncode is None:
+            if hasattr(self.handle, 'poll'):
+                code = self.handle.poll()
+            else:
+                code = self.handle.exitcode
+            if code is not None:
+                self.returncode = code
+                self.end = monotonic()
+        return self.returncode
+
+    def members(self, table=None):
+        '''Live pids belonging to this process.'''
+        table = scan_proc() if table is None else table
+        if self.group:
+            return [pid for pid, stat in table.items() if stat[0] == self.pid]
+        return [self.pid] if self.pid in table and self.poll() is None else []
+
+    def running(self, table=None):
+        if not self.group:
+            return self.poll() is None
+        self.poll()
+        return bool(self.members(table))
+
+    def _check_group(self, stat):
+        if self.own_group and stat is not None and stat[0] == self.pid:
+            self.group = True
+
+    def signal(self, sig):
+        self._check_group(read_stat(self.pid))
+        try:
+            if self.group:
+                os.killpg(self.pid, sig)
+            elif self.poll() is None:
+                os.kill(self.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def measure(self, table, now):
+        '''Updates CPU/RSS counters from a scan_proc() table; returns
+        (cpu %, rss kB) for this interval, or None if nothing is running.'''
+        self._check_group(table.get(self.pid))
+        pids = self.members(table)
+        if not pids:
+            return None
+        ticks = sum(table[pid][1] for pid in pids)
+        rss = sum(table[pid][2] for pid in pids) * PAGE_KB
+        pct = 0.0
+        if self._ticks is not None and now > self._sampled:
+            used = max(ticks - self._ticks, 0) / float(CLK_TCK)
+            self.cpu += used
+            pct = 100.0 * used / (now - self._sampled)
+        self._ticks, self._sampled = ticks, now
+        self.cpu_peak = max(self.cpu_peak, pct)
+        self.rss_max = max(self.rss_max, rss)
+        return pct, rss
+
+    def report(self):
+        return {'pid': self.pid, 'cmd': self.cmd, 'log': self.log,
+                'returncode': self.returncode, 'killed': self.killed,
+                'expired': self.expired, 'required': self.required,
+                'seconds': (self.end or monotonic()) - self.start,
+                'cpu_s': self.cpu, 'cpu_peak': self.cpu_peak, 'rss_max_kb': self.rss_max}
+
+
+class Runtime(object):
+    '''Registry of the processes of one run; see the module docstring.'''
+
+    def __init__(self, out_dir, interval_sec=1.0, grace_sec=2.0):
+        self.out_dir = out_dir
+        self.log_dir = os.path.join(out_dir, 'logs')
+        self.interval = interval_sec
+        self.grace = grace_sec
+        self.procs = []
+        self.failures = []
+        self.killed = []
+        # teardown()'s verdict, once it has run
+        self.ok = None
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.thread = None
+        self.usage = None
+        self._old_sigterm = None
+        # the runner itself (Mininet bookkeeping, fetch parsing, ...)
+        self.main = Proc('main', _Self(), 'runner', own_group=False)
+
+    def __enter__(self):
+        self.start()
+        if threading.current_thread() is threading.main_thread():
+            self._old_sigterm = signal.signal(signal.SIGTERM, _stop)
+        return self
+
+    def __exit__(self, *exc):
+        if self._old_sigterm is not None:
+            signal.signal(signal.SIGTERM, self._old_sigterm)
+        self.ok = self.teardown()
+        return False
+
+    def check(self):
+        '''Raises RunFailed if a required process failed or anything had
+        to be killed at teardown.'''
+        if self.ok is False:
+            problems = ['%s failed' % name for name in self.failures]
+            problems += ['%s needed SIGKILL' % p.name for p in self.killed]
+            raise RunFailed(', '.join(problems))
+
+    def start(self):
+        if not os.path.exists(self.log_dir):
+            os.makedirs(self.log_dir)
+        self.usage = open(os.path.join(self.out_dir, 'usage.txt'), 'w')
+        self.thread = threading.Thread(target=self._supervise, name='runtime')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _name(self, name):
+        names = set(p.name for p in self.procs)
+        if name not in names:
+            return name
+        return next('%s.%d' % (name, i) for i in range(1, len(names) + 2)
+                    if '%s.%d' % (name, i) not in names)
+
+    def _add(self, proc):
+        with self.lock:
+            self.procs.append(proc)
+        return proc
+
+    def popen(self, node, cmd, name, deadline=None, required=False, shell=False, **kwargs):
+        '''Starts cmd on a Mininet node (locally if node is None) and
+        registers it.  stdout and stderr go to logs/<name>.log unless
+        given.  A process still running deadline seconds from now is
+        stopped; one marked required that exits early fails the run.'''
+        with self.lock:
+            name = self._name(name)
+        log = None
+        if 'stdout' not in kwargs or 'stderr' not in kwargs:
+            log = os.path.join(self.log_dir, name + '.log')
+            f = open(log, 'wb')
+            kwargs.setdefault('stdout', f)
+            kwargs.setdefault('stderr', STDOUT if kwargs['stdout'] is f else f)
+        try:
+            if node is None:
+                if isinstance(cmd, str):
+                    cmd = ['sh', '-c', cmd] if shell else cmd.split()
+                handle = Popen(cmd, start_new_session=True, **kwargs)
+            else:
+                handle = node.popen(cmd, shell=shell, **kwargs)
+        finally:
+            if log is not None:
+                f.close()
+        return self._add(Proc(name, handle, cmd if isinstance(cmd, str) else ' '.join(cmd),
+                              deadline, required, log))
+
+    def spawn(self, target, name, args=(), kwargs=None, deadline=None, required=False):
+        '''Runs target in a multiprocessing.Process and registers it.'''
+        from multiprocessing import Process
+        with self.lock:
+            name = self._name(name)
+        handle = Process(target=target, args=args, kwargs=kwargs or {}, name=name)
+        handle.start()
+        return self._add(Proc(name, handle, '%s()' % target.__name__, deadline, required,
+                              own_group=False))
+
+    def wait(self, proc, timeout=None):
+        '''Waits for proc to exit by itself, stopping it after timeout
+        seconds.  Returns its exit status.'''
+        end = None if timeout is None else monotonic() + timeout
+        while proc.poll() is None and (end is None or monotonic() < end):
+            sleep(0.05)
+        if proc.poll() is None:
+            self.stop(proc)
+        return proc.returncode
+
+    def stop(self, *procs):
+        '''SIGTERM, then SIGKILL after the grace period (default: all,
+        newest first).  Returns the processes that needed SIGKILL.'''
+        with self.lock:
+            procs = list(procs) if procs else list(reversed(self.procs))
+        procs = [p for p in procs if p.running()]
+        for p in procs:
+            p.stopping = True
+            p.signal(signal.SIGTERM)
+        end = monotonic() + self.grace
+        while monotonic() < end:
+            table = scan_proc()
+            if not any(p.running(table) for p in procs):
+                break
+            sleep(0.05)
+        killed = [p for p in procs if p.running()]
+        for p in killed:
+            p.killed = True
+            p.signal(signal.SIGKILL)
+        for p in procs:
+            if hasattr(p.handle, 'join'):
+                p.handle.join(1.0)
+            else:
+                try:
+                    p.handle.wait(1.0)
+                except TimeoutExpired:
+                    pass
+            p.poll()
+        return killed
+
+    def _supervise(self):
+        while not self.done.wait(self.interval):
+            self.tick()
+
+    def tick(self):
+        '''One supervision step: usage sample, deadlines, early exits.'''
+        now = monotonic()
+        stamp = time()
+        table = scan_proc()
+        with self.lock:
+            procs = list(self.procs)
+        for p in [self.main] + procs:
+            usage = p.measure(table, now)
+            if usage is not None and self.usage is not None:
+                self.usage.write('%f,%s,%d,%.1f,%d\n' % (stamp, p.name, p.pid, usage[0], usage[1]))
+        if self.usage is not None:
+            self.usage.flush()
+
+        for p in procs:
+            if p.poll() is not None and not p.noticed:
+                p.noticed = True
+                if not p.stopping and (p.required or p.returncode != 0):
+                    print('runtime: %s exited with status %d after %.1fs%s' % (
+                        p.name, p.returncode, p.end - p.start,
+                        ' (see %s)' % p.log if p.log else ''))
+                    if p.required:
+                        self.failures.append(p.name)
+            if p.deadline is not None and now >= p.deadline and not p.stopping \
+               and p.running(table):
+                print('runtime: %s still running after its deadline, stopping it' % p.name)
+                p.expired = p.stopping = True
+                p.kill_at = now + self.grace
+                p.signal(signal.SIGTERM)
+            elif p.kill_at is not None and now >= p.kill_at and p.running(table):
+                p.killed = True
+                p.kill_at = None
+                p.signal(signal.SIGKILL)
+
+    def teardown(self):
+        '''Stops everything, writes runtime.json and prints the usage
+        summary.  Returns False if a required process failed or anything
+        had to be killed.'''
+        if self.thread is not None:
+            self.done.set()
+            self.thread.join()
+            self.thread = None
+        # a last sample so short-lived processes are counted
+        self.tick()
+        killed = self.killed = self.stop()
+        if self.usage is not None:
+            self.usage.close()
+            self.usage = None
+        report = dict((p.name, p.report()) for p in [self.main] + self.procs)
+        with open(os.path.join(self.out_dir, 'runtime.json'), 'w') as f:
+            json.dump({'failures': self.failures, 'killed': [p.name for p in killed],
+                       'procs': report}, f, indent=1, sort_keys=True)
+        print(format_report(report))
+        if killed:
+            print('runtime: needed SIGKILL: %s' % ' '.join(p.name for p in killed))
+        return not self.failures and not killed
+
+
+class _Self(object):
+    '''Stands in for a process handle for the runner itself.'''
+
+    def __init__(self):
+        self.pid = os.getpid()
+
+    def poll(self):
+        return None
+
+
+def _stop(signum, frame):
+    raise SystemExit(0)
+
+
+def format_report(procs):
+    '''Table of a runtime.json "procs" dict.'''
+    lines = ['%-14s %8s %8s %8s %9s  %s' % ('process', 'time s', 'cpu s', 'peak %',
+                                            'RSS MB', 'exit')]
+    busy = []
+    for name, p in procs.items():
+        if p['returncode'] is None:
+            status = '-'
+        elif p['killed']:
+            status = 'killed'
+        else:
+            status = str(p['returncode'])
+        lines.append('%-14s %8.1f %8.2f %8.1f %9.1f  %s' % (
+            name, p['seconds'], p['cpu_s'], p['cpu_peak'], p['rss_max_kb'] / 1024.0, status))
+        if p['cpu_peak'] >= CPU_BOUND:
+            busy.append(name)
+    if busy:
+        lines.append('warning: %s reached %d%% of a core; the emulation may be CPU-bound'
+                     % (', '.join(busy), CPU_BOUND))
+    return '\n'.join(lines)
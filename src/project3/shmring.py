@@ -0,0 +1,165 @@
+'''
+Single-producer/single-consumer ring of fixed-size records in shared
+memory, for handing monitor samples to the experiment process without
+going through files.
+
+The parent creates the ring and passes its name to the monitor, which
+attaches and appends; the parent drains it whenever it likes:
+
+    ring = Ring(capacity=1 << 16)                # parent
+    Process(target=monitor_qlen, ..., kwargs={'ring': ring.name}).start()
+    rows = ring.read()                           # t, qlen record array
+
+    ring = Ring(name)                            # monitor
+    ring.append(t, qlen)
+
+The block starts with a small header: the producer's count of records
+written (head) and the consumer's count read (tail), each on its own
+cache line, then capacity, record size and a count of dropped records.
+Only the producer stores head and only the consumer stores tail, so no
+lock is needed; each side copies its records before publishing the new
+count.  The producer never waits: when the ring is full, new records are
+counted in `dropped` and discarded, so a slow reader cannot stall the
+sampling loop.
+
+CPython puts no memory fences between processes.  On x86 stores become
+visible in program order, which is all the protocol needs; on weakly
+ordered CPUs a reader could in principle see a new count before the
+records it covers.
+'''
+
+import threading
+
+import numpy as np
+from multiprocessing import shared_memory
+
+from tsformat import QUEUE_COLUMNS
+
+# (t, qlen) with qlen padded to 8 bytes, 16 bytes a record
+QUEUE_RECORD = np.dtype(QUEUE_COLUMNS, align=True)
+
+# header words (uint64): head and tail 64 bytes apart
+HEAD, TAIL, CAPACITY, ITEMSIZE, DROPPED = 0, 8, 16, 17, 18
+HEADER_BYTES = 192
+
+
+def _attach(name):
+    try:
+        # 3.13+: the creator alone owns the block's lifetime
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class Ring(object):
+    '''Creates a ring of capacity records (rounded up to a power of two)
+    of dtype, or attaches to the existing ring called name.'''
+
+    def __init__(self, name=None, capacity=1 << 16, dtype=QUEUE_RECORD):
+        self.dtype = np.dtype(dtype)
+        if name is None:
+            capacity = 1 << max(int(capacity) - 1, 1).bit_length()
+            self.shm = shared_memory.SharedMemory(
+                create=True, size=HEADER_BYTES + capacity * self.dtype.itemsize)
+            self.owner = True
+        else:
+            self.shm = _attach(name)
+            self.owner = False
+        self.header = np.ndarray((HEADER_BYTES // 8,), dtype='<u8', buffer=self.shm.buf)
+        if self.owner:
+            self.header[:] = 0
+            self.header[CAPACITY] = capacity
+            self.header[ITEMSIZE] = self.dtype.itemsize
+        elif self.header[ITEMSIZE] != self.dtype.itemsize:
+            itemsize = int(self.header[ITEMSIZE])
+            self.close()
+            raise ValueError('ring %s holds %d-byte records, not %d'
+                             % (name, itemsize, self.dtype.itemsize))
+        self.capacity = int(self.header[CAPACITY])
+        self.mask = self.capacity - 1
+        self.records = np.ndarray((self.capacity,), dtype=self.dtype,
+                                  buffer=self.shm.buf, offset=HEADER_BYTES)
+        # the producer's one-record staging area, to keep append() cheap
+        self._one = np.zeros(1, dtype=self.dtype)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def dropped(self):
+        return int(self.header[DROPPED])
+
+    def __len__(self):
+        '''Records written and not yet read.'''
+        return int(self.header[HEAD] - self.header[TAIL])
+
+    # -- producer
+
+    def write(self, rows):
+        '''Appends a record array; returns how many fit (the rest are
+        dropped).'''
+        head = int(self.header[HEAD])
+        free = self.capacity - (head - int(self.header[TAIL]))
+        n = min(len(rows), free)
+        if n < len(rows):
+            self.header[DROPPED] += len(rows) - n
+        if n:
+            start = head & self.mask
+            first = min(n, self.capacity - start)
+            self.records[start:start + first] = rows[:first]
+            self.records[:n - first] = rows[first:n]
+            self.header[HEAD] = head + n
+        return n
+
+    def append(self, *fields):
+        self._one[0] = fields
+        return self.write(self._one)
+
+    # -- consumer
+
+    def read(self, max_rows=None):
+        '''Copies out and consumes up to max_rows records (all by default).'''
+        tail = int(self.header[TAIL])
+        n = int(self.header[HEAD]) - tail
+        if max_rows is not None:
+            n = min(n, max_rows)
+        start = tail & self.mask
+        first = min(n, self.capacity - start)
+        rows = np.concatenate([self.records[start:start + first],
+                               self.records[:n - first]])
+        self.header[TAIL] = tail + n
+        return rows
+
+    def close(self):
+        # views must go before the block can be unmapped
+        self.header = self.records = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class Drain(threading.Thread):
+    '''Reads a ring every interval_sec and hands the records to consume,
+    until stop(), which also hands over whatever is left.'''
+
+    def __init__(self, ring, consume, interval_sec=0.1):
+        super().__init__(daemon=True)
+        self.ring = ring
+        self.consume = consume
+        self.interval = interval_sec
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.drain()
+
+    def drain(self):
+        rows = self.ring.read()
+        if len(rows):
+            self.consume(rows)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.drain()
@@ -0,0 +1,176 @@
+'''
+Parameter sweeps for bufferbloat.py.
+
+Runs every combination of the given parameters, each in its own network
+namespace so independent runs can go in parallel, caches results by a hash
+of the parameters, and prints a summary table at the end.
+
+    sudo python3 sweep.py --cong reno bbr --maxq 20 100 --jobs 4
+
+Run directories are OUT/<hash>/ holding bufferbloat.py's outputs plus
+log.txt; a 'done' marker makes reruns skip completed points.  Runs in a
+namespace use a Linux bridge (no OVS daemon is reachable there) and, when
+more than one runs at a time, plain hosts: CPULimitedHost names its cgroup
+after the host, so parallel h1/h2 would share one.  The host and switch
+type are part of the hashed point, so results from one are never reused
+for the other.
+'''
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PARAMS = ['cong', 'maxq', 'bw_net', 'delay', 'time']
+SWITCH = 'lxbr'
+
+
+def point_key(point):
+    blob = json.dumps(point, sort_keys=True).encode()
+    return hashlib.sha1(blob).hexdigest()[:12]
+
+
+def grid(args):
+    '''Every combination of the swept parameters, plus the host and switch
+    type the runs will use.'''
+    values = [getattr(args, name) for name in PARAMS]
+    host = 'plain' if args.jobs > 1 else 'cpu'
+    for combo in itertools.product(*values):
+        point = dict(zip(PARAMS, combo))
+        point.update(host=host, switch=SWITCH)
+        yield point
+
+
+def pending(points, out, force=False):
+    '''The points without a 'done' marker under out (all with force).'''
+    return [p for p in points if force or
+            not os.path.exists(os.path.join(out, point_key(p), 'done'))]
+
+
+def bufferbloat_cmd(point, run_dir):
+    cmd = [sys.executable, os.path.join(HERE, 'bufferbloat.py'),
+           '--dir', run_dir,
+           '--cong', point['cong'],
+           '--maxq', str(point['maxq']),
+           '--bw-net', str(point['bw_net']),
+           '--delay', str(point['delay']),
+           '--time', str(point['time']),
+           '--switch', point['switch'],
+           '--host', point['host']]
+    return cmd
+
+
+def run_point(point, out, use_netns=True, command=bufferbloat_cmd):
+    key = point_key(point)
+    run_dir = os.path.join(out, key)
+    os.makedirs(run_dir, exist_ok=True)
+    # a forced rerun that fails must not leave the old run marked complete
+    done = os.path.join(run_dir, 'done')
+    if os.path.exists(done):
+        os.remove(done)
+    with open(os.path.join(run_dir, 'point.json'), 'w') as f:
+        json.dump(point, f, sort_keys=True)
+    cmd = command(point, run_dir)
+    ns = 'bbsweep-' + key
+    with open(os.path.join(run_dir, 'log.txt'), 'w') as log:
+        if use_netns:
+            subprocess.call(['ip', 'netns', 'add', ns], stdout=log, stderr=log)
+            subprocess.call(['ip', 'netns', 'exec', ns, 'ip', 'link', 'set', 'lo', 'up'],
+                            stdout=log, stderr=log)
+            cmd = ['ip', 'netns', 'exec', ns] + cmd
+        try:
+            code = subprocess.call(cmd, cwd=HERE, stdout=log, stderr=subprocess.STDOUT)
+        finally:
+            if use_netns:
+                subprocess.call(['ip', 'netns', 'del', ns], stdout=log, stderr=log)
+    if code == 0:
+        open(done, 'w').close()
+    return key, code
+
+
+def summarize(run_dir):
+    '''Summary numbers for one finished run directory.'''
+    from aggregate import load_run
+
+    s = load_run(run_dir)['summary']
+    row = {}
+    if s.get('fetch', {}).get('n'):
+        row['fetch_mean'], row['fetch_std'] = s['fetch']['mean'], s['fetch']['std']
+    if s.get('q', {}).get('n'):
+        row['q_mean'], row['q_max'] = s['q']['mean'], s['q']['max']
+    if s.get('rtt', {}).get('n'):
+        row['rtt_p50'], row['rtt_p99'] = s['rtt']['p50'], s['rtt']['p99']
+    return row
+
+
+COLUMNS = PARAMS + ['host', 'fetch_mean', 'fetch_std', 'q_mean', 'q_max', 'rtt_p50', 'rtt_p99']
+
+
+def print_table(rows, out):
+    def fmt(value):
+        if isinstance(value, float):
+            return '%.4g' % value
+        return '-' if value is None else str(value)
+
+    table = [COLUMNS] + [[fmt(row.get(c)) for c in COLUMNS] for row in rows]
+    widths = [max(len(r[i]) for r in table) for i in range(len(COLUMNS))]
+    for r in table:
+        print('  '.join(cell.rjust(w) for cell, w in zip(r, widths)))
+    with open(os.path.join(out, 'summary.csv'), 'w') as f:
+        f.write(','.join(COLUMNS) + '\n')
+        for r in table[1:]:
+            f.write(','.join(r) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel bufferbloat parameter sweep")
+    parser.add_argument('--cong', nargs='+', default=['reno'])
+    parser.add_argument('--maxq', nargs='+', type=int, default=[20, 100])
+    parser.add_argument('--bw-net', nargs='+', type=float, default=[1.5])
+    parser.add_argument('--delay', nargs='+', type=float, default=[5])
+    parser.add_argument('--time', nargs='+', type=int, default=[15])
+    parser.add_argument('--jobs', '-j', type=int,
+                        default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Runs to execute at once")
+    parser.add_argument('--out', '-o', default='sweep',
+                        help="Directory for run outputs and summary.csv")
+    parser.add_argument('--force', action='store_true',
+                        help="Rerun points that already completed")
+    parser.add_argument('--no-netns', action='store_true',
+                        help="Run in the current namespace (implies --jobs 1)")
+    args = parser.parse_args()
+    if args.no_netns:
+        args.jobs = 1
+
+    out = os.path.abspath(args.out)
+    os.makedirs(out, exist_ok=True)
+    points = list(grid(args))
+    todo = pending(points, out, args.force)
+    print('%d points, %d cached, running %d with %d jobs' % (
+        len(points), len(points) - len(todo), len(todo), args.jobs))
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(run_point, p, out, not args.no_netns)
+                   for p in todo]
+        for future in futures:
+            key, code = future.result()
+            print('%s %s' % (key, 'ok' if code == 0 else 'FAILED (%d), see log.txt' % code))
+
+    rows = []
+    for point in points:
+        run_dir = os.path.join(out, point_key(point))
+        row = dict(point)
+        if os.path.exists(os.path.join(run_dir, 'done')):
+            row.update(summarize(run_dir))
+        rows.append(row)
+    print_table(rows, out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+'''
+Per-connection TCP sender state (cwnd, RTT, delivery and pacing rate,
+retransmits) sampled from the kernel.
+
+Two sources give the same records:
+
+  SsSampler        polls `ss -tin` for connections matching a filter, so it
+                   can watch any sender (iperf on h1, say)
+  tcp_info(sock)   decodes getsockopt(TCP_INFO) for a socket the caller owns;
+                   SocketSampler samples the sockets a sender registers
+                   (workload.py gen --tcpinfo)
+
+monitor_tcpinfo() samples one of them on a fixed schedule into a .ts series
+(see tsformat.py) with TCPINFO_COLUMNS.  Timestamps use the same
+wallclock anchor as the queue monitor, so rows line up with q.txt and
+`ping -D`.  flows.json in the series maps the flow column to the
+connection:
+
+    h1$ python3 tcpinfo.py --dst 10.0.0.2 --interval 0.01 --out tcp.ts
+'''
+
+import argparse
+import json
+import os
+import re
+import signal
+import socket
+import struct
+import subprocess
+from time import sleep, monotonic_ns
+
+from monitor import wallclock_anchor, to_epoch
+
+TCPINFO_COLUMNS = [('t', '<f8'), ('flow', '<i4'), ('cwnd', '<i4'), ('srtt', '<f4'),
+                   ('rttvar', '<f4'), ('delivery_rate', '<f8'), ('pacing_rate', '<f8'),
+                   ('retrans', '<i4'), ('bytes_acked', '<f8')]
+
+RECORD_FIELDS = ['cwnd', 'srtt', 'rttvar', 'delivery_rate', 'pacing_rate',
+                 'retrans', 'bytes_acked']
+
+RATE_UNITS = {'bps': 1, 'Kbps': 1e3, 'Mbps': 1e6, 'Gbps': 1e9}
+
+pat_conn = re.compile(r'^(?:(\S+)\s+)?(\d+)\s+(\d+)\s+(\S+)\s+(\S+)')
+pat_rtt = re.compile(r'\brtt:([\d.]+)/([\d.]+)')
+pat_rate = re.compile(r'\b(send|pacing_rate|delivery_rate)\s+([\d.]+)([KMG]?bps)')
+pat_kv = re.compile(r'\b(cwnd|ssthresh|bytes_acked|bytes_sent|unacked|mss|delivered):(\d+)')
+pat_retrans = re.compile(r'\bretrans:(\d+)/(\d+)')
+pat_bbr = re.compile(r'\bbbr:\(([^)]*)\)')
+pat_cc = re.compile(r'^\s*([a-z_0-9]+)\s+wscale:')
+
+
+def _empty(local, peer, state):
+    return {'state': state, 'local': local, 'peer': peer, 'cc': '',
+            'cwnd': 0, 'ssthresh': 0, 'srtt': float('nan'), 'rttvar': float('nan'),
+            'send_rate': 0.0, 'delivery_rate': 0.0, 'pacing_rate': 0.0,
+            'retrans': 0, 'bytes_acked': 0, 'bytes_sent': 0, 'unacked': 0,
+            'mss': 0, 'delivered': 0, 'bbr': None}
+
+
+def parse_ss(text):
+    '''Parses `ss -tin` output into one dict per connection.  Works with
+    and without the State column (`ss -tin state established` drops it)
+    and with both the bps-only rates of newer iproute2 and the Kbps/Mbps
+    ones of older releases.  srtt/rttvar are in ms, rates in bits/s.'''
+    conns = []
+    for line in text.splitlines():
+        if not line.strip() or line.startswith(('State', 'Recv-Q', 'Netid')):
+            continue
+        if not line[0].isspace():
+            m = pat_conn.match(line)
+            if m:
+                conns.append(_empty(m.group(4), m.group(5), m.group(1) or 'ESTAB'))
+            continue
+        if not conns:
+            continue
+        conn = conns[-1]
+        m = pat_cc.match(line)
+        if m:
+            conn['cc'] = m.group(1)
+        m = pat_rtt.search(line)
+        if m:
+            conn['srtt'], conn['rttvar'] = float(m.group(1)), float(m.group(2))
+        for name, value in pat_kv.findall(line):
+            conn[name] = int(value)
+        for name, value, unit in pat_rate.findall(line):
+            key = 'send_rate' if name == 'send' else name
+            conn[key] = float(value) * RATE_UNITS[unit]
+        m = pat_retrans.search(line)
+        if m:
+            conn['retrans'] = int(m.group(2))
+        m = pat_bbr.search(line)
+        if m:
+            bbr = {}
+            for item in m.group(1).split(','):
+                key, _, value = item.partition(':')
+                rate = re.match(r'([\d.]+)([KMG]?bps)$', value)
+                bbr[key] = float(rate.group(1)) * RATE_UNITS[rate.group(2)] if rate else float(value)
+            conn['bbr'] = bbr
+    return conns
+
+
+# struct tcp_info from linux/tcp.h, as far as the fields we use.  Older
+# kernels return a shorter struct; missing fields decode as 0.
+TCP_INFO = struct.Struct('=8B24I4Q6IQ')
+TCP_INFO_FIELDS = (
+    ['state', 'ca_state', 'retransmits', 'probes', 'backoff', 'options', 'wscale', 'flags',
+     'rto', 'ato', 'snd_mss', 'rcv_mss', 'unacked', 'sacked', 'lost', 'retrans',
+     'fackets', 'last_data_sent', 'last_ack_sent', 'last_data_recv', 'last_ack_recv',
+     'pmtu', 'rcv_ssthresh', 'rtt', 'rttvar', 'snd_ssthresh', 'snd_cwnd', 'advmss',
+     'reordering', 'rcv_rtt', 'rcv_space', 'total_retrans',
+     'pacing_rate', 'max_pacing_rate', 'bytes_acked', 'bytes_received',
+     'segs_out', 'segs_in', 'notsent_bytes', 'min_rtt', 'data_segs_in', 'data_segs_out',
+     'delivery_rate'])
+
+
+def decode_tcp_info(data):
+    '''Raw TCP_INFO bytes to a dict of the kernel's field names (rtt in us,
+    rates in bytes/s, as the kernel reports them).'''
+    data = bytes(data[:TCP_INFO.size]).ljust(TCP_INFO.size, b'\0')
+    return dict(zip(TCP_INFO_FIELDS, TCP_INFO.unpack(data)))
+
+
+def tcp_info(sock):
+    '''The same record parse_ss() gives, for a connected socket we own.'''
+    raw = decode_tcp_info(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, TCP_INFO.size))
+    try:
+        local = '%s:%d' % sock.getsockname()[:2]
+        peer = '%s:%d' % sock.getpeername()[:2]
+    except OSError:
+        local = peer = ''
+    try:
+        cc = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_CONGESTION, 16).rstrip(b'\0').decode()
+    except OSError:
+        cc = ''
+    conn = _empty(local, peer, 'ESTAB')
+    conn.update({'cc': cc, 'cwnd': raw['snd_cwnd'], 'ssthresh': raw['snd_ssthresh'],
+                 'srtt': raw['rtt'] / 1000.0, 'rttvar': raw['rttvar'] / 1000.0,
+                 'delivery_rate': raw['delivery_rate'] * 8.0,
+                 'pacing_rate': raw['pacing_rate'] * 8.0,
+                 'retrans': raw['total_retrans'], 'bytes_acked': raw['bytes_acked'],
+                 'unacked': raw['unacked'], 'mss': raw['snd_mss']})
+    return conn
+
+
+class SsSampler(object):
+    '''Forks `ss -tin` with a filter per sample.  Without a filter every
+    TCP connection in the namespace is reported.'''
+
+    def __init__(self, dst=None, dport=None, sport=None):
+        terms = []
+        if dst:
+            terms.append('dst %s' % dst)
+        if dport:
+            terms.append('dport = :%d' % dport)
+        if sport:
+            terms.append('sport = :%d' % sport)
+        self.cmd = ['ss', '-tin', 'state', 'established'] + (
+            ['( %s )' % ' and '.join(terms)] if terms else [])
+
+    def sample(self):
+        return parse_ss(subprocess.check_output(self.cmd).decode())
+
+    def close(self):
+        pass
+
+
+class SocketSampler(object):
+    '''TCP_INFO for a set of sockets a sender registers as it opens them.'''
+
+    def __init__(self):
+        self.socks = []
+        self.stopped = False
+
+    def add(self, sock):
+        self.socks.append(sock)
+
+    def stop(self):
+        '''Ends monitor_tcpinfo() after its current sample.'''
+        self.stopped = True
+
+    def sample(self):
+        if self.stopped:
+            return None
+        conns = []
+        for sock in list(self.socks):
+            if sock.fileno() < 0:
+                self.socks.remove(sock)
+                continue
+            try:
+                conns.append(tcp_info(sock))
+            except OSError:
+                self.socks.remove(sock)
+        return conns
+
+    def close(self):
+        pass
+
+
+def _stop(signum, frame):
+    raise SystemExit(0)
+
+
+def monitor_tcpinfo(sampler, interval_sec=0.01, fname='tcpinfo.ts', duration=None,
+                    flush_sec=1.0):
+    '''Samples every interval_sec into a TCPINFO_COLUMNS series at fname
+    until duration passes, sampler.sample() returns None, or SIGTERM.'''
+    import tsformat
+    try:
+        signal.signal(signal.SIGTERM, _stop)
+    except ValueError:
+        pass
+    anchor = wallclock_anchor()
+    interval_ns = int(interval_sec * 1e9)
+    flush_ns = int(flush_sec * 1e9)
+    flows = {}
+    writer = tsformat.SeriesWriter(fname, TCPINFO_COLUMNS, 'tcpinfo')
+
+    def save_flows():
+        with open(os.path.join(fname, 'flows.json'), 'w') as f:
+            json.dump(dict((str(i), {'local': k[0], 'peer': k[1], 'cc': cc})
+                           for k, (i, cc) in flows.items()), f, indent=1, sort_keys=True)
+
+    start = next_sample = last_flush = monotonic_ns()
+    try:
+        while duration is None or monotonic_ns() - start < duration * 1e9:
+            now = monotonic_ns()
+            conns = sampler.sample()
+            if conns is None:
+                break
+            t = to_epoch(now, anchor)
+            for conn in conns:
+                key = (conn['local'], conn['peer'])
+                if key not in flows:
+                    flows[key] = (len(flows), conn['cc'])
+                writer.append(t, flows[key][0], *[conn[f] for f in RECORD_FIELDS])
+            if now - last_flush >= flush_ns:
+                writer.flush()
+                save_flows()
+                last_flush = now
+            next_sample += interval_ns
+            delay = next_sample - monotonic_ns()
+            if delay > 0:
+                sleep(delay / 1e9)
+            else:
+                next_sample = monotonic_ns()
+    finally:
+        writer.close()
+        save_flows()
+        sampler.close()
+
+
+def load_tcpinfo(path):
+    '''({column: array}, {flow index: {'local', 'peer', 'cc'}}) for a series.'''
+    import tsformat
+    flows = {}
+    if os.path.exists(os.path.join(path, 'flows.json')):
+        with open(os.path.join(path, 'flows.json')) as f:
+            flows = dict((int(k), v) for k, v in json.load(f).items())
+    return tsformat.open_series(path), flows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sample per-connection TCP state with ss -tin")
+    parser.add_argument('--dst', help="Only connections to this address")
+    parser.add_argument('--dport', type=int, help="Only connections to this port")
+    parser.add_argument('--sport', type=int, help="Only connections from this port")
+    parser.add_argument('--interval', '-i', type=float, default=0.01)
+    parser.add_argument('--duration', '-t', type=float, default=None)
+    parser.add_argument('--out', '-o', default='tcpinfo.ts', help="Output series directory")
+    parser.add_argument('--print', action='store_true', dest='show',
+                        help="Print one parsed sample and exit")
+    args = parser.parse_args()
+
+    sampler = SsSampler(args.dst, args.dport, args.sport)
+    if args.show:
+        for conn in sampler.sample():
+            print('%(local)s -> %(peer)s %(cc)s cwnd %(cwnd)d srtt %(srtt).3fms '
+                  'delivery %(delivery_rate).0fbps pacing %(pacing_rate).0fbps '
+                  'retrans %(retrans)d' % conn)
+        return
+    monitor_tcpinfo(sampler, args.interval, args.out, args.duration)
+
+
+if __name__ == '__main__':
+    main()
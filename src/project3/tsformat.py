@@ -0,0 +1,190 @@
+'''
+Compact binary time series for experiment outputs.
+
+A series is a directory (conventionally NAME.ts) holding meta.json and one
+raw little-endian file per column, e.g.
+
+    q.ts/meta.json     {"version": 1, "kind": "queue",
+                        "columns": [["t", "<f8"], ["qlen", "<i4"]]}
+    q.ts/t.bin         float64 epoch seconds
+    q.ts/qlen.bin      int32 packets
+
+Columns are append-only, so a monitor can keep writing while a reader
+memory-maps what is there; a reader trusts only the rows every column has.
+Text files from the original monitor/ping are converted with
+queue_from_text() and ping_from_text(), and load_queue()/load_ping() read
+either format for the plot scripts.
+'''
+
+import json
+import os
+from array import array
+
+import numpy as np
+
+import pingparse
+
+VERSION = 1
+
+QUEUE_COLUMNS = [('t', '<f8'), ('qlen', '<i4')]
+PING_COLUMNS = [('t', '<f8'), ('seq', '<i4'), ('rtt', '<f4')]
+
+# array.array typecodes matching the numpy dtypes we use
+_TYPECODES = {'<f8': 'd', '<f4': 'f', '<i4': 'i', '<i8': 'q', '<u4': 'I'}
+
+# Rows buffered by a writer before it touches the disk
+FLUSH_ROWS = 4096
+
+
+def is_series(path):
+    return os.path.isfile(os.path.join(path, 'meta.json'))
+
+
+class SeriesWriter(object):
+    '''Appends rows to a series, creating it if needed.'''
+
+    def __init__(self, path, columns, kind='', flush_rows=FLUSH_ROWS):
+        self.path = path
+        self.columns = [(name, np.dtype(dtype).str) for name, dtype in columns]
+        self.flush_rows = flush_rows
+        if is_series(path):
+            meta = read_meta(path)
+            if [tuple(c) for c in meta['columns']] != self.columns:
+                raise ValueError('%s has columns %s' % (path, meta['columns']))
+        else:
+            os.makedirs(path, exist_ok=True)
+            with open(os.path.join(path, 'meta.json'), 'w') as f:
+                json.dump({'version': VERSION, 'kind': kind,
+                           'columns': self.columns}, f)
+        self.files = [open(os.path.join(path, name + '.bin'), 'ab')
+                      for name, _ in self.columns]
+        self.buffers = [array(_TYPECODES[dtype]) for _, dtype in self.columns]
+
+    def append(self, *row):
+        for buf, value in zip(self.buffers, row):
+            buf.append(value)
+        if len(self.buffers[0]) >= self.flush_rows:
+            self.flush()
+
+    def extend(self, *cols):
+        '''Appends whole columns (sequences or numpy arrays) at once.'''
+        self.flush()
+        for f, (_, dtype), col in zip(self.files, self.columns, cols):
+            f.write(np.ascontiguousarray(col, dtype=dtype).tobytes())
+
+    def flush(self):
+        for f, buf in zip(self.files, self.buffers):
+            if buf:
+                buf.tofile(f)
+                del buf[:]
+            f.flush()
+
+    def close(self):
+        self.flush()
+        for f in self.files:
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_meta(path):
+    with open(os.path.join(path, 'meta.json')) as f:
+        return json.load(f)
+
+
+def open_series(path):
+    '''Memory-maps every column of a series.  Returns {name: ndarray}.'''
+    meta = read_meta(path)
+    sizes = []
+    for name, dtype in meta['columns']:
+        size = os.path.getsize(os.path.join(path, name + '.bin'))
+        sizes.append(size // np.dtype(dtype).itemsize)
+    rows = min(sizes) if sizes else 0
+    cols = {}
+    for name, dtype in meta['columns']:
+        if rows == 0:
+            cols[name] = np.empty(0, dtype=dtype)
+        else:
+            cols[name] = np.memmap(os.path.join(path, name + '.bin'),
+                                   dtype=dtype, mode='r', shape=(rows,))
+    return cols
+
+
+def _line_chunks(fname, chunk_lines=1 << 20):
+    with open(fname) as f:
+        chunk = []
+        for line in f:
+            chunk.append(line)
+            if len(chunk) >= chunk_lines:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def queue_from_text(fname, out):
+    '''Converts a monitor "time,qlen" text file into a series at out.'''
+    with SeriesWriter(out, QUEUE_COLUMNS, 'queue') as writer:
+        for chunk in _line_chunks(fname):
+            rows = [l.split(',') for l in chunk if ',' in l]
+            if rows:
+                writer.extend([float(r[0]) for r in rows],
+                              [int(float(r[1])) for r in rows])
+    return out
+
+
+def parse_ping_text(fname, freq=10):
+    '''Returns (t, seq, rtt) numpy arrays from ping output, one entry per
+    probe (lost probes have rtt NaN).  Uses the `ping -D` timestamps when
+    present, otherwise seq / freq.'''
+    data = pingparse.read_ping(fname, freq)
+    return data['t'], data['seq'].astype('<i4'), data['rtt']
+
+
+def ping_from_text(fname, out, freq=10):
+    '''Converts ping output into a series at out, chunk by chunk.'''
+    with SeriesWriter(out, PING_COLUMNS, 'ping') as writer:
+        for chunk in pingparse.iter_ping_chunks(fname, freq=freq):
+            writer.extend(chunk['t'], chunk['seq'], chunk['rtt'])
+    return out
+
+
+def load_queue(path):
+    '''(t, qlen) arrays from a queue series or a "time,qlen" text file.'''
+    if is_series(path):
+        cols = open_series(path)
+        return cols['t'], cols['qlen']
+    data = np.loadtxt(path, delimiter=',', usecols=(0, 1), ndmin=2)
+    return data[:, 0], data[:, 1]
+
+
+def load_ping(path, freq=10):
+    '''(t, rtt) arrays from a ping series or ping text output.'''
+    if is_series(path):
+        cols = open_series(path)
+        return cols['t'], cols['rtt']
+    t, _, rtt = parse_ping_text(path, freq)
+    return t, rtt
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Convert experiment text outputs to .ts series")
+    parser.add_argument('kind', choices=['queue', 'ping'])
+    parser.add_argument('src', help="q.txt or ping.txt")
+    parser.add_argument('dst', help="Output series directory, e.g. q.ts")
+    parser.add_argument('--freq', type=int, default=10,
+                        help="Ping frequency, used when ping has no -D timestamps")
+    args = parser.parse_args()
+    if args.kind == 'queue':
+        queue_from_text(args.src, args.dst)
+    else:
+        ping_from_text(args.src, args.dst, args.freq)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+'''
+Web page fetch-time probe.
+
+Runs as one long-lived process on a Mininet host and fetches a URL on a
+fixed schedule, timing each request with perf_counter_ns instead of
+spawning curl per sample:
+
+    python3 webprobe.py http://10.0.0.1/ --interval 0.5 --duration 60
+
+Every fetch prints (and optionally appends to --out) one line
+
+    epoch,total,connect,ttfb,bytes,status
+
+with times in seconds; connect is 0 for a reused keep-alive connection,
+and a failed fetch has status -1 and nan times.  The first two columns are
+what fetch.txt has always held, so aggregate.py reads either.
+
+--workers N runs N fetch loops side by side, each on its own connection,
+for more samples per second without requests queueing behind each other.
+'''
+
+import argparse
+import socket
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+NAN = float('nan')
+RECV_SIZE = 1 << 16
+
+
+class FetchError(Exception):
+    pass
+
+
+class Probe(object):
+    '''One HTTP/1.1 client connection that times GETs of a single URL.'''
+
+    def __init__(self, url, keepalive=True, timeout=10.0):
+        parts = urlsplit(url)
+        if parts.scheme != 'http':
+            raise ValueError('only http:// URLs are supported: %s' % url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.request = ('GET %s HTTP/1.1\r\nHost: %s\r\nUser-Agent: webprobe\r\n'
+                        'Accept: */*\r\nConnection: %s\r\n\r\n' % (
+                            path, parts.netloc,
+                            'keep-alive' if keepalive else 'close')).encode('ascii')
+        self.sock = None
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def fetch(self):
+        '''Returns (total, connect, ttfb, nbytes, status), times in seconds.'''
+        start = time.perf_counter_ns()
+        connected = start
+        if self.sock is None:
+            self.sock = socket.create_connection((self.host, self.port), self.timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connected = time.perf_counter_ns()
+        try:
+            status, nbytes, first, reusable = self._exchange()
+        except (OSError, FetchError):
+            self.close()
+            raise
+        end = time.perf_counter_ns()
+        if not (self.keepalive and reusable):
+            self.close()
+        return ((end - start) / 1e9, (connected - start) / 1e9,
+                (first - start) / 1e9, nbytes, status)
+
+    def _exchange(self):
+        sock = self.sock
+        sock.sendall(self.request)
+        buf = b''
+        first = None
+        while b'\r\n\r\n' not in buf:
+            data = sock.recv(RECV_SIZE)
+            if not data:
+                raise FetchError('connection closed before response headers')
+            if first is None:
+                first = time.perf_counter_ns()
+            buf += data
+        head, body = buf.split(b'\r\n\r\n', 1)
+        lines = head.decode('latin-1').split('\r\n')
+        version, status = lines[0].split(None, 2)[:2]
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip().lower()
+        status = int(status)
+
+        conn = headers.get('connection', '')
+        reusable = conn == 'keep-alive' if version == 'HTTP/1.0' else conn != 'close'
+        if status in (204, 304) or 100 <= status < 200:
+            return status, 0, first, reusable
+        if headers.get('transfer-encoding') == 'chunked':
+            return status, self._read_chunked(body), first, reusable
+        if 'content-length' in headers:
+            remaining = int(headers['content-length']) - len(body)
+            nbytes = len(body)
+            while remaining > 0:
+                data = sock.recv(min(RECV_SIZE, remaining))
+                if not data:
+                    raise FetchError('connection closed mid-body')
+                nbytes += len(data)
+                remaining -= len(data)
+            return status, nbytes, first, reusable
+        # No length: the body runs until the server closes
+        nbytes = len(body)
+        while True:
+            data = sock.recv(RECV_SIZE)
+            if not data:
+                return status, nbytes, first, False
+            nbytes += len(data)
+
+    def _read_chunked(self, buf):
+        sock = self.sock
+        nbytes = 0
+
+        def fill(need):
+            nonlocal buf
+            while len(buf) < need:
+                data = sock.recv(RECV_SIZE)
+                if not data:
+                    raise FetchError('connection closed mid-chunk')
+                buf += data
+
+        while True:
+            while b'\r\n' not in buf:
+                fill(len(buf) + 1)
+            line, buf = buf.split(b'\r\n', 1)
+            size = int(line.split(b';')[0], 16)
+            if size == 0:
+                # skip trailers up to the blank line
+                while not buf.startswith(b'\r\n') and b'\r\n\r\n' not in buf:
+                    fill(len(buf) + 1)
+                return nbytes
+            fill(size + 2)
+            nbytes += size
+            buf = buf[size + 2:]
+
+
+def format_sample(epoch, total, connect, ttfb, nbytes, status):
+    return '%f,%f,%f,%f,%d,%d\n' % (epoch, total, connect, ttfb, nbytes, status)
+
+
+def parse_sample(line):
+    '''Inverse of format_sample; also accepts the old two-column lines.'''
+    fields = line.strip().split(',')
+    values = [float(fields[0]), float(fields[1])]
+    if len(fields) >= 6:
+        values += [float(fields[2]), float(fields[3]), int(fields[4]), int(fields[5])]
+    else:
+        values += [NAN, NAN, -1, 200]
+    return tuple(values)
+
+
+def run(url, interval, duration, emit, keepalive=True, timeout=10.0, stop=None):
+    '''Fetches url every interval seconds (on a fixed schedule; a fetch that
+    overruns pushes the next one back rather than causing a burst) until
+    duration elapses or stop is set, calling emit(line) per sample.'''
+    stop = stop or threading.Event()
+    probe = Probe(url, keepalive, timeout)
+    start = time.monotonic()
+    deadline = start
+    try:
+        while not stop.is_set():
+            now = time.monotonic()
+            if duration is not None and now - start >= duration:
+                break
+            if deadline > now:
+                if stop.wait(deadline - now):
+                    break
+            epoch = time.time()
+            try:
+                sample = probe.fetch()
+            except (OSError, FetchError, ValueError):
+                sample = (NAN, NAN, NAN, 0, -1)
+            emit(format_sample(epoch, *sample))
+            deadline = max(deadline + interval, time.monotonic())
+    finally:
+        probe.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time repeated HTTP fetches of one URL")
+    parser.add_argument('url')
+    parser.add_argument('--interval', '-i', type=float, default=1.0,
+                        help="Seconds between fetch starts, per worker")
+    parser.add_argument('--duration', '-t', type=float, default=None,
+                        help="Stop after this many seconds (default: until killed)")
+    parser.add_argument('--workers', '-n', type=int, default=1,
+                        help="Concurrent fetch loops, each on its own connection")
+    parser.add_argument('--fresh', action='store_true',
+                        help="Open a new connection for every fetch (like curl)")
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--out', '-o', default=None,
+                        help="Also append samples to this file")
+    args = parser.parse_args()
+
+    out = open(args.out, 'a') if args.out else None
+    lock = threading.Lock()
+
+    def emit(line):
+        with lock:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+            if out is not None:
+                out.write(line)
+                out.flush()
+
+    stop = threading.Event()
+    threads = []
+    for i in range(args.workers):
+        t = threading.Thread(target=run, args=(args.url, args.interval, args.duration, emit,
+                                               not args.fresh, args.timeout, stop))
+        t.daemon = True
+        t.start()
+        threads.append(t)
+        # stagger workers across the interval so their fetches interleave
+        if i + 1 < args.workers:
+            time.sleep(args.interval / args.workers)
+    try:
+        for t in threads:
+            # join with a timeout so Ctrl-C is still delivered
+            while t.is_alive():
+                t.join(0.2)
+    except KeyboardInterrupt:
+        stop.set()
+    finally:
+        if out is not None:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+'''
+Multi-flow traffic for the bufferbloat topology.
+
+A sink runs on the receiver and the generator on the sender:
+
+    h2$ python3 workload.py sink --port 5002
+    h1$ python3 workload.py gen 10.0.0.2 --bulk 4 --bulk-cc reno,bbr \\
+            --short-rate 5 --sizes web --duration 60 --out flows.txt
+
+Bulk flows are long-lived and each picks its congestion control with
+TCP_CONGESTION (cycling through --bulk-cc), so reno and bbr flows can share
+the bottleneck.  Short flows arrive as a Poisson process of --short-rate
+flows per second, with sizes drawn from --sizes:
+
+    web           empirical web-search flow sizes (mostly a few KB, tail to 30 MB)
+    fixed:N       always N bytes
+    pareto:M,A    Pareto with mean M bytes and shape A
+
+Every flow sends an 8-byte length and its payload; the sink answers with
+the byte count it received once the payload (or, for bulk flows, the
+sender's shutdown) is in.  A flow is complete when that answer arrives.
+One line per flow goes to --out:
+
+    kind,id,cc,size,start,fct,received
+
+where start is epoch seconds, fct is seconds and size is -1 for bulk
+flows.  Failed flows have fct nan.  summarize() turns that file into
+goodput, Jain's fairness index for the bulk flows and FCT percentiles by
+size class for the short ones.
+
+With --tcpinfo DIR the generator also samples TCP_INFO of its own
+sockets (cwnd, RTT, delivery and pacing rate per flow) into a tcpinfo.py
+series, without forking ss.
+'''
+
+import argparse
+import asyncio
+import bisect
+import math
+import random
+import socket
+import struct
+import sys
+import time
+
+NAN = float('nan')
+PORT = 5002
+CHUNK = 1 << 16
+BULK = struct.pack('!q', -1)
+
+# Web-search workload flow size CDF (bytes, cumulative probability), as
+# used in the DCTCP and pFabric evaluations.
+WEB_CDF = [(6e3, 0.15), (13e3, 0.2), (19e3, 0.3), (33e3, 0.4), (53e3, 0.53),
+           (133e3, 0.6), (667e3, 0.7), (1.3e6, 0.8), (3.3e6, 0.9),
+           (6.7e6, 0.97), (20e6, 0.99), (30e6, 1.0)]
+
+# Short-flow size classes for the FCT report
+SIZE_CLASSES = [(0, 100e3, '<100KB'), (100e3, 1e6, '100KB-1MB'), (1e6, float('inf'), '>1MB')]
+
+
+def size_sampler(spec, rng):
+    '''Returns a function drawing one flow size (bytes) per call.'''
+    kind, _, arg = spec.partition(':')
+    if kind == 'web':
+        sizes = [s for s, _ in WEB_CDF]
+        probs = [p for _, p in WEB_CDF]
+        return lambda: int(sizes[min(bisect.bisect_left(probs, rng.random()), len(sizes) - 1)])
+    if kind == 'fixed':
+        n = int(float(arg))
+        return lambda: n
+    if kind == 'pareto':
+        mean, shape = [float(v) for v in arg.split(',')]
+        scale = mean * (shape - 1) / shape
+        return lambda: int(scale * rng.paretovariate(shape))
+    raise ValueError('unknown size distribution: %s' % spec)
+
+
+# ---------------------------------------------------------------- sink
+
+async def sink_conn(reader, writer):
+    try:
+        header = await reader.readexactly(8)
+        (size,) = struct.unpack('!q', header)
+        received = 0
+        while size < 0 or received < size:
+            data = await reader.read(CHUNK if size < 0 else min(CHUNK, size - received))
+            if not data:
+                break
+            received += len(data)
+        writer.write(struct.pack('!q', received))
+        await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def run_sink(port):
+    server = await asyncio.start_server(sink_conn, None, port, reuse_address=True, backlog=1024)
+    print('workload sink on port %d' % port)
+    sys.stdout.flush()
+    async with server:
+        await server.serve_forever()
+
+
+# ----------------------------------------------------------- generator
+
+async def open_flow(host, port, cc):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if cc:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CONGESTION, cc.encode())
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, (host, port))
+    return await asyncio.open_connection(sock=sock)
+
+
+async def flow(host, port, cc, size, stop, timeout, sampler=None):
+    '''One flow; returns (fct, received).  size < 0 sends until stop.  The
+    socket is registered with sampler (a tcpinfo.SocketSampler) if given.'''
+    start = time.perf_counter()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(open_flow(host, port, cc), timeout)
+        if sampler is not None:
+            sampler.add(writer.get_extra_info('socket'))
+        writer.write(BULK if size < 0 else struct.pack('!q', size))
+        payload = bytes(CHUNK)
+        sent = 0
+        while (size < 0 and not stop.is_set()) or (0 <= size and sent < size):
+            n = CHUNK if size < 0 else min(CHUNK, size - sent)
+            writer.write(payload[:n])
+            await writer.drain()
+            sent += n
+        if size < 0:
+            writer.write_eof()
+        (received,) = struct.unpack('!q', await asyncio.wait_for(reader.readexactly(8), timeout))
+        return time.perf_counter() - start, received
+    except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+        return NAN, 0
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def format_flow(kind, fid, cc, size, start, fct, received):
+    return '%s,%d,%s,%d,%f,%f,%d\n' % (kind, fid, cc or '-', size, start, fct, received)
+
+
+async def generate(args, out):
+    rng = random.Random(args.seed)
+    sizes = size_sampler(args.sizes, rng)
+    ccs = [c for c in args.bulk_cc.split(',') if c] if args.bulk_cc else [None]
+    stop = asyncio.Event()
+    tasks = []
+    sampler = monitor = None
+    if args.tcpinfo:
+        import tcpinfo
+        sampler = tcpinfo.SocketSampler()
+        monitor = asyncio.get_running_loop().run_in_executor(
+            None, tcpinfo.monitor_tcpinfo, sampler, args.tcpinfo_interval, args.tcpinfo)
+
+    async def record(kind, fid, cc, size):
+        start = time.time()
+        fct, received = await flow(args.host, args.port, cc, size, stop, args.timeout,
+                                   sampler)
+        out.write(format_flow(kind, fid, cc, size, start, fct, received))
+        out.flush()
+
+    try:
+        for i in range(args.bulk):
+            tasks.append(asyncio.ensure_future(record('bulk', i, ccs[i % len(ccs)], -1)))
+
+        end = time.monotonic() + args.duration
+        fid = 0
+        if args.short_rate > 0:
+            while True:
+                wait = rng.expovariate(args.short_rate)
+                if time.monotonic() + wait >= end:
+                    break
+                await asyncio.sleep(wait)
+                tasks.append(asyncio.ensure_future(record('short', fid, args.short_cc, sizes())))
+                fid += 1
+        await asyncio.sleep(max(0.0, end - time.monotonic()))
+        stop.set()
+        # short flows still in flight get a grace period to finish
+        if tasks:
+            await asyncio.wait(tasks, timeout=args.timeout)
+    finally:
+        if monitor is not None:
+            # the sampling thread stops after its current sample
+            sampler.stop()
+            await monitor
+
+
+# ------------------------------------------------------------- reports
+
+def read_flows(fname):
+    flows = []
+    with open(fname) as f:
+        for line in f:
+            fields = line.strip().split(',')
+            if len(fields) != 7:
+                continue
+            flows.append({'kind': fields[0], 'id': int(fields[1]), 'cc': fields[2],
+                          'size': int(fields[3]), 'start': float(fields[4]),
+                          'fct': float(fields[5]), 'received': int(fields[6])})
+    return flows
+
+
+def summarize(flows):
+    '''Bulk goodput and fairness, and short-flow FCT percentiles by size class.'''
+    import stats
+    result = {}
+    bulk = [f for f in flows if f['kind'] == 'bulk' and not math.isnan(f['fct'])]
+    if bulk:
+        goodput = [8 * f['received'] / f['fct'] / 1e6 for f in bulk]
+        result['bulk'] = {'n': len(bulk), 'goodput_mbps': goodput,
+                          'jain': stats.jain_index(goodput),
+                          'by_cc': dict((cc, sum(g for f, g in zip(bulk, goodput) if f['cc'] == cc))
+                                        for cc in sorted(set(f['cc'] for f in bulk)))}
+    short = [f for f in flows if f['kind'] == 'short']
+    if short:
+        done = [f for f in short if not math.isnan(f['fct'])]
+        result['short'] = {'n': len(short), 'failed': len(short) - len(done)}
+        for lo, hi, name in SIZE_CLASSES:
+            fcts = [f['fct'] for f in done if lo <= f['size'] < hi]
+            if fcts:
+                p50, p99 = stats.quantiles(fcts, (0.5, 0.99))
+                result['short'][name] = {'n': len(fcts), 'p50': p50, 'p99': p99,
+                                         'mean': stats.mean(fcts)}
+    return result
+
+
+def format_summary(summary):
+    lines = []
+    if 'bulk' in summary:
+        b = summary['bulk']
+        lines.append('bulk flows: %d, goodput %s Mb/s, Jain index %.3f' % (
+            b['n'], ' '.join('%.2f' % g for g in b['goodput_mbps']), b['jain']))
+        for cc, total in b['by_cc'].items():
+            lines.append('    %s: %.2f Mb/s total' % (cc, total))
+    if 'short' in summary:
+        s = summary['short']
+        lines.append('short flows: %d (%d failed)' % (s['n'], s['failed']))
+        for _, _, name in SIZE_CLASSES:
+            if name in s:
+                c = s[name]
+                lines.append('    %-10s n=%-5d FCT p50 %.3fs p99 %.3fs' % (name, c['n'], c['p50'], c['p99']))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk and short-flow TCP workload")
+    sub = parser.add_subparsers(dest='mode')
+    sub.required = True
+
+    p = sub.add_parser('sink', help="Receive flows (run on the receiver)")
+    p.add_argument('--port', type=int, default=PORT)
+
+    p = sub.add_parser('gen', help="Generate flows towards a sink")
+    p.add_argument('host')
+    p.add_argument('--port', type=int, default=PORT)
+    p.add_argument('--bulk', type=int, default=1, help="Number of long-lived flows")
+    p.add_argument('--bulk-cc', default='',
+                   help="Comma-separated congestion controls, cycled over bulk flows")
+    p.add_argument('--short-rate', type=float, default=0.0,
+                   help="Short flow arrivals per second (Poisson)")
+    p.add_argument('--short-cc', default=None, help="Congestion control for short flows")
+    p.add_argument('--sizes', default='web', help="Short flow size distribution")
+    p.add_argument('--duration', '-t', type=float, default=10.0)
+    p.add_argument('--timeout', type=float, default=30.0,
+                   help="Seconds a flow may take to connect and to get the sink's "
+                        "answer once sent, and the grace period after --duration")
+    p.add_argument('--seed', type=int, default=None)
+    p.add_argument('--out', '-o', default=None, help="Flow records (default stdout)")
+    p.add_argument('--tcpinfo', default=None, metavar='DIR',
+                   help="Sample TCP_INFO of every flow into this series directory")
+    p.add_argument('--tcpinfo-interval', type=float, default=0.01,
+                   help="Seconds between TCP_INFO samples")
+
+    p = sub.add_parser('report', help="Summarise a flow record file")
+    p.add_argument('file')
+
+    args = parser.parse_args()
+    if args.mode == 'sink':
+        try:
+            asyncio.run(run_sink(args.port))
+        except KeyboardInterrupt:
+            pass
+    elif args.mode == 'gen':
+        out = open(args.out, 'w') if args.out else sys.stdout
+        asyncio.run(generate(args, out))
+        if args.out:
+            out.close()
+            print(format_summary(summarize(read_flows(args.out))))
+    else:
+        print(format_summary(summarize(read_flows(args.file))))
+
+
+if __name__ == '__main__':
+    main()
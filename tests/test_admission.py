@@ -0,0 +1,128 @@
+import sys
+sys.path.append("./src/project2")
+from types import SimpleNamespace
+import pytest
+import admission
+from admission import TokenBucket, PacketInGuard, guard_options
+
+
+class ofp_match(object):
+  def __init__(self, **fields):
+    self.__dict__.update(fields)
+
+
+class ofp_flow_mod(object):
+  pass
+
+
+OF = SimpleNamespace(ofp_match=ofp_match, ofp_flow_mod=ofp_flow_mod)
+
+
+class Clock(object):
+  def __init__(self):
+    self.now = 100.0
+
+  def __call__(self):
+    return self.now
+
+
+class Connection(object):
+  def __init__(self):
+    self.sent = []
+
+  def send(self, msg):
+    self.sent.append(msg)
+
+
+def event(src, port=1):
+  return SimpleNamespace(parsed=SimpleNamespace(src=src), port=port)
+
+
+def guard(**kw):
+  clock = Clock()
+  g = PacketInGuard(Connection(), clock=clock, of=OF, **kw)
+  return g, clock
+
+
+def test_token_bucket_burst_and_refill():
+  bucket = TokenBucket(10.0, 3.0, now=0.0)
+  assert [bucket.consume(0.0) for _ in range(4)] == [True, True, True, False]
+  assert not bucket.consume(0.05)
+  assert bucket.consume(0.1)
+  # refill never goes past the burst
+  assert not bucket.full(0.2) and bucket.full(1.0)
+  assert [bucket.consume(10.0) for _ in range(4)] == [True, True, True, False]
+
+
+def test_admit_within_budget():
+  g, clock = guard(source_rate=10, source_burst=5)
+  for i in range(50):
+    assert g.admit(event("a"))
+    clock.now += 0.1
+  assert g.admitted == 50 and g.rejected == 0 and g.connection.sent == []
+
+
+def test_block_installs_drop_rule_then_expires():
+  g, clock = guard(source_rate=10, source_burst=5, block_seconds=7)
+  assert [g.admit(event("a", port=3)) for _ in range(6)] == [True] * 5 + [False]
+  fm, = g.connection.sent
+  assert fm.priority == admission.BLOCK_PRIORITY and fm.hard_timeout == 7
+  assert vars(fm.match) == {"in_port": 3, "dl_src": "a"}
+  assert not hasattr(fm, "actions") or not fm.actions
+  # stragglers while blocked are rejected without another rule; other
+  # sources are unaffected
+  clock.now += 6.9
+  assert not g.admit(event("a", port=3))
+  assert g.admit(event("b"))
+  assert len(g.connection.sent) == 1 and g.blocks == 1 and g.rejected == 2
+  # the switch rule has timed out; the bucket has refilled meanwhile
+  clock.now += 0.1
+  assert g.admit(event("a", port=3))
+  assert "a" not in g.blocked
+
+
+def test_switch_budget_rejects_without_blocking():
+  g, clock = guard(switch_rate=10, switch_burst=2, source_rate=None)
+  assert [g.admit(event(i)) for i in range(3)] == [True, True, False]
+  assert g.connection.sent == [] and g.blocked == {}
+  clock.now += 0.2
+  assert g.admit(event(3))
+
+
+def test_forwarding_defaults_never_block():
+  g, clock = guard(**guard_options(admission.FORWARDING))
+  assert g.switch_bucket is None
+  assert all(g.admit(event("a")) for _ in range(10000))
+  assert g.connection.sent == [] and g.rejected == 0
+
+
+def test_guard_options_parse_pox_strings():
+  assert guard_options(source_rate="50", switch_rate="off", block_seconds="2.5",
+                       sample_every="10") == {"source_rate": 50.0, "switch_rate": None,
+                                              "block_seconds": 2, "sample_every": 10}
+  # explicit options override the defaults
+  assert guard_options(admission.FORWARDING, source_rate="100") == {
+    "source_rate": 100.0, "switch_rate": None}
+  assert guard_options(source_rate="0") == {"source_rate": None}
+  with pytest.raises(TypeError):
+    guard_options(policy="x")
+
+
+def test_sample_one_in_n():
+  g, clock = guard(sample_every=3, source_rate=None, switch_rate=None)
+  sampled = []
+  for _ in range(9):
+    g.admit(event("a"))
+    sampled.append(g.sample())
+  assert sampled == [True, False, False] * 3
+
+
+def test_sample_every_zero_is_off():
+  assert guard_options(sample_every="0") == {"sample_every": None}
+  assert guard_options(sample_every="off") == {"sample_every": None}
+  with pytest.raises(ValueError):
+    guard_options(sample_every="-1")
+  for every in (None, 0):
+    g, clock = guard(sample_every=every, source_rate=None, switch_rate=None)
+    assert g.admit(event("a"))
+    assert not g.sample()
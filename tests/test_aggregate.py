@@ -0,0 +1,48 @@
+import sys
+sys.path.append("./src/project3")
+import json
+import os
+import aggregate
+
+
+def write_run(run_dir, qlen=(1, 5, 9)):
+  os.makedirs(str(run_dir), exist_ok=True)
+  (run_dir / "q.txt").write_text("".join("%d.0,%d\n" % (i, q) for i, q in enumerate(qlen)))
+  (run_dir / "fetch.txt").write_text("1.0,0.5\n2.0,1.5\n")
+  return str(run_dir)
+
+
+def test_find_input_prefers_series(tmp_path):
+  run = write_run(tmp_path / "reno-q20")
+  assert aggregate.find_input(run, "q") == os.path.join(run, "q.txt")
+  assert aggregate.find_input(run, "ping") is None
+  os.mkdir(os.path.join(run, "q.ts"))
+  assert aggregate.find_input(run, "q") == os.path.join(run, "q.ts")
+  assert aggregate.run_params(run) == {"cong": "reno", "maxq": 20, "qdisc": "fifo"}
+
+
+def test_summary_cached_until_inputs_change(tmp_path, monkeypatch):
+  run = write_run(tmp_path / "bbr-q100")
+  calls = []
+  compute = aggregate.compute_summary
+  monkeypatch.setattr(aggregate, "compute_summary",
+                      lambda inputs: calls.append(1) or compute(inputs))
+  first = aggregate.load_run(run)
+  assert first["summary"]["fetch"]["mean"] == 1.0
+  assert first["summary"]["q"]["p50"] == 5
+  with open(os.path.join(run, aggregate.CACHE_NAME)) as f:
+    assert json.load(f)["version"] == aggregate.CACHE_VERSION
+  assert aggregate.load_run(run)["summary"] == first["summary"] and len(calls) == 1
+  # a grown input is summarised again
+  with open(os.path.join(run, "q.txt"), "a") as f:
+    f.write("3.0,100\n4.0,100\n")
+  assert aggregate.load_run(run)["summary"]["q"]["max"] == 100 and len(calls) == 2
+  aggregate.load_run(run, refresh=True)
+  assert len(calls) == 3
+
+
+def test_corrupt_cache_is_recomputed(tmp_path):
+  run = write_run(tmp_path / "reno-q10")
+  with open(os.path.join(run, aggregate.CACHE_NAME), "w") as f:
+    f.write("{not json")
+  assert aggregate.load_run(run)["summary"]["fetch"]["failed"] == 0
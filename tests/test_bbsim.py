@@ -0,0 +1,66 @@
+import sys
+sys.path.append("./src/project3")
+import pytest
+import bbsim
+
+
+def test_rtt_grows_with_the_queue():
+  small = bbsim.Sim("reno", maxq=10, duration=10).run().summary()
+  large = bbsim.Sim("reno", maxq=100, duration=10).run().summary()
+  # the link stays busy either way...
+  assert small["utilization"] > 0.95 and large["utilization"] > 0.95
+  assert small["utilization"] <= 1.0 and large["utilization"] <= 1.0
+  # ...but the bigger buffer fills up and the RTT grows with it
+  assert small["q_max"] == 10 and large["q_max"] == 100
+  assert large["q_mean"] > 5 * small["q_mean"]
+  assert large["rtt_p50"] > 4 * small["rtt_p50"]
+  # a full 100 packet queue is ~800 ms at 1.5 Mb/s
+  assert 700 < large["rtt_p99"] < 900
+
+
+def test_reno_run_writes_monitor_and_ping_output(tmp_path):
+  sim = bbsim.Sim("reno", maxq=20, duration=2).run()
+  sim.write(str(tmp_path), epoch=1000.0)
+  q = (tmp_path / "q.txt").read_text().splitlines()
+  assert len(q) == len(sim.q_samples) and q[0].startswith("1000.000000,")
+  ping = (tmp_path / "ping.txt").read_text().splitlines()
+  assert ping[0].startswith("PING") and len(ping) == len(sim.pings) + 1
+
+
+def test_unknown_cong_rejected_before_building_flows():
+  with pytest.raises(ValueError):
+    bbsim.Sim("cubic", flows=10 ** 7)
+
+
+def test_bbr_keeps_the_queue_short_whatever_the_buffer():
+  small = bbsim.Sim("bbr", maxq=20, duration=10).run().summary()
+  large = bbsim.Sim("bbr", maxq=100, duration=10).run().summary()
+  reno = bbsim.Sim("reno", maxq=100, duration=10).run().summary()
+  for s in (small, large):
+    assert s["utilization"] > 0.95
+    # paced at the bottleneck rate, it never fills even the small buffer
+    assert s["drops"] == 0 and s["q_max"] < 20
+    assert s["q_mean"] < 3
+  # more buffer does not turn into more delay, unlike Reno
+  assert large["rtt_p50"] == pytest.approx(small["rtt_p50"], rel=0.1)
+  assert large["rtt_p50"] < 50 and reno["rtt_p50"] > 5 * large["rtt_p50"]
+
+
+def test_sweep_subcommand(tmp_path, monkeypatch, capsys):
+  csv = tmp_path / "sweep.csv"
+  monkeypatch.setattr(sys, "argv", ["bbsim.py", "sweep", "--cong", "reno", "bbr",
+                                    "--maxq", "20", "100", "--time", "3", "--jobs", "1",
+                                    "--csv", str(csv)])
+  bbsim.main()
+  lines = capsys.readouterr().out.splitlines()
+  assert lines[0].split() == bbsim.COLUMNS
+  rows = [dict(zip(bbsim.COLUMNS, l.split())) for l in lines[1:5]]
+  assert [(r["cong"], r["maxq"]) for r in rows] == [
+    ("reno", "20"), ("reno", "100"), ("bbr", "20"), ("bbr", "100")]
+  assert lines[5].startswith("4 points in ")
+  # the bbr rows stay short where the reno ones fill the buffer
+  assert all(float(r["q_max"]) < 20 for r in rows[2:])
+  assert float(rows[1]["q_max"]) == 100
+  table = csv.read_text().splitlines()
+  assert table[0] == ",".join(bbsim.COLUMNS) and len(table) == 5
+  assert [l.split(",") for l in table[1:]] == [[r[c] for c in bbsim.COLUMNS] for r in rows]
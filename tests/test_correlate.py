@@ -0,0 +1,26 @@
+import sys
+sys.path.append("./src/project3")
+import numpy as np
+import correlate
+
+
+def test_interp_at():
+  tx = np.array([0.0, 1.0, 2.0, 10.0])
+  x = np.array([0.0, 10.0, 20.0, 0.0])
+  got = correlate.interp_at([-1, 0, 0.5, 2.0, 3.0, 10.0, 11.0], tx, x, max_gap=1.0)
+  # outside the trace and across the 2..10 gap there is nothing to say
+  assert np.array_equal(got, [np.nan, 0, 5, 20, np.nan, 0, np.nan], equal_nan=True)
+
+
+def test_recovers_queueing_delay_and_lag():
+  qt = np.arange(0, 600, 0.01)
+  qlen = np.round(50 + 50 * np.sin(qt / 7))
+  pt = np.arange(0.05, 600, 0.1)
+  # replies stamped 0.3 s after the queue they saw, base RTT 20 ms, a few lost
+  rtt = 20 + correlate.queue_delay_ms(np.interp(pt - 0.3, qt, qlen), 1.5)
+  rtt[::37] = np.nan
+  r = correlate.correlate(qt, qlen, pt, rtt, 1.5, base_rtt=20.0)
+  assert r['lost'] == len(pt[::37])
+  assert abs(r['lag_sec'] - 0.3) < 1e-6
+  assert r['lag_corr'] > 0.999 and r['corr'] < r['lag_corr']
+  assert abs(r['slope'] - 1) < 0.01 and abs(r['intercept_ms']) < 1
@@ -0,0 +1,65 @@
+import sys
+sys.path.append("./src/project3")
+import numpy as np
+import decimate
+
+
+def trace(n=200000, seed=3):
+  rng = np.random.default_rng(seed)
+  t = 1000.0 + np.arange(n) * 0.01
+  y = rng.integers(0, 50, n).astype(float)
+  y[rng.choice(n, 10, replace=False)] = 1000
+  return t, y
+
+
+def test_m4_keeps_pixel_extremes():
+  t, y = trace()
+  width = 300
+  m4 = decimate.M4(width, (t[0], t[-1]))
+  for i in range(0, len(t), 7919):
+    m4.add(t[i:i + 7919], y[i:i + 7919])
+  dt, dy = m4.result()
+  assert len(dt) <= 4 * width and np.all(np.diff(dt) >= 0)
+  edges = np.linspace(t[0], t[-1], width + 1)
+  full = np.clip(np.searchsorted(edges, t, 'right') - 1, 0, width - 1)
+  kept = np.clip(np.searchsorted(edges, dt, 'right') - 1, 0, width - 1)
+  for agg, init in ((np.maximum, -1.0), (np.minimum, 1e9)):
+    want, got = np.full(width, init), np.full(width, init)
+    agg.at(want, full, y)
+    agg.at(got, kept, dy)
+    assert np.array_equal(want, got)
+
+
+def test_m4_unknown_span_merges():
+  t, y = trace(50000)
+  m4 = decimate.M4(100)
+  for i in range(0, len(t), 1000):
+    m4.add(t[i:i + 1000], y[i:i + 1000])
+  dt, dy = m4.result()
+  assert len(dt) <= 4 * 200
+  assert dt[0] == t[0] and dt[-1] == t[-1]
+  # every spike survives, no more than a bin away from where it was
+  peaks = dt[dy == 1000]
+  bin_width = (t[-1] - t[0]) / 100
+  for ts in t[y == 1000]:
+    assert np.min(np.abs(peaks - ts)) <= bin_width
+
+
+def test_m4_odd_width_past_known_span():
+  # samples beyond the span halve the resolution; 301 bins don't pair up
+  t = np.arange(0, 12, 0.01)
+  y = np.sin(t)
+  y[700] = 5.0
+  m4 = decimate.M4(301, (0, 10))
+  m4.add(t, y)
+  dt, dy = m4.result()
+  assert dt[0] == t[0] and dt[-1] == t[-1] and np.all(np.diff(dt) >= 0)
+  # the spike is kept, within one (merged) bin of where it was
+  assert dy.max() == 5.0 and abs(dt[dy == 5.0][0] - t[700]) <= 2 * 10 / 301
+  assert dy.min() == y.min()
+  # merging keeps an odd count working when it happens more than once
+  m4 = decimate.M4(7)
+  for i in range(0, len(t), 100):
+    m4.add(t[i:i + 100], y[i:i + 100])
+  dt, dy = m4.result()
+  assert dt[-1] == t[-1] and dy.max() == 5.0
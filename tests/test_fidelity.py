@@ -0,0 +1,35 @@
+import sys
+sys.path.append("./src/project3")
+import numpy as np
+import fidelity
+
+STAT_0 = """cpu  100 0 100 800 0 0 0 0 0 0
+cpu0 90 0 10 0 0 0 0 0 0 0
+cpu1 10 0 90 800 0 0 0 0 0 0
+intr 1 2 3
+"""
+
+STAT_1 = """cpu  200 0 150 850 0 0 0 0 0 0
+cpu0 190 0 10 0 0 0 0 0 0 0
+cpu1 10 0 140 850 0 0 0 0 0 0
+"""
+
+
+def test_cpu_busy():
+  prev, cur = fidelity.parse_proc_stat(STAT_0), fidelity.parse_proc_stat(STAT_1)
+  assert sorted(cur) == ['cpu', 'cpu0', 'cpu1']
+  busy, busiest = fidelity.cpu_busy(prev, cur)
+  assert abs(busy - 150 / 200.0) < 1e-9
+  assert busiest == 1.0
+
+
+def test_backlogged_rate():
+  t = np.arange(0, 5.01, 0.5)
+  # 1 Mb/s while the queue stands, 0.1 Mb/s otherwise
+  rate = np.where(t[:-1] < 2, 1e6, 1e5) / 8 * 0.5
+  tx = np.concatenate([[0], np.cumsum(rate)])
+  qt = np.array([0, 2, 2.01, 5])
+  qlen = np.array([50, 50, 0, 0])
+  bps, seconds = fidelity.backlogged_rate(t, tx, qt, qlen)
+  assert seconds == 2.0
+  assert abs(bps - 1e6) < 1e-6
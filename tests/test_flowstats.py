@@ -0,0 +1,31 @@
+import sys
+sys.path.append("./src/project2")
+from flowstats import RingSeries
+
+
+def test_ring_series_wraps_and_keeps_newest():
+  series = RingSeries(4)
+  assert series.rate() == 0.0 and series.samples() == []
+  for t in range(10):
+    series.append(float(t), 100 * t)
+  assert series.count == 4 and series.last() == 900
+  assert series.samples() == [(6.0, 600), (7.0, 700), (8.0, 800), (9.0, 900)]
+  # the rate is over the window still held, 6 s .. 9 s
+  assert series.rate() == 100.0
+
+
+def test_ring_series_resets_when_counter_goes_back():
+  series = RingSeries(3)
+  for t, value in ((0.0, 10), (1.0, 20), (2.0, 30), (3.0, 40)):
+    series.append(t, value)
+  series.append(4.0, 5)
+  assert series.samples() == [(4.0, 5)] and series.rate() == 0.0
+  series.append(6.0, 25)
+  assert series.rate() == 10.0
+
+
+def test_ring_series_no_elapsed_time():
+  series = RingSeries(2)
+  series.append(1.0, 0)
+  series.append(1.0, 50)
+  assert series.rate() == 0.0
@@ -0,0 +1,96 @@
+import sys
+sys.path.append("./src/project3")
+import asyncio
+import os
+import socket
+import stat
+import subprocess
+import live
+
+
+def test_window_feed():
+  w = live.Window(window_sec=10)
+  # the pid is the sender's, not the one in the text
+  w.feed(b'run 7 /tmp/reno-q100\n', pid=42)
+  w.feed(b'q 100.0 5\nq 105.0 7\nrtt 105.0 nan\nbogus\nq x 1\n')
+  w.feed(b'q 112.0 9\nfetch 112.5 0.25\n')
+  assert w.run == {'pid': 42, 'dir': '/tmp/reno-q100'}
+  # older than the window behind the newest sample
+  assert w.snapshot()['q'] == [(105.0, 7.0), (112.0, 9.0)]
+  assert w.snapshot()['rtt'] == [(105.0, None)]
+  assert sorted(w.take_new()) == ['fetch', 'q', 'rtt']
+  assert w.take_new() == {}
+
+
+def test_follow_waits_for_whole_lines(tmp_path):
+  path = tmp_path / 'ping.txt'
+  out = open(path, 'w')
+  f = open(path)
+  writes = iter(['[1.0] 64 bytes', ' ok\n[2.0] more\n'])
+  done = []
+
+  def stopped():
+    # called whenever the reader catches up with the writer
+    try:
+      out.write(next(writes))
+      out.flush()
+    except StopIteration:
+      done.append(True)
+    return bool(done)
+
+  assert list(live.follow(f, stopped, poll_sec=0)) == ['[1.0] 64 bytes ok\n', '[2.0] more\n']
+
+
+def test_socket_gives_the_senders_pid(tmp_path):
+  path = str(tmp_path / 'live.sock')
+  sock = live.bind_socket(path)
+  assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+  w = live.Window()
+  pub = live.Publisher(path)
+  pub.send_raw(b'run 1 /tmp/forged\n')
+  pub.close()
+  live.receive(sock, w)
+  sock.close()
+  assert w.run == {'pid': os.getpid(), 'dir': '/tmp/forged'}
+
+
+def post_abort(viewer, headers):
+  async def main():
+    srv = await asyncio.start_server(viewer.handle, '127.0.0.1', 0)
+    async with srv:
+      port = srv.sockets[0].getsockname()[1]
+      reader, writer = await asyncio.open_connection('127.0.0.1', port)
+      lines = ['POST /abort HTTP/1.1', 'Host: 127.0.0.1:%d' % port]
+      lines += ['%s: %s' % (k, v.replace('PORT', str(port))) for k, v in headers]
+      writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+      data = await reader.read()
+      writer.close()
+      return int(data.split()[1])
+  return asyncio.run(main())
+
+
+def test_abort_checks(tmp_path):
+  script = tmp_path / 'bufferbloat.py'
+  script.write_text('import time\ntime.sleep(30)\n')
+  run = subprocess.Popen([sys.executable, str(script)])
+  try:
+    w = live.Window()
+    viewer = live.Viewer(w, allow_abort=True)
+    assert '__TOKEN__' in live.PAGE
+    token = ('X-Abort-Token', viewer.token)
+    w.feed(b'run 0 /tmp/x\n', pid=run.pid)
+    assert post_abort(viewer, []) == 403
+    assert post_abort(viewer, [('X-Abort-Token', 'guess')]) == 403
+    assert post_abort(viewer, [token, ('Origin', 'http://evil.example')]) == 403
+    # a pid that is not bufferbloat.py is left alone
+    w.feed(b'run 0 /tmp/x\n', pid=os.getpid())
+    assert post_abort(viewer, [token]) == 409
+    w.feed(b'run 0 /tmp/x\n')
+    assert post_abort(viewer, [token]) == 409
+    w.feed(b'run 0 /tmp/x\n', pid=run.pid)
+    assert run.poll() is None
+    assert post_abort(viewer, [token, ('Origin', 'http://127.0.0.1:PORT')]) == 200
+    assert run.wait(10) == -15
+  finally:
+    run.kill()
+    run.wait()
@@ -0,0 +1,61 @@
+import os
+import sys
+sys.path.append("./src/project3")
+import monitor
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "tc_qdisc_s0-eth2.txt")
+
+
+def test_parse_tc_output():
+  sampler = monitor.TcReplaySampler(FIXTURE)
+  first = sampler.sample()
+  assert [q['kind'] for q in first] == ['htb', 'netem']
+  assert first[1]['parent'] == '5:1'
+  assert first[1]['packets'] == 47 and first[1]['qlen'] == 0
+
+  snapshots = [first]
+  while True:
+    qdiscs = sampler.sample()
+    if qdiscs is None:
+      break
+    snapshots.append(qdiscs)
+  full = snapshots[8][1]
+  assert full['qlen'] == 100
+  assert full['backlog'] == 147 * 1024
+  assert full['drops'] > 0
+
+
+def test_monitor_qlen_replay(tmp_path):
+  out = tmp_path / "q.txt"
+  monitor.monitor_qlen('s0-eth2', 0.001, str(out),
+                       sampler=monitor.TcReplaySampler(FIXTURE))
+  lines = out.read_text().splitlines()
+  assert len(lines) == 12
+  times = [float(l.split(',')[0]) for l in lines]
+  qlens = [int(l.split(',')[1]) for l in lines]
+  assert times == sorted(times)
+  assert qlens[:4] == [0, 3, 11, 27] and max(qlens) == 100
+
+
+AQM_OUTPUT = """\
+qdisc htb 5: root refcnt 2 r2q 10 default 0x1 direct_packets_stat 0 direct_qlen 1000
+ Sent 1520000 bytes 1000 pkt (dropped 0, overlimits 900 requeues 0)
+ backlog 15140b 10p requeues 0
+qdisc netem 10: parent 5:1 limit 100 delay 5ms
+ Sent 1520000 bytes 1000 pkt (dropped 0, overlimits 0 requeues 0)
+ backlog 15140b 10p requeues 0
+qdisc fq_codel 20: parent 10:1 limit 100p flows 1024 quantum 1514 target 5ms interval 100ms memory_limit 32Mb ecn drop_batch 64
+ Sent 1500000 bytes 990 pkt (dropped 7, overlimits 0 requeues 0)
+ backlog 9084b 6p requeues 0
+  maxpacket 1514 drop_overlimit 0 new_flow_count 3 ecn_mark 42
+  new_flows_len 0 old_flows_len 1
+"""
+
+
+def test_parse_tc_aqm():
+  qdiscs = monitor.parse_tc_output(AQM_OUTPUT)
+  aqm = monitor.select_qdisc(qdiscs, qdisc='20:')
+  assert aqm['kind'] == 'fq_codel' and aqm['parent'] == '10:1'
+  assert aqm['qlen'] == 6 and aqm['drops'] == 7 and aqm['marks'] == 42
+  assert monitor.select_qdisc(qdiscs, qdisc='fq_codel') is aqm
+  assert monitor.select_qdisc(qdiscs)['kind'] == 'netem'
@@ -0,0 +1,119 @@
+import sys
+sys.path.append("./src/project2")
+from types import SimpleNamespace
+import ofsim
+
+# Just enough of pox.openflow.libopenflow_01 for FlowTable and SimSwitch
+
+
+class ofp_match(object):
+  def __init__(self, **fields):
+    for name in ("in_port", "dl_type", "nw_proto", "tp_src", "tp_dst",
+                 "dl_src", "dl_dst", "nw_src", "nw_dst"):
+      setattr(self, name, fields.get(name))
+
+  def get_nw_src(self):
+    return (self.nw_src, 32) if self.nw_src else (None, 0)
+
+  def get_nw_dst(self):
+    return (self.nw_dst, 32) if self.nw_dst else (None, 0)
+
+
+class ofp_action_output(object):
+  def __init__(self, port):
+    self.port = port
+
+
+class ofp_flow_mod(object):
+  def __init__(self, match=None, priority=0x8000, actions=(), command=ofsim.OFPFC_ADD,
+               idle_timeout=0, hard_timeout=0):
+    self.match = match or ofp_match()
+    self.priority = priority
+    self.actions = list(actions)
+    self.command = command
+    self.idle_timeout = idle_timeout
+    self.hard_timeout = hard_timeout
+
+
+class ofp_packet_out(object):
+  pass
+
+
+class ofp_packet_in(object):
+  def __init__(self, in_port, data, reason):
+    self.in_port, self.data, self.reason = in_port, data, reason
+
+
+OF = SimpleNamespace(ofp_match=ofp_match, ofp_action_output=ofp_action_output,
+                     ofp_flow_mod=ofp_flow_mod, ofp_packet_out=ofp_packet_out,
+                     ofp_packet_in=ofp_packet_in, OFPR_NO_MATCH=0)
+
+
+def packet(in_port, src, dst, proto=6, dport=80):
+  return ofsim.SimPacket(in_port, 1, 2, ofsim.ETH_IP, ofsim.ip_to_int(src),
+                         ofsim.ip_to_int(dst), proto, 40000, dport)
+
+
+def test_flow_table_priority_delete_and_expiry():
+  table = ofsim.FlowTable()
+  table.apply(ofp_flow_mod(ofp_match(dl_type=ofsim.ETH_IP), 1,
+                           [ofp_action_output(ofsim.OFPP_FLOOD)]))
+  table.apply(ofp_flow_mod(ofp_match(dl_type=ofsim.ETH_IP, nw_dst="10.0.2.20"), 10,
+                           [ofp_action_output(2)], hard_timeout=5))
+  table.apply(ofp_flow_mod(ofp_match(dl_type=ofsim.ETH_IP, nw_proto=1), 20,
+                           [ofp_action_output(0)]))
+  p = packet(1, "10.0.1.10", "10.0.2.20")
+  assert table.lookup(p).outputs == (2,)
+  assert table.lookup(packet(1, "10.0.1.10", "10.0.3.30")).outputs == (ofsim.OFPP_FLOOD,)
+  # output to port 0 is how the controllers drop
+  assert table.lookup(packet(1, "10.0.1.10", "10.0.2.20", proto=1)).outputs == ()
+  assert table.expire(4.9) == [] and len(table) == 3
+  assert [e.priority for e in table.expire(5.0)] == [10]
+  assert table.lookup(p).outputs == (ofsim.OFPP_FLOOD,)
+  table.apply(ofp_flow_mod(ofp_match(), command=ofsim.OFPFC_DELETE))
+  assert len(table) == 0 and table.max_size == 3
+
+
+class StubController(object):
+  '''Installs an exact destination flow for every packet-in.'''
+
+  def __init__(self, connection):
+    self.connection = connection
+    connection.addListeners(self)
+    self.events = []
+
+  def _handle_PacketIn(self, event):
+    self.events.append(event)
+    dst = ofsim.int_to_ip(int.from_bytes(event.data[30:34], "big"))
+    self.connection.send(ofp_flow_mod(ofp_match(dl_type=ofsim.ETH_IP, nw_dst=dst), 100,
+                                      [ofp_action_output(event.port + 1)]))
+
+
+def test_sim_switch_packet_in_then_hit():
+  switch = ofsim.SimSwitch(21, StubController, pox=(OF, bytes))
+  p = packet(3, "10.0.1.10", "10.0.2.20")
+  assert switch.process(p, 0.0) is None
+  entry = switch.process(p, 0.1)
+  assert entry.outputs == (4,) and entry.packets == 1
+  assert switch.outputs[4] == 1
+  report = switch.report(1.0)
+  assert report["packet_ins"] == 1 and report["flow_mods"] == 1
+  assert report["flow_table_size"] == 1 and report["dpid"] == 21
+  event = switch.controller.events[0]
+  assert event.port == 3 and event.dpid == 21
+
+
+def test_microflow_cache_is_bounded_and_kept_without_expiry():
+  table = ofsim.FlowTable(cache_size=4)
+  table.apply(ofp_flow_mod(ofp_match(dl_type=ofsim.ETH_IP), 1,
+                           [ofp_action_output(ofsim.OFPP_FLOOD)], idle_timeout=5))
+  for i in range(10):
+    table.lookup(packet(1, "10.0.1.10", "10.0.2.%d" % i))
+    assert len(table.cache) <= 4
+  assert len(table.cache) == 2
+  # the entry was used since its first deadline: nothing expires and the
+  # cache survives
+  table.entries[0].last_hit = 4.0
+  assert table.expire(5.0) == [] and len(table.cache) == 2
+  assert table.next_expiry == 9.0
+  assert len(table.expire(9.0)) == 1 and table.cache == {}
@@ -0,0 +1,60 @@
+import struct
+import sys
+sys.path.append("./src/project3")
+import pcapflow
+
+H1, H2 = bytes([10, 0, 0, 1]), bytes([10, 0, 0, 2])
+
+
+def frame(src, dst, sport, dport, ipid, seq, ack, payload, flags=0x10, snaplen=96):
+  tcp = struct.pack('!HHIIBBHHH', sport, dport, seq, ack, 5 << 4, flags, 65535, 0, 0)
+  ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(tcp) + payload, ipid, 0x4000,
+                   64, 6, 0, src, dst)
+  eth = b'\x00' * 12 + struct.pack('!H', 0x0800)
+  whole = eth + ip + tcp + b'x' * payload
+  return whole[:snaplen], len(whole)
+
+
+def write_pcap(path, packets, nano=False, cut=0):
+  with open(path, 'wb') as f:
+    f.write(struct.pack('<IHHiIII', 0xa1b23c4d if nano else 0xa1b2c3d4, 2, 4, 0, 0, 96, 1))
+    for t, (data, orig) in packets:
+      sec = int(t)
+      frac = round((t - sec) * (1e9 if nano else 1e6))
+      f.write(struct.pack('<IIII', sec, frac, len(data), orig) + data)
+    if cut:
+      # tcpdump killed half way through a record
+      f.write(struct.pack('<IIII', 99, 0, 60, 60) + b'\x00' * cut)
+
+
+def test_flows_retransmits_and_delay(tmp_path):
+  seq = 0xFFFFF000  # wraps during the flow
+  data = [frame(H1, H2, 40000, 80, 100 + i, (seq + 1000 * i) % (1 << 32), 1, 1000) for i in range(10)]
+  rexmit = frame(H1, H2, 40000, 80, 200, (seq + 3000) % (1 << 32), 1, 1000)
+  ack = frame(H2, H1, 80, 40000, 7, 1, (seq + 10000) % (1 << 32), 0)
+  eth1 = [(10 + 0.01 * i, data[i]) for i in range(10)] + [(10.2, rexmit), (10.31, ack)]
+  # packet 3 is dropped at the bottleneck; its retransmission gets through
+  eth2 = [(10.05 + 0.01 * i, data[i]) for i in range(10) if i != 3] + \
+         [(10.25, rexmit), (10.3, ack)]
+  write_pcap(str(tmp_path / 'in.pcap'), eth1, cut=20)
+  write_pcap(str(tmp_path / 'out.pcap'), sorted(eth2, key=lambda p: p[0]), nano=True)
+
+  r = pcapflow.analyse([str(tmp_path / 'in.pcap'), str(tmp_path / 'out.pcap')],
+                       str(tmp_path / 'owd.ts'))
+  fwd = r['flows']['10.0.0.1:40000>10.0.0.2:80']
+  inside, outside = fwd['captures']
+  assert inside['packets'] == 11 and inside['retransmits'] == 1
+  assert inside['new_bytes'] == 10000 and outside['new_bytes'] == 10000
+  # the hole fill is a retransmit on both sides of the queue
+  assert outside['retransmits'] == 1
+  assert abs(inside['goodput_mbps'] - 10000 * 8 / 0.2 / 1e6) < 1e-6
+  assert fwd['unmatched'] == 1
+  assert fwd['delay']['n'] == 10
+  assert abs(fwd['delay']['p50_ms'] - 50) < 0.2
+  back = r['flows']['10.0.0.2:80>10.0.0.1:40000']
+  assert back['captures'][0]['packets'] == 1 and abs(back['delay']['max_ms'] - 10) < 1e-3
+
+  import tsformat
+  owd = tsformat.open_series(str(tmp_path / 'owd.ts'))
+  assert len(owd['delay']) == 11
+  assert 'retrans' in pcapflow.format_result(r)
@@ -0,0 +1,73 @@
+import sys
+sys.path.append("./src/project3")
+import math
+import numpy as np
+import pingparse
+
+FIXTURE = "tests/fixtures/ping_D.txt"
+
+
+def parse(lines, **kw):
+  stats = pingparse.PingStats()
+  return list(pingparse.iter_ping(lines, stats=stats, **kw)), stats
+
+
+def reply(seq, t, rtt=20.0, dup=False):
+  return "[%.6f] 64 bytes from 10.0.0.2: icmp_seq=%d ttl=64 time=%.1f ms%s\n" % (
+    t, seq, rtt, " (DUP!)" if dup else "")
+
+
+def test_fixture_losses_wrap_dups_and_malformed():
+  with open(FIXTURE) as f:
+    records, stats = parse(f)
+  seqs = [r[1] for r in records]
+  assert seqs == list(range(65530, 65551))
+  lost = [r[1] for r in records if math.isnan(r[3])]
+  # 3 was unreachable, 5 had no time= and its real reply came too late
+  assert lost == [65532, 65533, 65536 + 3, 65536 + 5]
+  assert (stats.sent, stats.received, stats.lost) == (21, 17, 4)
+  assert (stats.duplicates, stats.late, stats.malformed) == (1, 1, 2)
+  # the reordered reply for seq 1 fills its own slot
+  by_seq = dict((r[1], r) for r in records)
+  assert by_seq[65537][3] == 150.0 and by_seq[65537][2] == 64
+  # the duplicate did not replace the first reply
+  assert by_seq[65535][3] == 20.6
+  # lost probes sit between their neighbours, and t keeps increasing
+  assert by_seq[65532][0] == 1700000000.3 and by_seq[65533][0] == 1700000000.4
+  ts = [r[0] for r in records]
+  assert ts == sorted(ts)
+
+
+def test_read_ping_matches_iter_ping():
+  data = pingparse.read_ping(FIXTURE)
+  with open(FIXTURE) as f:
+    records, _ = parse(f)
+  assert list(data["seq"]) == [r[1] for r in records]
+  assert int(np.isnan(data["rtt"]).sum()) == 4
+
+
+def test_reorder_window():
+  lines = [reply(1, 0.1), reply(3, 0.3), reply(4, 0.4), reply(2, 0.45, rtt=300.0)]
+  records, stats = parse(lines, window=2)
+  assert [r[3] for r in records] == [20.0, 300.0, 20.0, 20.0]
+  assert stats.lost == 0 and stats.duplicates == 0
+  # with no window the same reply is too late and probe 2 stays lost
+  records, stats = parse(lines, window=0)
+  assert math.isnan(records[1][3]) and stats.lost == 1 and stats.late == 1
+  # a DUP! of a reported probe is still a duplicate
+  records, stats = parse(lines + [reply(1, 0.5, dup=True)], window=2)
+  assert stats.duplicates == 1 and stats.late == 0
+
+
+def test_reordered_across_the_wrap():
+  lines = [reply(65534, 0.1), reply(0, 0.3), reply(65535, 0.35), reply(1, 0.4)]
+  records, stats = parse(lines)
+  assert [r[1] for r in records] == [65534, 65535, 65536, 65537]
+  assert stats.lost == 0 and stats.received == 4
+
+
+def test_without_timestamps_uses_freq():
+  lines = ["64 bytes from 10.0.0.2: icmp_seq=%d ttl=64 time=1.0 ms\n" % s for s in (1, 2, 4)]
+  records, stats = parse(lines, freq=5)
+  assert [r[0] for r in records] == [0.2, 0.4, 0.6000000000000001, 0.8]
+  assert stats.lost == 1
@@ -0,0 +1,98 @@
+import sys
+sys.path.append("./src/project2/part2")
+from types import SimpleNamespace
+import pytest
+import policy
+from policy import Headers, ETH_IP, ETH_ARP
+
+
+def ip(text):
+  return policy.parse_prefix(text)[0]
+
+
+def rules_of(compiled):
+  return [r.lineno for r in compiled.rules]
+
+
+def test_shadowed_rules_removed():
+  compiled = policy.compile_policy("""
+allow tcp src 10.0.0.0/8
+deny tcp src 10.0.1.0/24 dport 22   # shadowed: 10/8 tcp is already allowed
+allow icmp
+allow icmp dst 10.0.2.20            # shadowed
+deny all
+""")
+  assert rules_of(compiled) == [2, 4]
+  assert compiled.source_rules == 5
+
+
+def test_redundant_rules_removed():
+  # the ssh deny falls through to the same decision with nothing in
+  # between, and deny all repeats the default
+  compiled = policy.compile_policy("""
+deny tcp dport 22
+allow icmp
+deny all
+""")
+  assert rules_of(compiled) == [3]
+  # ...but not when a later allow would catch its packets instead
+  compiled = policy.compile_policy("""
+deny tcp dport 22
+allow tcp dst 10.0.2.0/24
+""")
+  assert rules_of(compiled) == [2, 3]
+
+
+def test_first_match_classification():
+  compiled = policy.compile_policy("""
+deny tcp src 10.0.1.10 dport 80
+allow tcp dport 80
+allow arp
+""", default="deny")
+  web = Headers(ETH_IP, 6, ip("10.0.3.30"), ip("10.0.2.20"), 40000, 80)
+  assert compiled.classify(web) == "allow"
+  assert compiled.classify(web._replace(nw_src=ip("10.0.1.10"))) == "deny"
+  assert compiled.classify(web._replace(tp_dst=443)) == "deny"
+  assert compiled.classify(Headers(ETH_ARP, 1, ip("10.0.1.10"), ip("10.0.2.20"), 0, 0)) == "allow"
+  # memoised answers stay the same
+  assert compiled.classify(web) == "allow"
+
+
+def test_parse_errors():
+  with pytest.raises(policy.PolicyError) as e:
+    policy.parse_policy("allow icmp\npermit tcp\n")
+  assert e.value.lineno == 2
+  with pytest.raises(policy.PolicyError):
+    policy.parse_rule("deny dport 22")
+  with pytest.raises(policy.PolicyError):
+    policy.parse_rule("deny src 10.0.0.0/33")
+
+
+class Match(object):
+  pass
+
+
+class FlowMod(object):
+  def __init__(self):
+    self.actions = []
+
+
+def test_flow_mods_priorities_and_matches():
+  compiled = policy.compile_policy("""
+allow icmp
+deny tcp src 10.0.1.0/24 dport 22
+allow tcp
+""")
+  of = SimpleNamespace(ofp_flow_mod=FlowMod, ofp_match=Match)
+  flood = object()
+  mods = compiled.flow_mods(of, [flood])
+  assert [m.priority for m in mods] == [policy.BASE_PRIORITY, policy.BASE_PRIORITY - 1,
+                                         policy.BASE_PRIORITY - 2, 0]
+  icmp, ssh, tcp, default = mods
+  assert (icmp.match.dl_type, icmp.match.nw_proto) == (ETH_IP, 1)
+  assert icmp.actions == [flood]
+  assert ssh.match.nw_src == "10.0.1.0/24" and ssh.match.tp_dst == 22
+  assert not hasattr(ssh.match, "nw_dst") and ssh.actions == []
+  assert tcp.actions == [flood]
+  # the catch-all matches everything and carries the default (deny)
+  assert vars(default.match) == {} and default.actions == []
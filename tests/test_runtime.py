@@ -0,0 +1,62 @@
+import json
+import os
+import sys
+import time
+import pytest
+sys.path.append("./src/project3")
+import runtime
+
+
+def test_teardown_kills_process_group(tmp_path):
+  rt = runtime.Runtime(str(tmp_path), interval_sec=0.1, grace_sec=0.5)
+  with rt:
+    # the shell ignores SIGTERM, its background child does not
+    proc = rt.popen(None, "trap '' TERM; sleep 30 & echo started; wait; sleep 30",
+                    'stubborn', shell=True)
+    time.sleep(0.3)
+    pids = proc.members()
+    assert proc.group and len(pids) >= 2
+  assert all(runtime.read_stat(pid) is None for pid in pids)
+  with open(os.path.join(str(tmp_path), 'runtime.json')) as f:
+    report = json.load(f)
+  assert report['killed'] == ['stubborn']
+  assert report['procs']['stubborn']['killed']
+  with open(proc.log) as f:
+    assert f.read().strip() == 'started'
+  assert os.path.getsize(os.path.join(str(tmp_path), 'usage.txt')) > 0
+
+
+def test_deadline_and_early_exit(tmp_path):
+  rt = runtime.Runtime(str(tmp_path), interval_sec=0.05, grace_sec=0.5)
+  with rt:
+    slow = rt.popen(None, 'sleep 30', 'slow', deadline=0.2)
+    dead = rt.popen(None, 'false', 'dead', required=True)
+    done = rt.popen(None, 'true', 'done')
+    assert rt.wait(done, 5) == 0
+    time.sleep(0.6)
+    assert slow.expired and slow.poll() is not None
+  assert rt.failures == ['dead']
+  assert dead.returncode == 1 and not slow.killed
+
+
+def test_required_exit_fails_the_run(tmp_path):
+  rt = runtime.Runtime(str(tmp_path), interval_sec=0.05, grace_sec=0.5)
+  with rt:
+    # dies long before the run would have stopped it
+    rt.popen(None, "sh -c 'sleep 0.1; exit 3'", 'iperf', required=True)
+    rt.popen(None, 'sleep 30', 'ping')
+    time.sleep(0.5)
+  assert rt.ok is False
+  with pytest.raises(runtime.RunFailed, match='iperf failed'):
+    rt.check()
+  with open(os.path.join(str(tmp_path), 'runtime.json')) as f:
+    assert json.load(f)['failures'] == ['iperf']
+
+
+def test_clean_run_passes_check(tmp_path):
+  rt = runtime.Runtime(str(tmp_path), interval_sec=0.05, grace_sec=0.5)
+  with rt:
+    rt.popen(None, 'sleep 30', 'ping', required=True)
+    time.sleep(0.2)
+  assert rt.ok is True
+  rt.check()
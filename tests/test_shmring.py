@@ -0,0 +1,53 @@
+import sys
+sys.path.append("./src/project3")
+from multiprocessing import Process
+import numpy as np
+import shmring
+import stats
+
+
+def produce(name, n):
+  ring = shmring.Ring(name)
+  for i in range(n):
+    while not ring.append(float(i), i):
+      pass
+  ring.close()
+
+
+def test_ring_across_processes():
+  ring = shmring.Ring(capacity=100)
+  assert ring.capacity == 128
+  p = Process(target=produce, args=(ring.name, 5000))
+  p.start()
+  got = []
+  while p.is_alive() or len(ring):
+    got.append(ring.read(max_rows=50))
+  p.join()
+  rows = np.concatenate(got)
+  ring.close()
+  # wrapped around many times, nothing lost or reordered
+  assert np.array_equal(rows['qlen'], np.arange(5000))
+  assert np.array_equal(rows['t'], np.arange(5000.0))
+
+
+def test_ring_drops_when_full():
+  ring = shmring.Ring(capacity=4)
+  rows = np.zeros(6, dtype=shmring.QUEUE_RECORD)
+  rows['qlen'] = np.arange(6)
+  assert ring.write(rows) == 4 and ring.dropped == 2
+  assert list(ring.read(max_rows=3)['qlen']) == [0, 1, 2]
+  assert ring.write(rows[4:]) == 2
+  assert list(ring.read()['qlen']) == [3, 4, 5]
+  assert len(ring.read()) == 0
+  ring.close()
+
+
+def test_running_histogram_matches_quantiles():
+  rng = np.random.default_rng(1)
+  q = rng.integers(0, 1000, 20000)
+  hist = stats.RunningHistogram()
+  for i in range(0, len(q), 777):
+    hist.update_batch(q[i:i + 777])
+  qs = (0.1, 0.5, 0.95, 0.99, 1.0)
+  assert hist.n == len(q)
+  assert hist.quantiles(qs) == stats.quantiles(q, qs)
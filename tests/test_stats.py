@@ -0,0 +1,125 @@
+import sys
+sys.path.append("./src/project3")
+import math
+import numpy as np
+import pytest
+import stats
+
+# The pure-Python helper.py functions stats.py replaced, verbatim
+
+
+def old_ewma(alpha, values):
+  if alpha == 0:
+    return values
+  ret = []
+  prev = 0
+  for v in values:
+    prev = alpha * prev + (1 - alpha) * v
+    ret.append(prev)
+  return ret
+
+
+def old_avg(lst):
+  return sum(map(float, lst)) / len(lst)
+
+
+def old_stdev(lst):
+  mean = old_avg(lst)
+  var = old_avg(list(map(lambda e: (e - mean)**2, lst)))
+  return math.sqrt(var)
+
+
+def old_cdf(values):
+  values.sort()
+  prob = 0
+  l = len(values)
+  x, y = [], []
+  for v in values:
+    prob += 1.0 / l
+    x.append(v)
+    y.append(prob)
+  return (x, y)
+
+
+def old_pc(lst, q):
+  return sorted(lst)[int(q * len(lst))]
+
+
+def samples():
+  rng = np.random.default_rng(461)
+  yield rng.exponential(20.0, 10007).tolist()
+  yield rng.integers(0, 100, 5000).tolist()      # queue lengths, many ties
+  yield rng.normal(1e6, 1.0, 999).tolist()       # large mean, tiny spread
+  yield [3.5]
+
+
+@pytest.mark.parametrize("values", list(samples()))
+def test_matches_old_helpers(values):
+  for alpha in (0.0, 0.5, 0.9, 0.999):
+    assert np.allclose(stats.ewma(alpha, values), old_ewma(alpha, values), rtol=1e-12)
+    if alpha:
+      # the fallback without SciPy
+      blocked = stats._ewma_blocked(alpha, stats.as_array(values))
+      assert np.allclose(blocked, old_ewma(alpha, values), rtol=1e-12)
+  assert stats.mean(values) == pytest.approx(old_avg(values), rel=1e-12)
+  assert stats.stdev(values) == pytest.approx(old_stdev(values), rel=1e-9, abs=1e-12)
+  qs = (0.0, 0.5, 0.95, 0.99)
+  assert stats.quantiles(values, qs) == [old_pc(values, q) for q in qs]
+  # q = 1 is the maximum rather than an IndexError
+  assert stats.quantiles(values, (1.0,)) == [max(values)]
+  x, y = stats.cdf(values)
+  old_x, old_y = old_cdf(list(values))
+  assert list(x) == old_x and np.allclose(y, old_y)
+
+
+@pytest.mark.parametrize("values", list(samples()))
+def test_running_stats_match_old_helpers(values):
+  one = stats.RunningStats()
+  for v in values:
+    one.update(v)
+  batched = stats.RunningStats()
+  for i in range(0, len(values), 1000):
+    batched.update_batch(values[i:i + 1000])
+  for running in (one, batched):
+    assert running.n == len(values)
+    assert running.mean == pytest.approx(old_avg(values), rel=1e-12)
+    assert running.stdev == pytest.approx(old_stdev(values), rel=1e-9, abs=1e-12)
+    assert (running.min, running.max) == (min(values), max(values))
+
+
+def test_empty_input():
+  # the old helpers returned empty lists for these...
+  assert list(stats.ewma(0.9, [])) == old_ewma(0.9, [])
+  x, y = stats.cdf([])
+  assert (list(x), list(y)) == old_cdf([])
+  # ...and raised for these, which now give NaN
+  with pytest.raises(IndexError):
+    old_pc([], 0.95)
+  assert all(math.isnan(v) for v in stats.quantiles([], (0.5, 0.95)))
+  with pytest.raises(ZeroDivisionError):
+    old_avg([])
+  with np.errstate(all="ignore"), pytest.warns(RuntimeWarning):
+    assert math.isnan(stats.mean([]))
+  assert stats.summary([]) == {"n": 0}
+  empty = stats.RunningStats()
+  empty.update_batch([])
+  assert empty.n == 0 and math.isnan(empty.variance) and math.isnan(empty.stdev)
+
+
+def test_nan_input():
+  values = [1.0, 2.0, float("nan"), 4.0, 5.0]
+  # NaN poisons everything after it, as in the old loop
+  new, old = stats.ewma(0.5, values), old_ewma(0.5, values)
+  assert np.allclose(new[:2], old[:2])
+  assert np.isnan(new[2:]).all() and all(math.isnan(v) for v in old[2:])
+  assert math.isnan(stats.mean(values)) and math.isnan(old_avg(values))
+  assert math.isnan(stats.stdev(values)) and math.isnan(old_stdev(values))
+  running = stats.RunningStats()
+  running.update_batch(values)
+  assert math.isnan(running.mean) and math.isnan(running.stdev)
+  # sorting puts NaN last, where Python's sorted() order was undefined;
+  # the quantiles below it are the ones the finite values give
+  x, _ = stats.cdf(values)
+  assert list(x[:4]) == [1.0, 2.0, 4.0, 5.0] and math.isnan(x[4])
+  assert stats.quantiles(values, (0.0, 0.5)) == [1.0, 4.0]
+  assert math.isnan(stats.quantiles(values, (1.0,))[0])
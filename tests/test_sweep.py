@@ -0,0 +1,68 @@
+import sys
+sys.path.append("./src/project3")
+import argparse
+import json
+import os
+import sweep
+
+
+def sweep_args(jobs=1):
+  return argparse.Namespace(cong=["reno", "bbr"], maxq=[20, 100], bw_net=[1.5],
+                            delay=[5.0], time=[15], jobs=jobs)
+
+
+def stub(code):
+  '''A command for run_point that records its run_dir and exits with code.'''
+  def command(point, run_dir):
+    return [sys.executable, "-c",
+            "import sys; open(sys.argv[1] + '/ran', 'a').write('x'); sys.exit(%d)" % code,
+            run_dir]
+  return command
+
+
+def test_grid():
+  points = list(sweep.grid(sweep_args()))
+  assert len(points) == 4
+  assert points[0] == {"cong": "reno", "maxq": 20, "bw_net": 1.5, "delay": 5.0,
+                       "time": 15, "host": "cpu", "switch": "lxbr"}
+  assert [(p["cong"], p["maxq"]) for p in points] == [
+    ("reno", 20), ("reno", 100), ("bbr", 20), ("bbr", 100)]
+  assert all(p["host"] == "plain" for p in sweep.grid(sweep_args(jobs=4)))
+
+
+def test_point_key():
+  point = next(sweep.grid(sweep_args()))
+  # stable across runs and key order
+  assert sweep.point_key(point) == sweep.point_key(dict(reversed(list(point.items()))))
+  assert sweep.point_key(point) == sweep.point_key(json.loads(json.dumps(point)))
+  assert len(sweep.point_key(point)) == 12
+  # CPULimitedHost and plain-host results are cached apart
+  assert sweep.point_key(point) != sweep.point_key(dict(point, host="plain"))
+  assert sweep.point_key(point) != sweep.point_key(dict(point, maxq=21))
+
+
+def test_bufferbloat_cmd_passes_host_and_switch():
+  point = next(sweep.grid(sweep_args(jobs=2)))
+  cmd = sweep.bufferbloat_cmd(point, "/tmp/run")
+  assert cmd[cmd.index("--host") + 1] == "plain"
+  assert cmd[cmd.index("--switch") + 1] == "lxbr"
+
+
+def test_skip_and_force(tmp_path):
+  out = str(tmp_path)
+  ok, failing = list(sweep.grid(sweep_args()))[:2]
+  assert sweep.run_point(ok, out, use_netns=False, command=stub(0)) == (
+    sweep.point_key(ok), 0)
+  assert sweep.run_point(failing, out, use_netns=False, command=stub(1))[1] == 1
+  ok_dir = os.path.join(out, sweep.point_key(ok))
+  with open(os.path.join(ok_dir, "point.json")) as f:
+    assert json.load(f) == ok
+  # only the failed point is run again, unless forced
+  assert sweep.pending([ok, failing], out) == [failing]
+  assert sweep.pending([ok, failing], out, force=True) == [ok, failing]
+  # a forced rerun that fails leaves the point incomplete
+  assert sweep.run_point(ok, out, use_netns=False, command=stub(2))[1] == 2
+  assert not os.path.exists(os.path.join(ok_dir, "done"))
+  with open(os.path.join(ok_dir, "ran")) as f:
+    assert f.read() == "xx"
+  assert sweep.pending([ok, failing], out) == [ok, failing]
@@ -0,0 +1,84 @@
+import math
+import os
+import socket
+import sys
+sys.path.append("./src/project3")
+import tcpinfo
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "ss_tin.txt")
+
+
+def snapshots():
+  chunks = []
+  with open(FIXTURE) as f:
+    for line in f:
+      if line.startswith('@'):
+        chunks.append([])
+      else:
+        chunks[-1].append(line)
+  return [tcpinfo.parse_ss(''.join(c)) for c in chunks]
+
+
+def test_parse_ss_with_state_column():
+  conns = snapshots()[0]
+  assert len(conns) == 4
+  receiver, sender = conns[0], conns[3]
+  assert receiver['local'] == '127.0.0.1:5125' and receiver['bytes_acked'] == 0
+  assert sender['peer'] == '127.0.0.1:5125'
+  assert sender['cc'] == 'bbr' and sender['cwnd'] == 16 and sender['ssthresh'] == 8
+  assert sender['srtt'] == 0.685 and sender['rttvar'] == 0.181
+  assert sender['bbr']['pacing_gain'] > 0
+
+
+def test_parse_ss_without_state_column():
+  reno, bbr = snapshots()[1]
+  assert reno['cc'] == 'reno' and bbr['cc'] == 'bbr'
+  assert reno['cwnd'] == 34 and reno['retrans'] == 1
+  assert reno['delivery_rate'] == 5930535848 and reno['pacing_rate'] == 37272039752
+  assert bbr['bbr']['bw'] == 5592848312 and bbr['bbr']['mrtt'] == 0.004
+  assert bbr['bytes_acked'] == 533656871
+
+
+def test_parse_ss_scaled_rates():
+  bulk, idle = snapshots()[2]
+  assert bulk['local'] == '10.0.0.1:46612' and bulk['state'] == 'ESTAB'
+  assert bulk['srtt'] == 176.41 and bulk['cwnd'] == 112 and bulk['retrans'] == 23
+  assert math.isclose(bulk['pacing_rate'], 8.8e6)
+  assert math.isclose(bulk['delivery_rate'], 1.5e6)
+  assert math.isclose(idle['delivery_rate'], 212.5e3)
+  assert idle['retrans'] == 0
+
+
+def test_tcp_info_of_a_loopback_socket():
+  listener = socket.socket()
+  listener.bind(("127.0.0.1", 0))
+  listener.listen(1)
+  client = socket.create_connection(listener.getsockname())
+  server, _ = listener.accept()
+  try:
+    client.sendall(b"x" * 100000)
+    got = 0
+    while got < 100000:
+      got += len(server.recv(65536))
+    raw = tcpinfo.decode_tcp_info(
+      client.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, tcpinfo.TCP_INFO.size))
+    assert raw["state"] == 1   # TCP_ESTABLISHED
+    assert raw["snd_mss"] > 0 and raw["snd_cwnd"] > 0 and raw["rtt"] > 0
+    # a short read from an older kernel decodes as zeros
+    assert tcpinfo.decode_tcp_info(b"\x01")["snd_cwnd"] == 0
+
+    sampler = tcpinfo.SocketSampler()
+    sampler.add(client)
+    conn, = sampler.sample()
+    assert conn["peer"] == "%s:%d" % listener.getsockname()
+    assert conn["cwnd"] == raw["snd_cwnd"] and conn["srtt"] > 0
+    assert conn["cc"] and conn["mss"] == raw["snd_mss"]
+    # closed sockets drop out; a stopped sampler ends monitor_tcpinfo
+    client.close()
+    assert sampler.sample() == [] and sampler.socks == []
+    sampler.stop()
+    assert sampler.sample() is None
+  finally:
+    client.close()
+    server.close()
+    listener.close()
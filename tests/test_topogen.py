@@ -0,0 +1,68 @@
+import sys
+sys.path.append("./src/project2")
+import json
+import pytest
+import topogen
+
+
+def test_part3_matches_the_course_layout():
+  config = topogen.part3().controller_config()
+  assert config["dpids"] == {"s1": 1, "s2": 2, "s3": 3, "cores21": 21, "dcs31": 31}
+  assert config["ips"]["hnotrust1"] == "172.16.10.100"
+  assert config["subnets"]["serv1"] == "10.0.4.0/24"
+  assert config["gateways"]["10.0.1.0/24"] == "10.0.1.1"
+  # the ports part3controller used to hard-code for cores21
+  assert config["routes"]["cores21"] == {
+    "10.0.1.0/24": 1, "10.0.2.0/24": 2, "10.0.3.0/24": 3,
+    "10.0.4.0/24": 4, "172.16.10.0/24": 5}
+  assert config["routes"]["s1"]["10.0.2.0/24"] == 2
+  assert topogen.part3().hosts["h10"].mininet_params()["defaultRoute"] == "h10-eth0"
+  assert topogen.part4().hosts["h10"].mininet_params()["defaultRoute"] == "via 10.0.1.1"
+
+
+def test_ports_numbered_in_link_order():
+  spec = topogen.linear(3, hosts=2)
+  # switches from 1, hosts (eth0) from 0
+  assert spec.ports["s2"] == {"h3": 1, "h4": 2, "s1": 3, "s3": 4}
+  assert spec.ports["h3"] == {"s2": 0}
+  assert spec.hosts["h3"].ip == "10.0.2.2" and spec.hosts["h4"].ip == "10.0.2.3"
+  assert spec.hosts["h4"].mac == "00:00:00:00:00:04"
+  routes = spec.routes()
+  assert routes["s1"] == {"10.0.1.0/24": 1, "10.0.2.0/24": 3, "10.0.3.0/24": 3}
+  assert routes["s3"]["10.0.1.0/24"] == routes["s3"]["10.0.2.0/24"] == 3
+
+
+def test_hosts_for_switch_uses_each_attached_port():
+  spec = topogen.leaf_spine(leaves=2, spines=2, hosts=3)
+  hosts = spec.hosts_for_switch("leaf1")
+  assert hosts[:3] == [(1, "00:00:00:00:00:01", "10.0.1.2"),
+                       (2, "00:00:00:00:00:02", "10.0.1.3"),
+                       (3, "00:00:00:00:00:03", "10.0.1.4")]
+  # the other leaf's hosts are reached through the lowest spine port
+  assert set(port for port, _, _ in hosts[3:]) == {4}
+
+
+def test_fat_tree_shortest_paths():
+  spec = topogen.fat_tree(4)
+  assert len(spec.switches) == 20 and len(spec.hosts) == 16 and len(spec.links) == 48
+  routes = spec.routes()
+  # every switch reaches every edge subnet, and each port exists
+  subnets = set(h.subnet for h in spec.hosts.values())
+  for switch, table in routes.items():
+    assert set(table) == subnets
+    assert set(table.values()) <= set(spec.ports[switch].values())
+  with pytest.raises(ValueError):
+    topogen.fat_tree(3)
+
+
+def test_config_round_trip_and_switch_routes(tmp_path):
+  path = tmp_path / "linear.json"
+  config = topogen.linear(2, hosts=2).controller_config()
+  path.write_text(json.dumps(config))
+  loaded = topogen.load_config(str(path))
+  assert loaded == config
+  assert topogen.load_config() == topogen.part3().controller_config()
+  assert topogen.switch_name(loaded, 2) == "s2"
+  assert topogen.switch_name(loaded, 99) is None
+  assert topogen.switch_routes(loaded, "s1") == [
+    ("10.0.1.2/32", 1), ("10.0.1.3/32", 2), ("10.0.1.0/24", 1), ("10.0.2.0/24", 3)]
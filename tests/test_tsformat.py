@@ -0,0 +1,50 @@
+import sys
+sys.path.append("./src/project3")
+import numpy as np
+import pytest
+import tsformat
+
+
+def test_write_read_round_trip(tmp_path):
+  path = str(tmp_path / "q.ts")
+  t = 1.7e9 + np.arange(10000) * 0.01
+  q = np.arange(10000) % 101
+  with tsformat.SeriesWriter(path, tsformat.QUEUE_COLUMNS, "queue", flush_rows=1000) as w:
+    for i in range(5000):
+      w.append(t[i], int(q[i]))
+    w.extend(t[5000:], q[5000:])
+  assert tsformat.read_meta(path)["kind"] == "queue"
+  cols = tsformat.open_series(path)
+  assert np.array_equal(cols["t"], t) and np.array_equal(cols["qlen"], q)
+  # reopening appends to the same columns
+  with tsformat.SeriesWriter(path, tsformat.QUEUE_COLUMNS) as w:
+    w.append(2e9, 7)
+  t2, q2 = tsformat.load_queue(path)
+  assert len(t2) == 10001 and t2[-1] == 2e9 and q2[-1] == 7
+  with pytest.raises(ValueError):
+    tsformat.SeriesWriter(path, tsformat.PING_COLUMNS)
+
+
+def test_reader_trusts_only_complete_rows(tmp_path):
+  path = str(tmp_path / "ping.ts")
+  w = tsformat.SeriesWriter(path, tsformat.PING_COLUMNS, "ping")
+  w.extend([1.0, 2.0, 3.0], [1, 2, 3], [10.5, np.nan, 12.25])
+  # a writer caught half way through a row
+  w.files[0].write(np.array([4.0]).tobytes())
+  w.flush()
+  cols = tsformat.open_series(path)
+  assert list(cols["seq"]) == [1, 2, 3] and len(cols["t"]) == 3
+  assert cols["rtt"][0] == np.float32(10.5) and np.isnan(cols["rtt"][1])
+  w.close()
+  empty = str(tmp_path / "empty.ts")
+  tsformat.SeriesWriter(empty, tsformat.QUEUE_COLUMNS).close()
+  assert len(tsformat.open_series(empty)["t"]) == 0
+
+
+def test_queue_text_conversion_matches_text_loader(tmp_path):
+  text = tmp_path / "q.txt"
+  text.write_text("".join("%.6f,%d\n" % (100 + i * 0.1, i % 13) for i in range(500)))
+  path = tsformat.queue_from_text(str(text), str(tmp_path / "q.ts"))
+  t, q = tsformat.load_queue(path)
+  t_text, q_text = tsformat.load_queue(str(text))
+  assert np.allclose(t, t_text) and np.array_equal(q, q_text)
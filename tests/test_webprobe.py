@@ -0,0 +1,68 @@
+import sys
+sys.path.append("./src/project3")
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import webprobe
+
+
+def test_format_parse_round_trip():
+  line = webprobe.format_sample(1700000000.25, 0.5, 0.001, 0.125, 177669, 200)
+  assert line.endswith("\n") and line.count(",") == 5
+  assert webprobe.parse_sample(line) == (1700000000.25, 0.5, 0.001, 0.125, 177669, 200)
+  failed = webprobe.parse_sample(webprobe.format_sample(5.0, math.nan, math.nan, math.nan, 0, -1))
+  assert failed[0] == 5.0 and math.isnan(failed[1]) and failed[4:] == (0, -1)
+
+
+def test_parse_old_two_column_lines():
+  epoch, total, connect, ttfb, nbytes, status = webprobe.parse_sample("1700000000.5,0.75\n")
+  assert (epoch, total, nbytes, status) == (1700000000.5, 0.75, -1, 200)
+  assert math.isnan(connect) and math.isnan(ttfb)
+
+
+class Handler(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+  connections = set()
+
+  def do_GET(self):
+    Handler.connections.add(self.client_address)
+    body = b"x" * 5000
+    self.send_response(200)
+    if self.path == "/chunked":
+      self.send_header("Transfer-Encoding", "chunked")
+      self.end_headers()
+      for i in range(0, len(body), 1500):
+        part = body[i:i + 1500]
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(part), part))
+      self.wfile.write(b"0\r\n\r\n")
+    else:
+      self.send_header("Content-Length", str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
+
+
+@pytest.fixture
+def server():
+  Handler.connections = set()
+  httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+  thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+  thread.start()
+  yield "http://127.0.0.1:%d" % httpd.server_address[1]
+  httpd.shutdown()
+  httpd.server_close()
+
+
+def test_probe_reuses_its_connection(server):
+  probe = webprobe.Probe(server + "/index.html")
+  samples = [probe.fetch() for _ in range(3)]
+  probe.close()
+  assert [(s[3], s[4]) for s in samples] == [(5000, 200)] * 3
+  assert len(Handler.connections) == 1
+  # only the first fetch paid for a connect
+  assert samples[1][1] == 0.0 and samples[2][1] == 0.0
+  chunked = webprobe.Probe(server + "/chunked", keepalive=False)
+  assert chunked.fetch()[3:] == (5000, 200) and chunked.sock is None
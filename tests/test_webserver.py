@@ -0,0 +1,122 @@
+import sys
+sys.path.append("./src/project3/http")
+import asyncio
+import gzip
+import os
+import webserver
+
+
+def run(root, client):
+  '''Runs client(port) against a server on root.'''
+  async def main():
+    srv = await asyncio.start_server(webserver.Server(str(root)).handle, "127.0.0.1", 0,
+                                     limit=webserver.MAX_HEADER)
+    async with srv:
+      return await asyncio.wait_for(client(srv.sockets[0].getsockname()[1]), 10)
+  return asyncio.run(main())
+
+
+async def request(reader, writer, target, headers=(), method="GET"):
+  lines = ["%s %s HTTP/1.1" % (method, target), "Host: test"] + ["%s: %s" % h for h in headers]
+  writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+  head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+  status = int(head[0].split()[1])
+  fields = dict((k.lower(), v.strip()) for k, _, v in (l.partition(":") for l in head[1:] if l))
+  body = b""
+  if method != "HEAD" and status != 304:
+    body = await reader.readexactly(int(fields["content-length"]))
+  return status, fields, body
+
+
+def fetch(root, *requests):
+  '''Sends each (target, headers) on one connection, the last with
+  Connection: close.  Returns the responses and whether the server then
+  closed the connection.'''
+  async def client(port):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    out = []
+    for i, (target, headers) in enumerate(requests):
+      if i == len(requests) - 1:
+        headers = list(headers) + [("Connection", "close")]
+      out.append(await request(reader, writer, target, headers))
+    closed = await reader.read(1) == b""
+    writer.close()
+    return out, closed
+  return run(root, client)
+
+
+def site(tmp_path):
+  root = tmp_path / "www"
+  root.mkdir()
+  (root / "index.html").write_text("<html>hello</html>")
+  return root
+
+
+def test_etag_and_304(tmp_path):
+  root = site(tmp_path)
+  [(status, fields, body)], _ = fetch(root, ("/", ()))
+  assert status == 200 and body == b"<html>hello</html>"
+  assert fields["content-type"] == "text/html" and fields["etag"]
+  etag = fields["etag"]
+  [(status, fields, body), (other, _, _)], _ = fetch(
+    root, ("/index.html", [("If-None-Match", '"old", %s' % etag)]),
+    ("/index.html", [("If-None-Match", '"old"')]))
+  assert status == 304 and body == b"" and fields["etag"] == etag
+  assert other == 200
+  # a changed file gets a new ETag
+  (root / "index.html").write_text("<html>changed!</html>")
+  [(status, fields, body)], _ = fetch(root, ("/", [("If-None-Match", etag)]))
+  assert status == 200 and body == b"<html>changed!</html>" and fields["etag"] != etag
+
+
+def test_gzip_variant(tmp_path):
+  root = site(tmp_path)
+  (root / "index.html.gz").write_bytes(gzip.compress(b"<html>hello</html>"))
+  [(status, fields, body), (_, plain, plain_body)], _ = fetch(
+    root, ("/", [("Accept-Encoding", "gzip, deflate")]), ("/", ()))
+  assert fields["content-encoding"] == "gzip" and fields["vary"] == "Accept-Encoding"
+  assert gzip.decompress(body) == b"<html>hello</html>"
+  assert "content-encoding" not in plain and plain_body == b"<html>hello</html>"
+  assert fields["etag"] != plain["etag"]
+  # a stale .gz is not used
+  stat = os.stat(str(root / "index.html"))
+  os.utime(str(root / "index.html.gz"), ns=(stat.st_atime_ns, stat.st_mtime_ns - 10 ** 9))
+  [(_, fields, body)], _ = fetch(root, ("/", [("Accept-Encoding", "gzip")]))
+  assert "content-encoding" not in fields and body == b"<html>hello</html>"
+
+
+def test_keep_alive_and_large_files(tmp_path):
+  root = site(tmp_path)
+  big = os.urandom(webserver.CACHE_MAX + 12345)
+  (root / "big.bin").write_bytes(big)
+  responses, closed = fetch(root, ("/", ()), ("/big.bin", ()), ("/", ()))
+  assert [r[0] for r in responses] == [200, 200, 200]
+  assert [r[1]["connection"] for r in responses] == ["keep-alive", "keep-alive", "close"]
+  assert responses[1][2] == big and closed
+
+  async def http10(port):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET / HTTP/1.0\r\n\r\n")
+    data = await reader.read()
+    writer.close()
+    return data
+  # HTTP/1.0 without keep-alive is closed after one response
+  assert run(root, http10).startswith(b"HTTP/1.1 200 OK\r\n")
+
+
+def test_traversal(tmp_path):
+  root = site(tmp_path)
+  (tmp_path / "secret.txt").write_text("secret")
+  os.symlink(str(tmp_path / "secret.txt"), str(root / "link.txt"))
+  responses, _ = fetch(root, ("/../secret.txt", ()), ("/%2e%2e/secret.txt", ()),
+                       ("/..%2f..%2fsecret.txt", ()), ("/link.txt", ()))
+  # dot segments are clamped to the root; a symlink out of it is refused
+  assert [r[0] for r in responses] == [404, 404, 404, 403]
+  assert all(b"secret" not in r[2] for r in responses)
+
+
+def test_nul_in_path_is_a_bad_request(tmp_path):
+  root = site(tmp_path)
+  responses, closed = fetch(root, ("/%00", ()), ("/index.html%00.txt", ()), ("/", ()))
+  assert [r[0] for r in responses] == [400, 400, 200]
+  assert closed
@@ -0,0 +1,102 @@
+import sys
+sys.path.append("./src/project3")
+import argparse
+import asyncio
+import io
+import math
+import random
+import pytest
+import workload
+
+
+def test_size_samplers():
+  rng = random.Random(1)
+  assert workload.size_sampler("fixed:1e4", rng)() == 10000
+  web = workload.size_sampler("web", rng)
+  sizes = [web() for _ in range(20000)]
+  assert set(sizes) <= set(int(s) for s, _ in workload.WEB_CDF)
+  # 15% of web flows are the smallest size
+  assert 0.13 < sizes.count(6000) / len(sizes) < 0.17
+  pareto = workload.size_sampler("pareto:50000,1.5", rng)
+  assert min(pareto() for _ in range(1000)) >= 50000 * 0.5 / 1.5 - 1
+  with pytest.raises(ValueError):
+    workload.size_sampler("zipf:2", rng)
+
+
+def test_flow_records_round_trip_and_summary(tmp_path):
+  path = tmp_path / "flows.txt"
+  path.write_text("".join([
+    workload.format_flow("bulk", 0, "reno", -1, 100.0, 10.0, 10 * 10 ** 6 // 8),
+    workload.format_flow("bulk", 1, "bbr", -1, 100.0, 10.0, 30 * 10 ** 6 // 8),
+    workload.format_flow("short", 0, None, 5000, 101.0, 0.1, 5000),
+    workload.format_flow("short", 1, None, 5000, 101.5, 0.3, 5000),
+    workload.format_flow("short", 2, None, 2000000, 102.0, 2.0, 2000000),
+    workload.format_flow("short", 3, None, 5000, 103.0, math.nan, 0),
+    "garbage\n"]))
+  flows = workload.read_flows(str(path))
+  assert len(flows) == 6 and flows[2]["cc"] == "-" and math.isnan(flows[5]["fct"])
+  summary = workload.summarize(flows)
+  bulk = summary["bulk"]
+  assert bulk["goodput_mbps"] == [1.0, 3.0]
+  assert bulk["jain"] == pytest.approx(16 / 20.0)
+  assert bulk["by_cc"] == {"bbr": 3.0, "reno": 1.0}
+  short = summary["short"]
+  assert (short["n"], short["failed"]) == (4, 1)
+  assert short["<100KB"]["n"] == 2 and short["<100KB"]["p99"] == 0.3
+  assert short[">1MB"]["p50"] == 2.0 and "100KB-1MB" not in short
+  assert "Jain index 0.800" in workload.format_summary(summary)
+
+
+def test_generate_against_sink():
+  async def main():
+    server = await asyncio.start_server(workload.sink_conn, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    args = argparse.Namespace(host="127.0.0.1", port=port, bulk=1, bulk_cc="",
+                              short_rate=20.0, short_cc=None, sizes="fixed:100000",
+                              duration=0.5, timeout=5.0, seed=461,
+                              tcpinfo=None, tcpinfo_interval=0.01)
+    out = io.StringIO()
+    async with server:
+      await workload.generate(args, out)
+    return out.getvalue()
+
+  lines = asyncio.run(main()).splitlines()
+  flows = [dict(zip(("kind", "id", "cc", "size", "start", "fct", "received"), l.split(",")))
+           for l in lines]
+  bulk = [f for f in flows if f["kind"] == "bulk"]
+  short = [f for f in flows if f["kind"] == "short"]
+  assert len(bulk) == 1 and int(bulk[0]["received"]) > 0
+  assert short and all(int(f["received"]) == 100000 for f in short)
+  assert all(not math.isnan(float(f["fct"])) for f in flows)
+
+
+def test_generate_without_flows():
+  args = argparse.Namespace(host="127.0.0.1", port=1, bulk=0, bulk_cc="", short_rate=0.0,
+                            short_cc=None, sizes="web", duration=0.0, timeout=5.0, seed=1,
+                            tcpinfo=None, tcpinfo_interval=0.01)
+  out = io.StringIO()
+  asyncio.run(workload.generate(args, out))
+  assert out.getvalue() == ""
+
+
+def test_generate_samples_tcp_info(tmp_path):
+  import tcpinfo
+  series = str(tmp_path / "tcpinfo.ts")
+
+  async def main():
+    server = await asyncio.start_server(workload.sink_conn, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    args = argparse.Namespace(host="127.0.0.1", port=port, bulk=2, bulk_cc="",
+                              short_rate=0.0, short_cc=None, sizes="web",
+                              duration=0.5, timeout=5.0, seed=1,
+                              tcpinfo=series, tcpinfo_interval=0.01)
+    async with server:
+      await workload.generate(args, io.StringIO())
+      return port
+
+  port = asyncio.run(main())
+  cols, flows = tcpinfo.load_tcpinfo(series)
+  assert sorted(flows) == [0, 1]
+  assert all(f["peer"] == "127.0.0.1:%d" % port for f in flows.values())
+  assert len(cols["t"]) > 10 and set(cols["flow"]) == {0, 1}
+  assert (cols["cwnd"] > 0).all() and (cols["bytes_acked"] > 0).any()